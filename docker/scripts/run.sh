@@ -2,7 +2,7 @@
 
 set -u
 
-modules_names=("worker" "scheduler" "bucket_watcher")
+modules_names=("worker" "scheduler" "bucket_watcher" "outbox_dispatcher")
 valid_params=("pm" "pytest" "api" "der_gateway_relay" "${modules_names[@]}")
 
 if [[ ! ${valid_params[*]} =~ ${TASK_TO_RUN} ]]; then
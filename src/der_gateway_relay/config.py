@@ -1,6 +1,21 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
 from shared.system.configuration import Config
 
 
+@dataclass
 class DerGatewayRelayConfig(Config):
     DER_GATEWAY_URL: str = "http://localhost:8080"
     DER_GATEWAY_PROGRAM_TOPIC: str = "der-gateway-program"
+    # requests sent at the same time to each DER Gateway endpoint
+    DER_GATEWAY_MAX_CONCURRENCY: int = 4
+    # records consumed per batch, and the longest wait for a batch to fill up
+    DER_GATEWAY_BATCH_SIZE: int = 500
+    DER_GATEWAY_BATCH_TIMEOUT_SECONDS: int = 1
+    # keep only the latest operation on each program contract of a batch
+    DER_GATEWAY_COALESCE: bool = True
+    # program definitions remembered to skip re-sending unchanged programs, 0 to disable
+    DER_GATEWAY_PROGRAM_CACHE_SIZE: int = 1000
+    DER_GATEWAY_PROGRAM_CACHE_TTL_SECONDS: int = 3600
@@ -1,45 +1,125 @@
 from __future__ import annotations
 
-from typing import Optional
+import asyncio
+from typing import Optional, cast
+
+from confluent_kafka import TopicPartition
 
 from der_gateway_relay.config import DerGatewayRelayConfig
 from der_gateway_relay.domain.payloads import Payload
+from der_gateway_relay.domain.program_cache import ProgramCache
 from der_gateway_relay.services.api_service import ApiService
 from der_gateway_relay.topics import DerGatewayFailure
+from shared.system import configuration
 from shared.system.loggingsys import get_logger
 from shared.tasks.consumer import ConsumerMessage
 from shared.tasks.decorators import ConsumerType, register_topic_handler
 
 logger = get_logger(__name__)
 
+# reused between batches, to keep the pooled connections to DER Gateway alive
+_api_service: Optional[ApiService] = None
+# the program definitions already sent to DER Gateway
+_program_cache: Optional[ProgramCache] = None
+
+
+def get_api_service() -> ApiService:
+    global _api_service
+    if _api_service is None:
+        _api_service = ApiService()
+    return _api_service
+
+
+def clear_program_cache(partitions: list[TopicPartition]):
+    """The programs of the assigned partitions may have been sent by another instance"""
+    if _program_cache is not None:
+        _program_cache.clear()
+
+
+def get_program_cache() -> ProgramCache:
+    global _program_cache
+    if _program_cache is None:
+        config = cast(DerGatewayRelayConfig, configuration.get_config())
+        _program_cache = ProgramCache(
+            max_size=config.DER_GATEWAY_PROGRAM_CACHE_SIZE,
+            ttl_seconds=config.DER_GATEWAY_PROGRAM_CACHE_TTL_SECONDS,
+        )
+    return _program_cache
+
+
+async def send_payload(
+    payload: Payload,
+    api_service: ApiService,
+    previous: list[asyncio.Task],
+    program_cache: Optional[ProgramCache] = None,
+) -> list[DerGatewayFailure]:
+    """Send the payload once the previous payloads of its programs are sent.
+    Returns a failure for each record of the payload if it could not be sent."""
+    if previous:
+        await asyncio.wait(previous)
+    try:
+        await payload.send_payload(api_service, program_cache)
+    except Exception as e:
+        msg = f"Error sending payload to DER Gateway: {e}"
+        logger.error(msg, exc_info=True)
+        return [
+            DerGatewayFailure(
+                message=msg,
+                sent_headers={"operation": payload.operation.value},
+                data=data,
+                reason="der-gateway-error",
+            )
+            for data in payload.raw_data
+        ]
+    return []
+
+
+async def send_payloads(
+    payloads: list[Payload],
+    api_service: ApiService,
+    program_cache: Optional[ProgramCache] = None,
+) -> list[DerGatewayFailure]:
+    """Send the payloads to DER Gateway concurrently.
+    A payload sharing a program with earlier payloads is sent after them, so the operations on
+    a program keep the order of the topic."""
+    tasks: list[asyncio.Task] = []
+    last_tasks: dict[int, asyncio.Task] = {}  # last task sending each program
+    for payload in payloads:
+        program_ids = payload.program_ids()
+        previous = list({last_tasks[i] for i in program_ids if i in last_tasks})
+        task = asyncio.create_task(send_payload(payload, api_service, previous, program_cache))
+        for program_id in program_ids:
+            last_tasks[program_id] = task
+        tasks.append(task)
+    failed: list[DerGatewayFailure] = []
+    for failures in await asyncio.gather(*tasks):
+        failed += failures
+    return failed
+
 
 @register_topic_handler(
     DerGatewayRelayConfig.DER_GATEWAY_PROGRAM_TOPIC, consumer_type=ConsumerType.BATCH
 )
 def handle_der_gateway_program(
-    data: list[ConsumerMessage], api_service: Optional[ApiService] = None
+    data: list[ConsumerMessage],
+    api_service: Optional[ApiService] = None,
+    coalesce: Optional[bool] = None,
+    program_cache: Optional[ProgramCache] = None,
 ):
-    """Handle the data from the der gateway program topic."""
+    """Handle the data from the der gateway program topic.
+    coalesce defaults to the DER_GATEWAY_COALESCE setting, and program_cache to the cache
+    shared by the batches."""
     logger.info(f"Received {len(data)} records from der-gateway-program topic")
-    payloads, failed = Payload.validate_and_sort(data)
+    if coalesce is None:
+        coalesce = cast(DerGatewayRelayConfig, configuration.get_config()).DER_GATEWAY_COALESCE
+    payloads, failed = Payload.validate_and_sort(data, coalesce=coalesce)
     # generate the payloads from the validated data and send them to DER Gateway
     if api_service is None:
-        api_service = ApiService()
-    for payload in payloads:
-        try:
-            payload.send_payload(api_service)
-        except Exception as e:
-            msg = f"Error sending payload to DER Gateway: {e}"
-            logger.error(msg, exc_info=True)
-            failed += [
-                DerGatewayFailure(
-                    message=msg,
-                    sent_headers={"operation": payload.operation.value},
-                    data=data,
-                    reason="der-gateway-error",
-                )
-                for data in payload.raw_data
-            ]
+        api_service = get_api_service()
+    if program_cache is None:
+        program_cache = get_program_cache()
+    if payloads:
+        failed += asyncio.run(send_payloads(payloads, api_service, program_cache))
     # log the failed validation messages and send them to Kafka der-gateway-failure topic
     for failure in failed:
         failure.send_to_kafka()
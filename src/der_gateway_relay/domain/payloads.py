@@ -9,6 +9,7 @@ from marshmallow import ValidationError
 
 from der_gateway_relay.builders.program import BuildEnrollmentXML, BuildProgramXML
 from der_gateway_relay.builders.provision_program import ProvisionProgramBuilder
+from der_gateway_relay.domain.program_cache import ProgramCache
 from der_gateway_relay.services.api_service import ApiService
 from der_gateway_relay.topics import DerGatewayFailure
 from shared.system import loggingsys
@@ -24,6 +25,45 @@ class Operation(enum.Enum):
     DELETED = enum.auto()
 
 
+@dataclass
+class Change:
+    """The latest operation on a program contract in a batch, and the records it replaces"""
+
+    operation: Operation
+    program: DerGatewayProgram
+    raw_data: list[dict] = field(default_factory=list)
+    cancelled: bool = False  # created and deleted in the same batch, nothing to send
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return self.program.program.id, self.program.contract.id
+
+    def merge(self, operation: Operation, program: DerGatewayProgram, raw_data: dict) -> bool:
+        """Merge a later operation on the same program contract into this change.
+        Returns False when both operations have to be sent, one after the other.
+
+        created + created/updated -> created with the latest data
+        created + deleted -> cancelled, cancelled + created -> created with the latest data
+        updated + updated/deleted -> the later operation
+        deleted + anything, updated + created -> not merged
+        """
+        if self.cancelled:
+            if operation != Operation.CREATED:
+                return False
+            self.cancelled = False
+        elif self.operation == Operation.DELETED:
+            return False
+        if self.operation == Operation.UPDATED and operation == Operation.CREATED:
+            return False
+        if self.operation == Operation.CREATED and operation == Operation.DELETED:
+            self.cancelled = True
+        elif self.operation == Operation.UPDATED:
+            self.operation = operation
+        self.program = program
+        self.raw_data.append(raw_data)
+        return True
+
+
 @dataclass
 class Payload(abc.ABC):
     """Base class for payloads.
@@ -45,13 +85,27 @@ class Payload(abc.ABC):
     def has_data(self) -> bool:
         return bool(self.data)
 
-    def add(self, program: DerGatewayProgram, raw_data: dict[str, Any]):
-        """Add a program to the payload"""
+    def program_ids(self) -> set[int]:
+        """The ids of the programs in the payload, payloads sharing one are sent in order"""
+        return {program.program.id for program in self.data}
+
+    def add(self, program: DerGatewayProgram, *raw_data: dict[str, Any]):
+        """Add a program to the payload, with the records it was coalesced from"""
         self.data.append(program)
-        self.raw_data.append(raw_data)
+        self.raw_data.extend(raw_data)
+
+    def changed_programs(self, program_cache: Optional[ProgramCache]) -> list[DerGatewayProgram]:
+        """The program definitions to send. Without a cache, all of them.
+        With a cache, the latest definition of each program, unless it was already sent."""
+        if program_cache is None:
+            return self.data
+        latest = {program.program.id: program for program in self.data}
+        return [program for program in latest.values() if not program_cache.is_sent(program)]
 
     @abc.abstractmethod
-    def send_payload(self, api_service: ApiService):
+    async def send_payload(
+        self, api_service: ApiService, program_cache: Optional[ProgramCache] = None
+    ):
         pass
 
     @classmethod
@@ -66,31 +120,51 @@ class Payload(abc.ABC):
         else:
             raise NotImplementedError(f"Operation {op} is not implemented")
 
+    @staticmethod
+    def coalesce(changes: list[Change]) -> list[Change]:
+        """Keep the latest operation on each program contract.
+        A merged change moves to the position of its latest record, so the program definitions
+        shared by several contracts are still sent in the order of the topic."""
+        coalesced: list[Change] = []
+        latest: dict[Tuple[int, int], Change] = {}
+        for change in changes:
+            previous = latest.get(change.key)
+            if previous and previous.merge(change.operation, change.program, change.raw_data[0]):
+                coalesced.remove(previous)
+                change = previous
+            coalesced.append(change)
+            latest[change.key] = change
+        skipped = [c for c in coalesced if c.cancelled]
+        if skipped:
+            logger.info(f"Skipped {len(skipped)} programs created and deleted in the same batch")
+        return [c for c in coalesced if not c.cancelled]
+
     @classmethod
     def validate_and_sort(
-        cls, data: list[ConsumerMessage]
+        cls, data: list[ConsumerMessage], coalesce: bool = False
     ) -> Tuple[list[Payload], list[DerGatewayFailure]]:
         """Validate the data from the der gateway program topic and sort it into groups.
         Groups are defined by the operation type. If the operation type changes, the group
         is closed and a new group is started.
 
+        The whole batch is validated with one schema call.
         If they fail validation, add them to the failed list
+
+        With coalesce, only the latest operation on each program contract is kept (see
+        Change.merge), so the groups are larger and fewer documents are sent to DER Gateway.
         """
         payload: Optional[Payload] = None
         payloads: list[Payload] = []
+        changes: list[Change] = []
         failed: list[DerGatewayFailure] = []
-        schema = DerGatewayProgram.schema()
-        for record in data:
+        _, errors = ConsumerMessage.validate_batch(DerGatewayProgram.schema(), data)
+        for index, record in enumerate(data):
             try:
+                if index in errors:
+                    raise ValidationError(errors[index])
                 # check headers for operation are valid
                 op = Operation[record.headers["operation"]]
-                valid_data: DerGatewayProgram = schema.load(record.value)
-                if not payload:
-                    payload = cls.factory(op)
-                elif op != payload.operation:
-                    payloads.append(payload)
-                    payload = cls.factory(op)
-                payload.add(valid_data, record.value)
+                changes.append(Change(op, record.data, [record.value]))
             except (ValidationError, KeyError) as e:
                 msg = f"DER Gateway Relay error: {e} \n cannot process data"
                 logger.error(msg, exc_info=True)
@@ -101,6 +175,15 @@ class Payload(abc.ABC):
                     reason="validation-failed",
                 )
                 failed.append(failure)
+        if coalesce:
+            changes = cls.coalesce(changes)
+        for change in changes:
+            if not payload:
+                payload = cls.factory(change.operation)
+            elif change.operation != payload.operation:
+                payloads.append(payload)
+                payload = cls.factory(change.operation)
+            payload.add(change.program, *change.raw_data)
         # catch the last payload if it has data
         if payload and payload.has_data():
             payloads.append(payload)
@@ -110,37 +193,58 @@ class Payload(abc.ABC):
 class CreatePayload(Payload):
     """Payload for create operations. Will generate the XML for the create operation"""
 
-    def send_payload(self, api_service: ApiService):
-        # create the new program and enrollment
-        create_program_xml = self.program_builder.build(self.data, action="add")
-        api_service.post_program(create_program_xml)
+    async def send_payload(
+        self, api_service: ApiService, program_cache: Optional[ProgramCache] = None
+    ):
+        # create the new program and enrollment, the programs already sent only get enrollments
+        programs = self.changed_programs(program_cache)
+        if programs:
+            create_program_xml = self.program_builder.build(programs, action="add")
+            await api_service.post_program(create_program_xml)
 
         create_enrollment_xml = self.enrollment_builder.build(self.data, action="add")
-        api_service.post_enrollment(create_enrollment_xml)
+        await api_service.post_enrollment(create_enrollment_xml)
 
-        provision_program = self.provision_builder.build(create_program_xml)
-        api_service.post_provision_program(provision_program)
+        if programs:
+            provision_program = self.provision_builder.build(create_program_xml)
+            await api_service.post_provision_program(provision_program)
+        if program_cache is not None:
+            for program in programs:
+                program_cache.add(program)
 
 
 class UpdatePayload(Payload):
     """Payload for update operations. Will generate the XML for the update operation"""
 
-    def send_payload(self, api_service: ApiService):
-        # update the existing program and enrollment
-        update_program_xml = self.program_builder.build(self.data, action="update")
-        api_service.post_program(update_program_xml)
+    async def send_payload(
+        self, api_service: ApiService, program_cache: Optional[ProgramCache] = None
+    ):
+        # update the existing program and enrollment, unchanged programs only get enrollments
+        programs = self.changed_programs(program_cache)
+        if programs:
+            update_program_xml = self.program_builder.build(programs, action="update")
+            await api_service.post_program(update_program_xml)
 
         update_enrollment_xml = self.enrollment_builder.build(self.data, action="update")
-        api_service.post_enrollment(update_enrollment_xml)
+        await api_service.post_enrollment(update_enrollment_xml)
+        if program_cache is not None:
+            for program in programs:
+                program_cache.add(program)
 
 
 class DeletePayload(Payload):
     """Payload for delete operations. Will generate the XML for the delete operation"""
 
-    def send_payload(self, api_service: ApiService):
+    async def send_payload(
+        self, api_service: ApiService, program_cache: Optional[ProgramCache] = None
+    ):
         # delete the existing program and enrollment
+        if program_cache is not None:
+            # sent again if they are created again, even if this request fails
+            for program in self.data:
+                program_cache.discard(program)
         delete_program_xml = self.program_builder.build(self.data, action="remove")
-        api_service.post_program(delete_program_xml)
+        await api_service.post_program(delete_program_xml)
 
         delete_enrollment_xml = self.enrollment_builder.build(self.data, action="remove")
-        api_service.post_enrollment(delete_enrollment_xml)
+        await api_service.post_enrollment(delete_enrollment_xml)
@@ -0,0 +1,82 @@
+"""Cache of the program definitions sent to DER Gateway.
+
+The same program is often received again with an identical definition, e.g. for each new
+contract. The cache keeps the hash of the last definition sent for each program id, so the
+payloads only build and post the programs that changed, and the enrollments.
+The cache is bounded: the least recently used programs are evicted past max_size, and the
+entries expire after ttl_seconds so the definitions are sent again now and then.
+
+The cache is local to a relay instance, while the programs sent to DER Gateway are shared by
+all of them. It relies on the der-gateway-program topic being keyed by program id: all the
+operations on a program go through the instance that owns its partition, so no other instance
+can change or delete a program this one has cached. The cache must be cleared when partitions
+are assigned, since another instance may have owned them in the meantime.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from shared.tasks import codec
+from shared.validators.der_gateway_data import DerGatewayProgram
+
+DEFAULT_MAX_SIZE = 1000
+DEFAULT_TTL_SECONDS = 3600
+
+
+def program_hash(program: DerGatewayProgram) -> str:
+    """Stable hash of the program section, independent of the order of its keys"""
+    normalized = json.dumps(
+        program.program.to_dict(encode_json=True),
+        sort_keys=True,
+        separators=(",", ":"),
+        default=codec.default,
+    )
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class ProgramCache:
+    """LRU cache of the hash of the last definition sent for each program id, with a TTL.
+    A max_size of 0 disables the cache."""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._programs: OrderedDict[int, Tuple[str, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._programs)
+
+    def is_sent(self, program: DerGatewayProgram) -> bool:
+        """True if this definition of the program was the last one sent, and has not expired"""
+        program_id = program.program.id
+        entry = self._programs.get(program_id)
+        if entry is None:
+            return False
+        sent_hash, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._programs[program_id]
+            return False
+        self._programs.move_to_end(program_id)
+        return sent_hash == program_hash(program)
+
+    def add(self, program: DerGatewayProgram):
+        """Remember the definition of the program after it was sent"""
+        if self.max_size <= 0:
+            return
+        program_id = program.program.id
+        self._programs[program_id] = (program_hash(program), time.monotonic() + self.ttl_seconds)
+        self._programs.move_to_end(program_id)
+        while len(self._programs) > self.max_size:
+            self._programs.popitem(last=False)
+
+    def clear(self):
+        """Forget all the programs, e.g. after a rebalance of the consumer group"""
+        self._programs.clear()
+
+    def discard(self, program: DerGatewayProgram):
+        """Forget the program, e.g. after it was removed from DER Gateway"""
+        self._programs.pop(program.program.id, None)
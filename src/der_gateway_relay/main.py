@@ -1,7 +1,10 @@
 from dotenv import load_dotenv
 
 from der_gateway_relay.config import DerGatewayRelayConfig
-from der_gateway_relay.consumer import handle_der_gateway_program  # noqa
+from der_gateway_relay.consumer import (  # noqa
+    clear_program_cache,
+    handle_der_gateway_program,
+)
 from shared.system import configuration, loggingsys
 from shared.tasks.consumer import BatchMessageConsumer
 
@@ -11,8 +14,6 @@ config = configuration.init_config(DerGatewayRelayConfig)
 loggingsys.init(config)
 logger = loggingsys.get_logger(__name__)
 
-MAX_MESSAGES = 1
-TIMEOUT_SECONDS = 1
 CONSUMER_GROUP = "der-gateway-relay"
 
 
@@ -21,7 +22,8 @@ if __name__ == "__main__":
     consumer = BatchMessageConsumer.factory(
         url=config.KAFKA_URL,
         group_id=CONSUMER_GROUP,
-        max_bulk_messages=MAX_MESSAGES,
-        bulk_timeout_seconds=TIMEOUT_SECONDS,
+        max_bulk_messages=config.DER_GATEWAY_BATCH_SIZE,
+        bulk_timeout_seconds=config.DER_GATEWAY_BATCH_TIMEOUT_SECONDS,
+        on_partitions_assigned=clear_program_cache,
     )
     consumer.listen()
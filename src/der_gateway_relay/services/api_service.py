@@ -1,18 +1,39 @@
+import asyncio
+from typing import Optional
+
 import requests  # type: ignore
+from requests.adapters import HTTPAdapter  # type: ignore
 from requests.exceptions import HTTPError, RequestException  # type: ignore
 
 from shared.system import configuration, loggingsys
-from shared.tools.retry_on_exception import retry_on_exception
+from shared.tools.retry_on_exception import async_retry_on_exception
 
 logger = loggingsys.get_logger(__name__)
 
 WS = "REGISTRATION"
+DEFAULT_MAX_CONCURRENCY = 4
 
 
 class ApiService:
-    def __init__(self):
-        self.session = requests.Session()
+    """Posts the XML documents to DER Gateway.
+
+    The posts are coroutines. The connections are pooled by a shared requests session, and the
+    blocking requests run in threads, at most max_concurrency at a time for each endpoint.
+    Create the service once and reuse it, so the connections are kept alive between batches.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None):
         config = configuration.get_config()
+        if max_concurrency is None:
+            max_concurrency = int(
+                getattr(config, "DER_GATEWAY_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)
+            )
+        self.max_concurrency: int = max_concurrency
+        self.session = requests.Session()
+        # 3 endpoints, each with max_concurrency connections
+        adapter = HTTPAdapter(pool_maxsize=self.max_concurrency * 3)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         self.PROGRAM_ENDPOINT = (
             f"{config.DER_GATEWAY_URL}/registration-service/api/v2/registration/ws/{WS}/programs"
         )
@@ -22,27 +43,45 @@ class ApiService:
         self.PROVISION_ENDPOINT = (
             f"{config.DER_GATEWAY_URL}/registration-service/api/v2/provision/programs"
         )
+        # semaphores are bound to the event loop they are used in
+        self._limits: dict[str, asyncio.Semaphore] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
 
-    def post_program(self, data: str):
+    async def post_program(self, data: str):
         """Takes in the data as an XML string and posts it to the program endpoint.
         Will retry up to 3 times if the request fails with a short exponential backoff.
         """
-        self._post(self.PROGRAM_ENDPOINT, data)
+        await self._post(self.PROGRAM_ENDPOINT, data)
 
-    def post_enrollment(self, data: str):
+    async def post_enrollment(self, data: str):
         """Takes in the data as an XML string and posts it to the enrollment endpoint.
         Will retry up to 3 times if the request fails with a short exponential backoff.
         """
-        self._post(self.ENROLLMENT_ENDPOINT, data)
+        await self._post(self.ENROLLMENT_ENDPOINT, data)
 
-    def post_provision_program(self, data: str):
+    async def post_provision_program(self, data: str):
         """Takes in the data as an XML string and posts it to the enrollment endpoint.
         Will retry up to 3 times if the request fails with a short exponential backoff.
         """
-        self._post(self.ENROLLMENT_ENDPOINT, data)
+        await self._post(self.ENROLLMENT_ENDPOINT, data)
+
+    def _get_limit(self, url: str) -> asyncio.Semaphore:
+        """The semaphore limiting the concurrent requests to url in the running event loop."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._limits = {}
+        if url not in self._limits:
+            self._limits[url] = asyncio.Semaphore(self.max_concurrency)
+        return self._limits[url]
+
+    @async_retry_on_exception(num_retries=3, backoff=1, errors=(HTTPError, RequestException))
+    async def _post(self, url: str, data: str) -> requests.Response:
+        # the semaphore is released during the retry backoff
+        async with self._get_limit(url):
+            return await asyncio.to_thread(self._send, url, data)
 
-    @retry_on_exception(num_retries=3, backoff=1, errors=(HTTPError, RequestException))
-    def _post(self, url: str, data: str) -> requests.Response:
+    def _send(self, url: str, data: str) -> requests.Response:
         logger.info(f"Sending data to {url}. Data: {data}")
         headers = {"Content-Type": "application/xml"}
         response = self.session.post(url, data=data, headers=headers)
@@ -135,3 +135,39 @@ class TestPayload:
         assert payloads[0].operation == Operation.CREATED
         assert len(payloads[0].data) == 1
         assert len(failures) == 2
+
+    def test_coalesce_keeps_latest_operation(self, der_gateway_program_payload):
+        updated = deepcopy(der_gateway_program_payload)
+        updated["program"]["name"] = "Updated Program"
+        other_contract = deepcopy(der_gateway_program_payload)
+        other_contract["contract"]["id"] = 2
+        records = make_consumer(der_gateway_program_payload, count=1)
+        records += make_consumer(other_contract, operation=Operation.UPDATED.name, count=1)
+        records += make_consumer(updated, operation=Operation.UPDATED.name, count=1)
+        records += make_consumer(other_contract, operation=Operation.DELETED.name, count=1)
+        payloads, failures = Payload.validate_and_sort(records, coalesce=True)
+        assert len(failures) == 0
+        assert [(p.operation, len(p.data)) for p in payloads] == [
+            (Operation.CREATED, 1),
+            (Operation.DELETED, 1),
+        ]
+        # the create has the latest data, and keeps its records for error reporting
+        assert payloads[0].data[0].program.name == "Updated Program"
+        assert payloads[0].raw_data == [der_gateway_program_payload, updated]
+        assert payloads[1].data[0].contract.id == 2
+
+    def test_coalesce_created_and_deleted(self, der_gateway_program_payload):
+        records = make_consumer(der_gateway_program_payload, count=2)
+        records += make_consumer(
+            der_gateway_program_payload, operation=Operation.DELETED.name, count=1
+        )
+        payloads, _ = Payload.validate_and_sort(records, coalesce=True)
+        assert payloads == []
+        # a delete is not merged with the operations after it
+        records += make_consumer(der_gateway_program_payload, count=1)
+        records = (
+            make_consumer(der_gateway_program_payload, operation=Operation.DELETED.name, count=1)
+            + records
+        )
+        payloads, _ = Payload.validate_and_sort(records, coalesce=True)
+        assert [p.operation for p in payloads] == [Operation.DELETED, Operation.CREATED]
@@ -0,0 +1,61 @@
+import copy
+from unittest.mock import patch
+
+from der_gateway_relay.domain.program_cache import ProgramCache, program_hash
+
+
+def make_program(single_payload, program_id):
+    program = copy.deepcopy(single_payload)
+    program.program.id = program_id
+    return program
+
+
+class TestProgramCache:
+    def test_program_hash_ignores_contract_and_enrollment(self, single_payload):
+        other_contract = copy.deepcopy(single_payload)
+        other_contract.contract.id = 2
+        other_contract.enrollment.der_id = "other"
+        assert program_hash(single_payload) == program_hash(other_contract)
+        other_contract.program.name = "Changed"
+        assert program_hash(single_payload) != program_hash(other_contract)
+
+    def test_is_sent(self, single_payload):
+        cache = ProgramCache()
+        assert not cache.is_sent(single_payload)
+        cache.add(single_payload)
+        assert cache.is_sent(single_payload)
+        changed = copy.deepcopy(single_payload)
+        changed.program.name = "Changed"
+        assert not cache.is_sent(changed)
+        cache.discard(single_payload)
+        assert not cache.is_sent(single_payload)
+
+    def test_evicts_least_recently_used(self, single_payload):
+        cache = ProgramCache(max_size=2)
+        first, second, third = (make_program(single_payload, i) for i in (1, 2, 3))
+        cache.add(first)
+        cache.add(second)
+        assert cache.is_sent(first)  # second is now the least recently used
+        cache.add(third)
+        assert len(cache) == 2
+        assert cache.is_sent(first)
+        assert not cache.is_sent(second)
+
+    def test_expires(self, single_payload):
+        cache = ProgramCache(ttl_seconds=10)
+        with patch("der_gateway_relay.domain.program_cache.time.monotonic", return_value=100):
+            cache.add(single_payload)
+        with patch("der_gateway_relay.domain.program_cache.time.monotonic", return_value=110):
+            assert not cache.is_sent(single_payload)
+        assert len(cache) == 0
+
+    def test_clear(self, single_payload):
+        cache = ProgramCache()
+        cache.add(single_payload)
+        cache.clear()
+        assert not cache.is_sent(single_payload)
+
+    def test_disabled(self, single_payload):
+        cache = ProgramCache(max_size=0)
+        cache.add(single_payload)
+        assert not cache.is_sent(single_payload)
@@ -1,3 +1,6 @@
+import asyncio
+import time
+
 import pytest
 import requests_mock
 
@@ -11,7 +14,7 @@ class TestApiService:
             m.register_uri("POST", url, status_code=200)
             api_service = ApiService()
             api_service.PROGRAM_ENDPOINT = url
-            api_service.post_program("test data")
+            asyncio.run(api_service.post_program("test data"))
 
     def test_post_enrollment(self, config):
         with requests_mock.Mocker() as m:
@@ -19,7 +22,7 @@ class TestApiService:
             m.register_uri("POST", url, status_code=200)
             api_service = ApiService()
             api_service.ENROLLMENT_ENDPOINT = url
-            api_service.post_enrollment("test data")
+            asyncio.run(api_service.post_enrollment("test data"))
 
     def test_post_provision(self, config):
         with requests_mock.Mocker() as m:
@@ -27,7 +30,7 @@ class TestApiService:
             m.register_uri("POST", url, status_code=200)
             api_service = ApiService()
             api_service.ENROLLMENT_ENDPOINT = url
-            api_service.post_enrollment("test data")
+            asyncio.run(api_service.post_enrollment("test data"))
 
     @pytest.mark.skip(reason="Takes a while, will be a system e2e test")
     def test_post_program_failure(self, config):
@@ -37,7 +40,7 @@ class TestApiService:
             api_service = ApiService()
             api_service.PROGRAM_ENDPOINT = url
             try:
-                api_service.post_program("test data")
+                asyncio.run(api_service.post_program("test data"))
             except Exception as e:
                 assert e.response.status_code == 500
 
@@ -49,6 +52,25 @@ class TestApiService:
             api_service = ApiService()
             api_service.ENROLLMENT_ENDPOINT = url
             try:
-                api_service.post_enrollment("test data")
+                asyncio.run(api_service.post_enrollment("test data"))
             except Exception as e:
                 assert e.response.status_code == 500
+
+    def test_concurrency_limit(self, config):
+        api_service = ApiService(max_concurrency=2)
+        running = []
+        most_running = []
+
+        def send(url, data):
+            running.append(url)
+            most_running.append(len(running))
+            time.sleep(0.05)
+            running.remove(url)
+
+        api_service._send = send
+
+        async def post_all():
+            await asyncio.gather(*[api_service.post_program(str(i)) for i in range(6)])
+
+        asyncio.run(post_all())
+        assert max(most_running) == 2
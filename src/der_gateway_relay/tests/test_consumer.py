@@ -1,13 +1,18 @@
+import asyncio
+import copy
 from unittest.mock import Mock
 
 from der_gateway_relay.config import DerGatewayRelayConfig
-from der_gateway_relay.consumer import handle_der_gateway_program
+from der_gateway_relay.consumer import handle_der_gateway_program, send_payloads
 from der_gateway_relay.domain import payloads
+from der_gateway_relay.domain.program_cache import ProgramCache
 from der_gateway_relay.services.api_service import ApiService
+from shared.system import configuration
 from shared.tasks.consumer import ConsumerMessage
 from shared.tasks.producer import Producer
 
 DER_GATEWAY_PROGRAM_TOPIC = DerGatewayRelayConfig.DER_GATEWAY_PROGRAM_TOPIC
+NO_CACHE = ProgramCache(max_size=0)
 
 
 def make_consumer(value, operation=payloads.Operation.CREATED.name, count=100):
@@ -26,7 +31,7 @@ def make_consumer(value, operation=payloads.Operation.CREATED.name, count=100):
 def test_consumer(der_gateway_program_payload):
     data = make_consumer(der_gateway_program_payload, count=100)
     api_service = Mock(spec=ApiService)
-    handle_der_gateway_program(data, api_service)
+    handle_der_gateway_program(data, api_service, coalesce=False, program_cache=NO_CACHE)
     # check no messages were sent to Kafka
     assert Producer._producer is None
     # check the api service was called the correct number of times
@@ -42,7 +47,7 @@ def test_consumer_multiple_payloads(der_gateway_program_payload):
     )
     data += make_consumer(der_gateway_program_payload, count=29)
     api_service = Mock(spec=ApiService)
-    handle_der_gateway_program(data, api_service)
+    handle_der_gateway_program(data, api_service, coalesce=False, program_cache=NO_CACHE)
     # check no messages were sent to Kafka
     assert Producer._producer is None
     # check the api service was called the correct number of times
@@ -53,13 +58,75 @@ def test_consumer_multiple_payloads(der_gateway_program_payload):
     assert api_service.post_provision_program.call_count == 2
 
 
+def test_consumer_coalesced(der_gateway_program_payload):
+    other_contract = copy.deepcopy(der_gateway_program_payload)
+    other_contract["contract"]["id"] = 2
+    data = make_consumer(der_gateway_program_payload, count=30)
+    data += make_consumer(
+        der_gateway_program_payload, operation=payloads.Operation.UPDATED.name, count=1
+    )
+    data += make_consumer(other_contract, count=29)
+    api_service = Mock(spec=ApiService)
+    handle_der_gateway_program(data, api_service, coalesce=True, program_cache=NO_CACHE)
+    assert Producer._producer is None
+    # both contracts are created with one document per call
+    assert api_service.post_program.call_count == 1
+    assert api_service.post_enrollment.call_count == 1
+    assert api_service.post_provision_program.call_count == 1
+
+
+def test_consumer_coalesces_by_default(der_gateway_program_payload, monkeypatch):
+    monkeypatch.delenv("DER_GATEWAY_COALESCE", raising=False)
+    monkeypatch.setattr(configuration, "CONFIG", None)
+    configuration.init_config(DerGatewayRelayConfig)
+    data = make_consumer(der_gateway_program_payload, count=30)
+    data += make_consumer(
+        der_gateway_program_payload, operation=payloads.Operation.UPDATED.name, count=1
+    )
+    data += make_consumer(der_gateway_program_payload, count=29)
+    api_service = Mock(spec=ApiService)
+    handle_der_gateway_program(data, api_service, program_cache=NO_CACHE)
+    # the records of the contract are coalesced into one create
+    assert api_service.post_program.call_count == 1
+    assert api_service.post_enrollment.call_count == 1
+    assert api_service.post_provision_program.call_count == 1
+
+
+def test_consumer_skips_programs_already_sent(der_gateway_program_payload):
+    other_contract = copy.deepcopy(der_gateway_program_payload)
+    other_contract["contract"]["id"] = 2
+    changed_program = copy.deepcopy(der_gateway_program_payload)
+    changed_program["program"]["name"] = "Changed Program"
+    program_cache = ProgramCache()
+    api_service = Mock(spec=ApiService)
+    handle_der_gateway_program(
+        make_consumer(der_gateway_program_payload, count=1), api_service, False, program_cache
+    )
+    # same program definition, only the enrollment of the new contract is sent
+    handle_der_gateway_program(
+        make_consumer(other_contract, count=1), api_service, False, program_cache
+    )
+    assert api_service.post_program.call_count == 1
+    assert api_service.post_enrollment.call_count == 2
+    assert api_service.post_provision_program.call_count == 1
+    # the program changed, it is sent again
+    handle_der_gateway_program(
+        make_consumer(changed_program, operation=payloads.Operation.UPDATED.name, count=1),
+        api_service,
+        False,
+        program_cache,
+    )
+    assert api_service.post_program.call_count == 2
+    assert api_service.post_enrollment.call_count == 3
+
+
 def test_consumer_with_failures(der_gateway_program_payload):
     valid_count = 30
     invalid_count = 30
     data = make_consumer(der_gateway_program_payload, count=valid_count)
     data += make_consumer({}, count=invalid_count)  # should fail and send to dead letter queue
     api_service = Mock(spec=ApiService)
-    handle_der_gateway_program(data, api_service)
+    handle_der_gateway_program(data, api_service, coalesce=False, program_cache=NO_CACHE)
     # check failed records were sent to Kafka
     assert Producer._producer.produce.call_count == invalid_count
     # check the api service was called the correct number of times
@@ -68,6 +135,34 @@ def test_consumer_with_failures(der_gateway_program_payload):
     assert api_service.post_provision_program.call_count == 1
 
 
+def test_send_payloads_keeps_program_order(single_payload):
+    other_program = copy.deepcopy(single_payload)
+    other_program.program.id = 2
+    sent = []
+
+    def make_payload(name, operation, program, delay):
+        payload = payloads.Payload.factory(operation)
+        payload.add(program, {})
+
+        async def send_payload(api_service, program_cache=None):
+            await asyncio.sleep(delay)
+            sent.append(name)
+
+        payload.send_payload = send_payload
+        return payload
+
+    batch = [
+        # the create is the slowest, the update would overtake it if they were not ordered
+        make_payload("create 1", payloads.Operation.CREATED, single_payload, 0.05),
+        make_payload("update 1", payloads.Operation.UPDATED, single_payload, 0),
+        make_payload("create 2", payloads.Operation.CREATED, other_program, 0),
+    ]
+    failed = asyncio.run(send_payloads(batch, Mock(spec=ApiService)))
+    assert failed == []
+    # program 2 was sent without waiting for program 1
+    assert sent == ["create 2", "create 1", "update 1"]
+
+
 def test_ConsumerMessage_from_message_list():
     kafka_message = Mock()
     attrs = {
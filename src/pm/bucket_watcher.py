@@ -1,11 +1,16 @@
 import csv
 import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from itertools import islice, zip_longest
-from typing import Generator, Iterable
+from typing import Callable, Generator, Iterable
 
 from confluent_kafka.error import ProduceError
 from dotenv import load_dotenv
 from marshmallow import ValidationError
+from minio.error import MinioException
 
 from pm.config import PMConfig
 from pm.modules.enrollment.models import *  # noqa
@@ -20,6 +25,14 @@ loggingsys.init(config)
 
 logger = loggingsys.get_logger(__name__)
 
+# minio tag holding the number of the last batch of a file that was processed, so a
+# restarted watcher can resume the file from the next batch
+LAST_BATCH_TAG = "last_batch_number"
+# the checkpoint tag is saved at most this often, each save is two minio calls
+CHECKPOINT_INTERVAL_SECONDS = 5.0
+# how often a file waiting for its deliveries polls the producer
+DELIVERY_WAIT_SECONDS = 0.1
+
 
 def batched(iterable, n):
     """Batch data into lists of length n. The last batch may be shorter.
@@ -54,7 +67,7 @@ class ExtractCSVrows:
     """Context manager : given a filename, extract each row as a dict for sending off to a topic"""
 
     message_class: Message
-    file_handle: io.StringIO
+    file_handle: io.TextIOBase
     input_file: csv.DictReader
 
     def __init__(self, file_name: str, path: str):
@@ -68,10 +81,14 @@ class ExtractCSVrows:
             self.message_class: Message = Message.get_matching_class_label(
                 class_label_to_check=file_tag
             )
-            self.file_handle = file_manager.get_string_io(file_name)
+            self.file_handle = file_manager.get_text_stream(file_name)
             self.input_file = csv.DictReader(self.file_handle)
+            # read the header row now, so files that aren't text fail before any row is sent
+            self.input_file.fieldnames
         except (ValidationError, UnicodeDecodeError) as e:
             logger.error(f"34:file {file_name} error: {e}")
+            if hasattr(self, "file_handle"):
+                self.file_handle.close()
             file_manager.move_file(
                 source_bucket=path,
                 source_filename=file_name,
@@ -89,25 +106,80 @@ class ExtractCSVrows:
         self.file_handle.close()
 
 
-def listen_to_bucket_process_rows():
+def process_file(file_name: str) -> None:
+    """Send the rows of a csv file in the source bucket to kafka, tag the file if any row
+    failed, and move it to the processed bucket"""
     config = configuration.get_config()
     file_manager = MinioManager(bucket_name=config.MINIO_SOURCE_FOLDER)
-    for file_name in file_manager.listen_bucket_notification():
-        csv_rows_as_dicts_generator = ExtractCSVrows(
-            file_name=file_name,
-            path=config.MINIO_SOURCE_FOLDER,
-        )
-        tags = file_manager.get_tags(file_name=file_name)
-        with csv_rows_as_dicts_generator as row_generator:
-            message_class = csv_rows_as_dicts_generator.message_class
-            success = send_batches_to_kafka(message_class, row_generator, tags)
-            if not success:
-                add_fail_status_minio_tag(file_manager, file_name)
-        move_file_to_destination(
-            config.MINIO_SOURCE_FOLDER,
-            file_name,
-            config.MINIO_PROCESSED_FOLDER,
+    csv_rows_as_dicts_generator = ExtractCSVrows(
+        file_name=file_name,
+        path=config.MINIO_SOURCE_FOLDER,
+    )
+    # the file name lets the progress of files processed at the same time be told apart
+    tags = {**file_manager.get_tags(file_name=file_name), "file_name": file_name}
+    last_batch_number = tags.pop(LAST_BATCH_TAG, None)
+    start_batch = int(last_batch_number) + 1 if last_batch_number is not None else 0
+    if start_batch:
+        logger.info(f"resuming file {file_name} from batch {start_batch}")
+    with csv_rows_as_dicts_generator as row_generator:
+        message_class = csv_rows_as_dicts_generator.message_class
+        success = send_batches_to_kafka(
+            message_class,
+            row_generator,
+            tags,
+            start_batch=start_batch,
+            on_batch_done=partial(save_checkpoint, file_manager, file_name),
         )
+        if not success:
+            add_fail_status_minio_tag(file_manager, file_name)
+    move_file_to_destination(
+        config.MINIO_SOURCE_FOLDER,
+        file_name,
+        config.MINIO_PROCESSED_FOLDER,
+    )
+
+
+def process_files_concurrently(file_names: Iterable[str], max_workers: int) -> None:
+    """Process up to max_workers files at the same time.
+
+    The next file name is only taken once a worker is free, and a file that is already
+    being processed is skipped. An error processing one file is logged and doesn't stop
+    the other files.
+    """
+    free_workers = threading.BoundedSemaphore(max_workers)
+    in_progress: set[str] = set()
+    lock = threading.Lock()
+
+    def process(file_name: str) -> None:
+        try:
+            process_file(file_name)
+        except Exception as e:
+            logger.error(f"error processing file {file_name}: {e}")
+        finally:
+            with lock:
+                in_progress.discard(file_name)
+            free_workers.release()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for file_name in file_names:
+            free_workers.acquire()
+            with lock:
+                if file_name in in_progress:
+                    free_workers.release()
+                    continue
+                in_progress.add(file_name)
+            executor.submit(process, file_name)
+
+
+def listen_to_bucket_process_rows(max_workers: int = 1):
+    config = configuration.get_config()
+    file_manager = MinioManager(bucket_name=config.MINIO_SOURCE_FOLDER)
+    file_names = file_manager.listen_bucket_notification()
+    if max_workers > 1:
+        process_files_concurrently(file_names, max_workers)
+        return
+    for file_name in file_names:
+        process_file(file_name)
 
 
 def add_fail_status_minio_tag(file_manager, file_name):
@@ -120,45 +192,176 @@ def add_fail_status_minio_tag(file_manager, file_name):
     )
 
 
+def save_checkpoint(file_manager: MinioManager, file_name: str, batch_number: int) -> None:
+    file_manager.add_tags(file_name=file_name, new_tags={LAST_BATCH_TAG: str(batch_number)})
+
+
+class BatchProgressTracker:
+    """Tracks the batches of a file that are sent to kafka without waiting for each one.
+
+    A batch is done when its message is delivered or fails, or when it has no valid rows.
+    The progress notification of a batch is sent once the batch is confirmed, and the
+    checkpoint only moves past a batch once it and all the batches before it are done.
+    The checkpoint is saved at most every checkpoint_interval_seconds.
+
+    The producer is shared by the files processed at the same time, and the delivery
+    callbacks run on whichever thread polls or flushes it, so the tracker is locked, and
+    wait_for_deliveries waits until the callbacks of this file's batches have all run.
+    """
+
+    def __init__(
+        self,
+        message_class: Message,
+        tags: dict,
+        start_batch: int = 0,
+        on_batch_done: Callable[[int], None] | None = None,
+        checkpoint_interval_seconds: float = CHECKPOINT_INTERVAL_SECONDS,
+    ):
+        self.message_class = message_class
+        self.tags = tags
+        self.on_batch_done = on_batch_done
+        self.checkpoint_interval_seconds = checkpoint_interval_seconds
+        self.success = True
+        self._next_batch = start_batch
+        self._done: set[int] = set()
+        self._last_checkpoint: float | None = None
+        self._pending = 0  # batches sent and not delivered yet
+        self._condition = threading.Condition()
+
+    def delivery_callback(self, batch_number: int) -> Callable:
+        """Count the batch as pending, and return the callback for its delivery report"""
+        with self._condition:
+            self._pending += 1
+
+        def on_delivery(err, msg):
+            try:
+                if err:
+                    logger.error(f"batch {batch_number} delivery error: {err}")
+                    self.batch_failed(batch_number)
+                else:
+                    self.batch_done(batch_number)
+            finally:
+                with self._condition:
+                    self._pending -= 1
+                    self._condition.notify_all()
+
+        return on_delivery
+
+    def wait_for_deliveries(self) -> None:
+        """Wait until the delivery callbacks of all the batches sent have run"""
+        while True:
+            with self._condition:
+                if self._pending:
+                    self._condition.wait(DELIVERY_WAIT_SECONDS)
+                if not self._pending:
+                    return
+            # the reports may still be queued, with no other thread polling the producer
+            self.message_class.poll_kafka()
+
+    def batch_done(self, batch_number: int) -> None:
+        self.message_class.send_progress_notification(batch_number=batch_number, tags=self.tags)
+        self._checkpoint(batch_number)
+
+    def batch_failed(self, batch_number: int) -> None:
+        with self._condition:
+            self.success = False
+        self._checkpoint(batch_number)
+
+    def _checkpoint(self, batch_number: int) -> None:
+        with self._condition:
+            self._done.add(batch_number)
+            last_batch = None
+            while self._next_batch in self._done:
+                self._done.remove(self._next_batch)
+                last_batch = self._next_batch
+                self._next_batch += 1
+            if last_batch is None or not self.on_batch_done:
+                return
+            now = time.monotonic()
+            if (
+                self._last_checkpoint is not None
+                and now - self._last_checkpoint < self.checkpoint_interval_seconds
+            ):
+                return
+            self._last_checkpoint = now
+            try:
+                # saved under the lock, so an older checkpoint never overwrites a newer one
+                self.on_batch_done(last_batch)
+            except MinioException as e:
+                # the callback may run on another file's thread, don't fail that file
+                logger.error(f"error saving checkpoint of batch {last_batch}: {e}")
+
+
 def send_batches_to_kafka(
     message_class: Message,
     row_generator: Iterable,
     tags: dict,
+    start_batch: int = 0,
+    on_batch_done: Callable[[int], None] | None = None,
+    checkpoint_interval_seconds: float = CHECKPOINT_INTERVAL_SECONDS,
 ) -> bool:
+    """Send the rows to kafka in batches of the message class batch size.
+
+    Batches are produced without waiting for the broker: their delivery reports are
+    served as the next batches are produced, with a single flush at the end of the file.
+    The batches before start_batch are skipped, to resume a partly processed file.
+    on_batch_done is called with the number of the last batch done with no batch before it
+    still pending, to checkpoint the progress through the file, at most every
+    checkpoint_interval_seconds.
+    Only returns once the delivery reports of all the batches of the file were handled.
+    Returns False if any row or batch failed, or if the rest of the file can't be decoded.
+    """
     file_processed_successfully = True
-    for batch_number, row_batch in enumerate(
+    tracker = BatchProgressTracker(
+        message_class, tags, start_batch, on_batch_done, checkpoint_interval_seconds
+    )
+    batches = enumerate(
         batched(
             row_generator,
             message_class.Meta.batch_size,
         )
-    ):
-        try:
-            batch_data = [
-                message_class.message_factory(
-                    row,
-                    row_number,
-                    batch_number,
-                    tags,
-                )
-                for row_number, row in enumerate(
-                    row_batch,
-                    start=1,
-                )
-            ]
-            if None in batch_data:
-                # at least one row failed
-                file_processed_successfully = False
-                batch_data.remove(None)
-
-            if batch_data:
-                message_class.send_batch_to_kafka(batch_data)
-                message_class.flush_kafka()
-            message_class.send_progress_notification(batch_number=batch_number, tags=tags)
-        except (ProduceError, ValidationError, KeyError) as e:
-            logger.error(f"129: csv processing error: {e}")
-            file_processed_successfully = False
-            continue
-    return file_processed_successfully
+    )
+    try:
+        for batch_number, row_batch in islice(batches, start_batch, None):
+            try:
+                batch_data = [
+                    message_class.message_factory(
+                        row,
+                        row_number,
+                        batch_number,
+                        tags,
+                    )
+                    for row_number, row in enumerate(
+                        row_batch,
+                        start=1,
+                    )
+                ]
+                if None in batch_data:
+                    # at least one row failed
+                    file_processed_successfully = False
+                    batch_data = [message for message in batch_data if message is not None]
+
+                if batch_data:
+                    on_delivery = tracker.delivery_callback(batch_number)
+                    try:
+                        message_class.send_batch_to_kafka(batch_data, on_delivery=on_delivery)
+                    except ProduceError as e:
+                        # the batch wasn't queued, no delivery report will come for it
+                        on_delivery(e, None)
+                    message_class.poll_kafka()
+                else:
+                    tracker.batch_done(batch_number)
+            except (ProduceError, ValidationError, KeyError) as e:
+                logger.error(f"129: csv processing error: {e}")
+                tracker.batch_failed(batch_number)
+    except UnicodeDecodeError as e:
+        # the file is decoded as it is read, the rest of it can't be read
+        logger.error(f"csv decoding error, the rest of the file is skipped: {e}")
+        file_processed_successfully = False
+    message_class.flush_kafka()
+    # another file's thread may still be running the callbacks of this file's batches
+    tracker.wait_for_deliveries()
+    return file_processed_successfully and tracker.success
 
 
 def move_file_to_destination(
@@ -191,11 +394,11 @@ def initialize_buckets(file_manager: MinioManager | None = None):
 
 
 def main_file_watcher():
-    logger.info("starting file watcher...")
+    logger.info(f"starting file watcher with {config.MINIO_FILE_WORKERS} file workers...")
     initialize_buckets()
     while True:
         try:
-            listen_to_bucket_process_rows()
+            listen_to_bucket_process_rows(max_workers=config.MINIO_FILE_WORKERS)
         except Exception as e:
             logger.error(e)
 
@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from dataclasses import dataclass
 
 from shared.system.configuration import Config
@@ -8,3 +10,26 @@ class PMConfig(Config):
     MAX_HOL_CAL_FILE_SIZE: int = 1 * 1024 * 1024  # 1 Megabyte
 
     DB_NAME: str = "pmcore"
+
+    # number of csv files the bucket watcher processes at the same time
+    MINIO_FILE_WORKERS: int = 1
+
+    # the dispatchers claim OUTBOX_BATCH_SIZE messages at a time. Claims take a global advisory
+    # lock, so the claims of all the dispatchers are serialized, while the sending is parallel
+    OUTBOX_BATCH_SIZE: int = 500
+    OUTBOX_LEASE_SECONDS: int = 60
+    OUTBOX_POLL_INTERVAL_SECONDS: int = 5
+    # the outbox dispatcher is woken with LISTEN/NOTIFY, and only polls as a fallback.
+    # Set to only poll the outbox.
+    OUTBOX_POLL_ONLY: bool = False
+    OUTBOX_RETENTION_DAYS: int = 7
+    # move old sent messages to the outbox_archive table instead of deleting them
+    OUTBOX_ARCHIVE: bool = False
+
+    # partitions of the topics created in dev mode, the most consumers a topic can scale to
+    KAFKA_TOPIC_PARTITIONS: int = 6
+    # consumer processes run by pm.worker_supervisor, as `topic=consumer_type:processes`
+    # entries separated by commas. `*` stands for all the topics of the consumer type.
+    WORKER_PLAN: str = "*=single:1,*=batch:1"
+    WORKER_RESTART_DELAY_SECONDS: int = 5
+    WORKER_STOP_TIMEOUT_SECONDS: int = 30
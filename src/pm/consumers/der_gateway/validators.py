@@ -8,11 +8,32 @@ class TimeZoneMixin:
         return datetime.fromtimestamp(ts, tz=timezone.utc)
 
 
+class DerControlSchema(ma.Schema):
+    """Schema for the der-control topic.
+    Converts the keys to snake case and to program manager terms
+    """
+
+    class Meta:
+        unknown = ma.EXCLUDE
+
+    event_id = ma.fields.Raw(required=True, data_key="dermDispatchId")
+    start_date_time = ma.fields.Integer(required=True, data_key="startTime")
+    end_date_time = ma.fields.Integer(required=True, data_key="endTime")
+    event_status = ma.fields.String(required=True, data_key="controlEventStatus")
+    control_command = ma.fields.Raw(required=True, data_key="controlSetpoint")
+    control_type = ma.fields.String(required=True, data_key="controlType")
+    contract_id = ma.fields.Integer(required=True, data_key="controlGroupId")
+    control_id = ma.fields.String(required=True, data_key="controlId")
+
+
 class DerResponseSchema(ma.Schema, TimeZoneMixin):
     """Schema for the der-response topic.
     Converts the keys to snake case and to program manager terms
     """
 
+    class Meta:
+        unknown = ma.EXCLUDE
+
     control_id = ma.fields.String(required=True, data_key="controlId")
     der_id = ma.fields.String(required=True, data_key="edevId")
     der_response_status = ma.fields.Integer(required=True, data_key="status")
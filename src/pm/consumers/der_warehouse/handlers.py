@@ -1,20 +1,30 @@
-from marshmallow import EXCLUDE
+from marshmallow import EXCLUDE, ValidationError
 
 from pm.modules.derinfo.controller import DerInfoController
 from pm.modules.derinfo.repository import DerUpdate
-from pm.modules.enrollment.contract_controller import ContractController
 from shared.system.loggingsys import get_logger
-from shared.tasks.decorators import register_topic_handler
+from shared.tasks.consumer import ConsumerMessage
+from shared.tasks.decorators import ConsumerType, register_topic_handler
 
 logger = get_logger(__name__)
 
 DER_WAREHOUSE_DER_TOPIC = "der_warehouse.der"
 
 
-@register_topic_handler(DER_WAREHOUSE_DER_TOPIC, DerUpdate.schema(unknown=EXCLUDE))
-def handle_derwh_der(data: DerUpdate, headers: dict | None = None):
-    logger.info(f"Handling DER data: {data}")
-    if data.is_deleted:
-        ContractController().cancel_contracts_by_der_id(data.der_id)
+@register_topic_handler(DER_WAREHOUSE_DER_TOPIC, consumer_type=ConsumerType.BATCH)
+def handle_derwh_der(data: list[ConsumerMessage]):
+    logger.info(f"Handling DER data: Message number: {len(data)}")
+    schema = DerUpdate.schema(unknown=EXCLUDE)
+    ders: dict[str, DerUpdate] = {}
+    for message in data:
+        try:
+            der: DerUpdate = schema.load(message.value)
+        except (ValidationError, ValueError, KeyError) as e:
+            # the dataclass schema raises ValueError for an unknown enum value, so only the
+            # bad message is dropped instead of failing the batch
+            logger.warning(f"DER data error: {e}")
+            continue
+        # only the latest version of a DER in the batch is kept
+        ders[der.der_id] = der
     # Upsert into DerInfo table on PM side
-    DerInfoController().upsert_der_from_kafka(data)
+    DerInfoController().upsert_ders_from_kafka(list(ders.values()))
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+from collections import defaultdict
 from dataclasses import dataclass, field
+from typing import Optional, cast
 
 from dataclasses_json import DataClassJsonMixin, config
 
-from pm.modules.derinfo.repository import DerInfoRepository, DerNotFound
+from pm.modules.derinfo.repository import DerInfoRepository
 from pm.modules.enrollment.controller import EnrollmentController
 from pm.modules.enrollment.enums import EnrollmentRequestStatus
 from pm.modules.enrollment.models.enrollment import (
@@ -14,9 +16,7 @@ from pm.modules.enrollment.models.enrollment import (
 from pm.modules.enrollment.services.enrollment import (
     CreateUpdateEnrollmentRequestDict,
     EnrollmentRequestGenericFieldsDict,
-    InvalidEnrollmentRequestArgs,
 )
-from pm.modules.progmgmt.repository import ProgramNotFound
 from pm.modules.serviceprovider.controller import DerList, ServiceProviderController
 from pm.modules.serviceprovider.enums import ServiceProviderStatus, ServiceProviderType
 from pm.modules.serviceprovider.models.service_provider import Address, PrimaryContact
@@ -76,51 +76,73 @@ class EnrollmentRequestMessage(Message, DataClassJsonMixin):
     class Meta:
         topic = "pm.enrollment_request"
 
-    def process_message(self):
-        der_id = self.der_id
+    def get_enrollment_request_data(
+        self, service_provider_id: Optional[int]
+    ) -> CreateUpdateEnrollmentRequestDict:
         program_id = int(self.headers["program_id"])
-        try:
-            with UOW() as uow:
-                der = DerInfoRepository(uow.session).get_der_or_raise_exception(der_id=der_id)
-            service_provider_id = der.service_provider_id
-            general_fields = EnrollmentRequestGenericFieldsDict(
-                program_id=program_id,
-                service_provider_id=service_provider_id,  # type: ignore[typeddict-item]
-                der_id=der_id,
-                enrollment_status=EnrollmentRequestStatus.PENDING,
-                rejection_reason=None,
-            )
-            dynamic_operating_envelopes = DynamicOperatingEnvelopesDict(
-                default_limits_active_power_import_kw=convert_strings_to_float(
-                    self.import_active_limit,
-                ),  # type: ignore[typeddict-item]
-                default_limits_active_power_export_kw=convert_strings_to_float(
-                    self.export_active_limit,
-                ),  # type: ignore[typeddict-item]
-                default_limits_reactive_power_import_kw=convert_strings_to_float(
-                    self.import_reactive_limit,
-                ),  # type: ignore[typeddict-item]
-                default_limits_reactive_power_export_kw=convert_strings_to_float(
-                    self.export_reactive_limit,
-                ),  # type: ignore[typeddict-item]
-            )
-            demand_response = DemandResponseDict(
-                import_target_capacity=convert_strings_to_float(
-                    self.import_target_capacity
-                ),  # type: ignore[typeddict-item]
-                export_target_capacity=convert_strings_to_float(
-                    self.export_target_capacity
-                ),  # type: ignore[typeddict-item]
+        general_fields = EnrollmentRequestGenericFieldsDict(
+            program_id=program_id,
+            service_provider_id=service_provider_id,  # type: ignore[typeddict-item]
+            der_id=self.der_id,
+            enrollment_status=EnrollmentRequestStatus.PENDING,
+            rejection_reason=None,
+        )
+        dynamic_operating_envelopes = DynamicOperatingEnvelopesDict(
+            default_limits_active_power_import_kw=convert_strings_to_float(
+                self.import_active_limit,
+            ),  # type: ignore[typeddict-item]
+            default_limits_active_power_export_kw=convert_strings_to_float(
+                self.export_active_limit,
+            ),  # type: ignore[typeddict-item]
+            default_limits_reactive_power_import_kw=convert_strings_to_float(
+                self.import_reactive_limit,
+            ),  # type: ignore[typeddict-item]
+            default_limits_reactive_power_export_kw=convert_strings_to_float(
+                self.export_reactive_limit,
+            ),  # type: ignore[typeddict-item]
+        )
+        demand_response = DemandResponseDict(
+            import_target_capacity=convert_strings_to_float(
+                self.import_target_capacity
+            ),  # type: ignore[typeddict-item]
+            export_target_capacity=convert_strings_to_float(
+                self.export_target_capacity
+            ),  # type: ignore[typeddict-item]
+        )
+        return CreateUpdateEnrollmentRequestDict(
+            general_fields=general_fields,
+            dynamic_operating_envelopes=dynamic_operating_envelopes,
+            demand_response=demand_response,
+        )
+
+    def process_message(self):
+        results = self.process_messages([self])
+        return results[0] if results else None
+
+    @classmethod
+    def process_messages(cls, list_of_messages: list[Message]) -> list[dict]:
+        """Create the enrollment requests of a batch of messages.
+        The DERs are fetched with one query, and the enrollment requests are created by
+        EnrollmentController.create_enrollment_requests with a single commit.
+        Messages for DERs that aren't found are logged and skipped.
+        """
+        messages = cast(list[EnrollmentRequestMessage], list_of_messages)
+        with UOW() as uow:
+            ders = DerInfoRepository(uow.session).get_ders_by_der_ids(
+                {message.der_id for message in messages}
             )
-            enrollment_request_data = CreateUpdateEnrollmentRequestDict(
-                general_fields=general_fields,
-                dynamic_operating_envelopes=dynamic_operating_envelopes,
-                demand_response=demand_response,
+            service_provider_ids = {der.der_id: der.service_provider_id for der in ders}
+        enrollment_requests_data = []
+        for message in messages:
+            if message.der_id not in service_provider_ids:
+                LoggedError(f"DER {message.der_id} was not found")
+                continue
+            enrollment_requests_data.append(
+                message.get_enrollment_request_data(service_provider_ids[message.der_id])
             )
-            result = EnrollmentController().create_enrollment_request(enrollment_request_data)
-            return result
-        except (DerNotFound, InvalidEnrollmentRequestArgs, ProgramNotFound) as e:
-            LoggedError(e)
+        if not enrollment_requests_data:
+            return []
+        return EnrollmentController().create_enrollment_requests(enrollment_requests_data)
 
 
 @dataclass
@@ -197,12 +219,19 @@ class ServiceProviderDERAssociateMessage(Message, DataClassJsonMixin):
         return "ServiceProviderDERAssociation"
 
     def process_message(self):
-        der_object: DerList = dict(
-            der_id=str(self.der_id),
-        )
-        service_provider_id = int(self.headers.get("service_provider_id"))
-        try:
-            ServiceProviderController().associate_ders(service_provider_id, [der_object])
-        except ServiceProviderNotFound as err:
-            logger.error(f"Error: {err}")
-            raise err
+        self.process_messages([self])
+
+    @classmethod
+    def process_messages(cls, list_of_messages: list[Message]):
+        """Associate the DERs of a batch of messages with one call to
+        ServiceProviderController.associate_ders per service provider."""
+        der_lists: dict[int, list[DerList]] = defaultdict(list)
+        for message in cast(list[ServiceProviderDERAssociateMessage], list_of_messages):
+            service_provider_id = int(message.headers.get("service_provider_id"))
+            der_lists[service_provider_id].append(dict(der_id=str(message.der_id)))
+        for service_provider_id, der_list in der_lists.items():
+            try:
+                ServiceProviderController().associate_ders(service_provider_id, der_list)
+            except ServiceProviderNotFound as err:
+                logger.error(f"Error: {err}")
+                raise err
@@ -0,0 +1,40 @@
+-- Daily totals of der dispatches per contract, maintained when dispatches and responses
+-- are ingested. Used to calculate the contract constraints without scanning der_dispatch.
+CREATE TABLE contract_event_rollup (
+    contract_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    cumulative_event_duration_mins INTEGER DEFAULT 0 NOT NULL,
+    max_total_energy NUMERIC(20, 4) DEFAULT 0 NOT NULL,
+    event_count INTEGER DEFAULT 0 NOT NULL,
+    opt_out_count INTEGER DEFAULT 0 NOT NULL,
+    PRIMARY KEY (contract_id, day),
+    FOREIGN KEY (contract_id) REFERENCES contract (id)
+);
+
+-- Backfill from the existing dispatch history
+INSERT INTO contract_event_rollup (
+    contract_id,
+    day,
+    cumulative_event_duration_mins,
+    max_total_energy,
+    event_count,
+    opt_out_count
+)
+SELECT
+    d.contract_id,
+    (d.start_date_time AT TIME ZONE 'UTC')::date AS day,
+    COALESCE(SUM(d.cumulative_event_duration_mins) FILTER (WHERE NOT d.is_opt_out), 0),
+    COALESCE(SUM(d.max_total_energy) FILTER (WHERE NOT d.is_opt_out), 0),
+    COUNT(*) FILTER (WHERE NOT d.is_opt_out),
+    COUNT(*) FILTER (WHERE d.is_opt_out)
+FROM (
+    SELECT
+        der_dispatch.*,
+        EXISTS (
+            SELECT 1 FROM der_response
+            WHERE der_response.control_id = der_dispatch.control_id
+            AND der_response.is_opt_out = true
+        ) AS is_opt_out
+    FROM der_dispatch
+) d
+GROUP BY d.contract_id, day;
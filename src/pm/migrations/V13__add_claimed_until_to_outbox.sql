@@ -0,0 +1,3 @@
+-- Lease used by outbox dispatchers to claim messages.
+-- A message claimed by a dispatcher is skipped by the others until the lease expires.
+ALTER TABLE outbox ADD COLUMN claimed_until TIMESTAMP WITH TIME ZONE;
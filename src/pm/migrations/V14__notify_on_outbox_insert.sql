@@ -0,0 +1,14 @@
+-- Notify the outbox dispatchers when messages are added to the outbox.
+-- Notifications are delivered when the transaction commits, and duplicates
+-- within a transaction are merged, so one statement level notify is enough.
+CREATE OR REPLACE FUNCTION notify_outbox_inserted() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('outbox_inserted', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER outbox_inserted
+    AFTER INSERT ON outbox
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_outbox_inserted();
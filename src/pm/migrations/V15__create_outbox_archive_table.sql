@@ -0,0 +1,13 @@
+-- Sent outbox messages moved out of the outbox by the retention job
+CREATE TABLE outbox_archive (
+    id INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL,
+    headers JSONB,
+    message JSONB NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    sent_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+-- Used by the retention job to find old sent messages
+CREATE INDEX idx_outbox_sent_created_at ON outbox (created_at) WHERE is_sent = true;
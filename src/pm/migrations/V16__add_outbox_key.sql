@@ -0,0 +1,3 @@
+-- Kafka partition key of the outbox messages, so the messages of an entity stay in order
+ALTER TABLE outbox ADD COLUMN key TEXT;
+ALTER TABLE outbox_archive ADD COLUMN key TEXT;
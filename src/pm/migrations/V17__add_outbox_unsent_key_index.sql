@@ -0,0 +1,3 @@
+-- The outbox claim skips the messages of a key while an earlier unsent message of the same
+-- topic and key is claimed, which looks up the earlier unsent messages of each candidate
+CREATE INDEX idx_outbox_unsent_topic_key ON outbox (topic, key, id) WHERE is_sent = false;
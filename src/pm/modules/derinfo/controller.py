@@ -24,6 +24,16 @@ class DerInfoController:
             uow.repository.upsert_der_from_kafka(data)
             uow.commit()
 
+    def upsert_ders_from_kafka(self, ders: list[DerUpdate]) -> None:
+        """Upsert a batch of DERs with unique der_ids, and cancel the contracts of the deleted
+        DERs, in a single commit."""
+        with self.unit_of_work as uow:
+            deleted_der_ids = [der.der_id for der in ders if der.is_deleted]
+            if deleted_der_ids:
+                uow.contract_repository.system_cancel_contracts_by_der_ids(deleted_der_ids)
+            uow.repository.upsert_ders_from_kafka(ders)
+            uow.commit()
+
     def get_ders_with_service_provider_but_no_contract(self, program_id=None) -> list[DerInfo]:
         with self.unit_of_work as uow:
             ders = uow.repository.get_ders_with_sp_no_contract()
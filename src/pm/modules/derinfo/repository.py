@@ -1,10 +1,10 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Optional, Sequence
+from typing import Iterable, Optional, Sequence
 
 from dataclasses_json import DataClassJsonMixin
-from sqlalchemy import select, tuple_
+from sqlalchemy import case, select, tuple_
 from sqlalchemy.dialects.postgresql import insert
 
 from pm.modules.derinfo.enums import DerAssetType, DerResourceCategory, LimitUnitType
@@ -16,29 +16,51 @@ from shared.system.loggingsys import get_logger
 
 logger = get_logger(__name__)
 
+# maximum number of DERs upserted by one INSERT statement
+UPSERT_BATCH_SIZE = 1000
+
 
 class DerInfoRepository(SQLRepository):
     def upsert_der_from_kafka(self, payload: DerUpdate):
-        values_dict = {
-            "name": payload.name,
-            "is_deleted": payload.is_deleted,
-            "der_type": payload.der_type,
-            "nameplate_rating": payload.nameplate_rating,
-            "nameplate_rating_unit": payload.nameplate_rating_unit,
-            "resource_category": payload.resource_category,
-        }
-
-        # Remove service provider association if the DER is deleted from DW
-        if payload.is_deleted:
-            values_dict["service_provider_id"] = None
-
-        stmt = (
-            insert(DerInfo)
-            .values(**values_dict, der_id=payload.der_id)
-            .on_conflict_do_update(index_elements=[DerInfo.der_id], set_=values_dict)
-        )
-
-        self.session.execute(stmt)
+        self.upsert_ders_from_kafka([payload])
+
+    def upsert_ders_from_kafka(self, payloads: list[DerUpdate]):
+        """Upsert DERs with a multi-row INSERT ... ON CONFLICT per UPSERT_BATCH_SIZE DERs.
+        The der_ids must be unique. Deleted DERs lose their service provider association.
+        """
+        for start in range(0, len(payloads), UPSERT_BATCH_SIZE):
+            end = start + UPSERT_BATCH_SIZE
+            rows = [
+                {
+                    "der_id": payload.der_id,
+                    "name": payload.name,
+                    "is_deleted": payload.is_deleted,
+                    "der_type": payload.der_type,
+                    "nameplate_rating": payload.nameplate_rating,
+                    "nameplate_rating_unit": payload.nameplate_rating_unit,
+                    "resource_category": payload.resource_category,
+                    "service_provider_id": None,
+                }
+                for payload in payloads[start:end]
+            ]
+            stmt = insert(DerInfo).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[DerInfo.der_id],
+                set_={
+                    "name": stmt.excluded.name,
+                    "is_deleted": stmt.excluded.is_deleted,
+                    "der_type": stmt.excluded.der_type,
+                    "nameplate_rating": stmt.excluded.nameplate_rating,
+                    "nameplate_rating_unit": stmt.excluded.nameplate_rating_unit,
+                    "resource_category": stmt.excluded.resource_category,
+                    # Remove service provider association if the DER is deleted from DW
+                    "service_provider_id": case(
+                        (stmt.excluded.is_deleted, None),
+                        else_=DerInfo.service_provider_id,
+                    ),
+                },
+            )
+            self.session.execute(stmt)
 
     def get_ders(self, service_provider=None, is_deleted=False) -> Sequence[DerInfo]:
         stmt = select(DerInfo).where(DerInfo.is_deleted == is_deleted)  # noqa: E712
@@ -71,7 +93,11 @@ class DerInfoRepository(SQLRepository):
         self, id=None, der_id=None, service_provider=None, is_deleted=False
     ) -> DerInfo:
         der = self.get_der(id, der_id, service_provider, is_deleted)
+        return self.check_der_found(der)
 
+    @staticmethod
+    def check_der_found(der: Optional[DerInfo]) -> DerInfo:
+        """Raise a DerNotFound exception if the DER wasn't found"""
         if der is None:
             raise DerNotFound(
                 errors={"error": "Not Found"},
@@ -80,6 +106,12 @@ class DerInfoRepository(SQLRepository):
 
         return der
 
+    def get_ders_by_der_ids(self, der_ids: Iterable[str], is_deleted=False) -> Sequence[DerInfo]:
+        stmt = select(DerInfo).where(
+            DerInfo.is_deleted == is_deleted, DerInfo.der_id.in_(der_ids)  # noqa: E712
+        )
+        return self.session.execute(stmt).scalars().all()
+
     def get_ders_with_sp_no_contract(self) -> Sequence[DerInfo]:
         stmt = (
             select(DerInfo)
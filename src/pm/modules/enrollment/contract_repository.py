@@ -1,6 +1,6 @@
-from typing import Optional, Sequence
+from typing import Iterable, Optional, Sequence
 
-from sqlalchemy import Select, and_, or_, select
+from sqlalchemy import Select, and_, or_, select, tuple_, update
 from sqlalchemy.orm import joinedload
 
 from pm.modules.enrollment.enums import ContractKafkaOperation, ContractStatus
@@ -49,6 +49,18 @@ class ContractRepository(SQLRepository):
     def save_create_contract(self, contract: Contract) -> int:
         return self.save_contract(contract, operation=ContractKafkaOperation.CREATED)
 
+    def save_create_contracts(self, contracts: list[Contract]) -> list[int]:
+        """Saves contracts with a single flush and publishes each one on pm.contract"""
+        self.session.add_all(contracts)
+        self.session.flush()
+        for contract in contracts:
+            ContractMessage.add_to_outbox(
+                self.session,
+                contract.to_dict(include_relationships=False),
+                {"operation": ContractKafkaOperation.CREATED.value},
+            )  # type: ignore
+        return [contract.id for contract in contracts]
+
     def save_update_contract(self, contract: Contract) -> int:
         return self.save_contract(contract, operation=ContractKafkaOperation.UPDATED)
 
@@ -71,6 +83,29 @@ class ContractRepository(SQLRepository):
         _id = contract.id
         return _id
 
+    def system_cancel_contracts_by_der_ids(self, der_ids: list[str]) -> Sequence[Contract]:
+        """Cancels the unexpired contracts of the DERs with a single UPDATE,
+        and publishes each cancelled contract on pm.contract"""
+        stmt = (
+            update(Contract)
+            .where(Contract.der_id.in_(der_ids))
+            .where(
+                Contract.contract_status.not_in(
+                    [ContractStatus.EXPIRED, ContractStatus.SYSTEM_CANCELLED]
+                )
+            )
+            .values(contract_status=ContractStatus.SYSTEM_CANCELLED)
+            .returning(Contract)
+        )
+        contracts = self.session.execute(stmt).scalars().all()
+        for contract in contracts:
+            ContractMessage.add_to_outbox(
+                self.session,
+                contract.to_dict(include_relationships=False),
+                {"operation": ContractKafkaOperation.DELETED.value},
+            )  # type: ignore
+        return contracts
+
     def get_contracts_by_program_id(self, program_id: int) -> Sequence[Contract]:
         stmt = select(Contract).where(Contract.program_id == program_id)
         return self.session.execute(stmt).unique().scalars().all()
@@ -100,6 +135,20 @@ class ContractRepository(SQLRepository):
         )
         return self.session.execute(stmt).scalar_one_or_none()
 
+    def get_contracts_by_unique_constraints(
+        self, keys: Iterable[tuple[int, int, str]]
+    ) -> Sequence[Contract]:
+        """Gets the contracts matching any of the (program_id, service_provider_id, der_id) keys"""
+        stmt = select(Contract).where(
+            and_(
+                tuple_(Contract.program_id, Contract.service_provider_id, Contract.der_id).in_(
+                    list(keys)
+                ),
+                Contract.contract_status != ContractStatus.SYSTEM_CANCELLED,
+            )
+        )
+        return self.session.execute(stmt).scalars().all()
+
     def get_unexpired_contracts_by_der_id(
         self, der_id: str, eager_load_relationship=True
     ) -> Sequence[Contract]:
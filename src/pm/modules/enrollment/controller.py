@@ -1,4 +1,5 @@
 import io
+from dataclasses import dataclass, field
 from typing import Optional
 
 from werkzeug.datastructures import FileStorage
@@ -7,7 +8,7 @@ from pm.modules.derinfo.models.der_info import DerInfo
 from pm.modules.derinfo.repository import DerInfoRepository, DerNotFound
 from pm.modules.enrollment.contract_repository import ContractRepository
 from pm.modules.enrollment.enums import EnrollmentCRUDStatus, EnrollmentRequestStatus
-from pm.modules.enrollment.models.enrollment import EnrollmentRequest
+from pm.modules.enrollment.models.enrollment import Contract, EnrollmentRequest
 from pm.modules.enrollment.repository import EnrollmentRequestRepository
 from pm.modules.enrollment.services.contract import ContractService
 from pm.modules.enrollment.services.eligibility.eligibility import EligibilityService
@@ -43,6 +44,17 @@ class EnrollmentUOW(UOW):
         return self
 
 
+@dataclass
+class EnrollmentBatch:
+    """The programs, service providers, DERs and existing contracts of a batch of enrollment
+    requests, by id. Contracts are keyed by (program_id, service_provider_id, der_id)."""
+
+    programs: dict[int, Program] = field(default_factory=dict)
+    service_providers: dict[int, ServiceProvider] = field(default_factory=dict)
+    ders: dict[str, DerInfo] = field(default_factory=dict)
+    contracts: dict[tuple[int, Optional[int], str], Contract] = field(default_factory=dict)
+
+
 class EnrollmentController:
     def __init__(self):
         self.unit_of_work = EnrollmentUOW()
@@ -54,76 +66,109 @@ class EnrollmentController:
     def create_enrollment_requests(
         self, enrollment_requests_data: list[CreateUpdateEnrollmentRequestDict]
     ) -> list[dict]:
-        enrollment_request_ids: list[dict] = []
-        for enrollment_request_data in enrollment_requests_data:
-            enrollment_request_id = self.create_enrollment_request(enrollment_request_data)
-            enrollment_request_ids.append(enrollment_request_id)
+        """Create a batch of enrollment requests, and a contract for each accepted one.
 
-        return enrollment_request_ids
-
-    def create_enrollment_request(
-        self,
-        enrollment_request_data: CreateUpdateEnrollmentRequestDict,
-    ) -> dict:
+        The programs, service providers, DERs and existing contracts of the whole batch are
+        fetched up front with one query each, validation and eligibility checks run in
+        memory, and everything is saved with a single commit.
+        Returns the result of each enrollment request, in order.
+        """
         with self.unit_of_work as uow:
-            try:
-                program, service_provider, der = self._validate_extract_enrollment_request_fields(
-                    enrollment_request_data,
-                    uow,
+            batch = self._get_enrollment_batch(enrollment_requests_data, uow)
+            results: list[dict] = []
+            enrollment_requests: list[tuple[dict, EnrollmentRequest]] = []
+            contracts: list[tuple[Contract, EnrollmentRequest]] = []
+            for enrollment_request_data in enrollment_requests_data:
+                try:
+                    (
+                        program,
+                        service_provider,
+                        der,
+                    ) = self._validate_extract_enrollment_request_fields(
+                        enrollment_request_data,
+                        batch,
+                    )
+                except (
+                    InvalidEnrollmentRequestArgs,
+                    EnrollmentRequestNotAllowed,
+                    ProgramNotFound,
+                    ServiceProviderNotFound,
+                    DerNotFound,
+                ) as e:
+                    results.append(
+                        {
+                            "id": None,
+                            "status": EnrollmentCRUDStatus.NOT_CREATED,
+                            "message": e.message,
+                            "data": enrollment_request_data,
+                        }
+                    )
+                    continue
+
+                enrollment_request = self._create_enrollment_request(
+                    enrollment_request_data, program, service_provider, der
                 )
-            except (
-                InvalidEnrollmentRequestArgs,
-                EnrollmentRequestNotAllowed,
-                ProgramNotFound,
-                ServiceProviderNotFound,
-                DerNotFound,
-            ) as e:
-                return {
+                # Create Contract object if eligibility check was successful. It also blocks
+                # a second enrollment request for the same program, service provider and der
+                if enrollment_request.enrollment_status == EnrollmentRequestStatus.ACCEPTED:
+                    contract = self.contract_service.create_contract_from_enrollment_request(
+                        enrollment_request, program
+                    )
+                    batch.contracts[(program.id, service_provider.id, der.der_id)] = contract
+                    contracts.append((contract, enrollment_request))
+
+                result: dict = {
                     "id": None,
-                    "status": EnrollmentCRUDStatus.NOT_CREATED,
-                    "message": e.message,
+                    "status": EnrollmentCRUDStatus.CREATED,
+                    "message": "",
                     "data": enrollment_request_data,
                 }
+                results.append(result)
+                enrollment_requests.append((result, enrollment_request))
 
-            # Create Enrollment Request object and set fields
-            enrollment_request = self.enrollment_service.create_enrollment_request(
-                program_id=program.id,
-                service_provider_id=service_provider.id,
-                der_id=der.der_id,
-            )
-            self.enrollment_service.set_enrollment_request_fields(
-                enrollment_request, enrollment_request_data, program
-            )
-
-            # Run Eligibility Check and save Enrollment Request to database
-            status, reason = self.eligibility_service.eligibility_check(
-                program, der, enrollment_request
-            )
-            if status == EnrollmentRequestStatus.ACCEPTED:
-                self.enrollment_service.accept_enrollment_request(enrollment_request)
-            elif status == EnrollmentRequestStatus.REJECTED and reason:
-                self.enrollment_service.reject_enrollment_request(enrollment_request, reason)
-
-            enrollment_request_id = uow.enrollment_request_repository.save(enrollment_request)
-
-            # Create Contract object and save to database if eligibility check was successful
-            if status == EnrollmentRequestStatus.ACCEPTED:
-                enrollment_request = (
-                    uow.enrollment_request_repository.get_enrollment_request_or_raise(
-                        enrollment_request_id
-                    )
-                )
-                contract = self.contract_service.create_contract_from_enrollment_request(
-                    enrollment_request, program
-                )
-                uow.contract_repository.save_create_contract(contract)
+            # Save Enrollment Requests, then their Contracts, to database
+            uow.enrollment_request_repository.save_all([e for _, e in enrollment_requests])
+            uow.session.flush()
+            for result, enrollment_request in enrollment_requests:
+                result["id"] = enrollment_request.id
+            for contract, enrollment_request in contracts:
+                contract.enrollment_request_id = enrollment_request.id
+            uow.contract_repository.save_create_contracts([c for c, _ in contracts])
             uow.commit()
-            return {
-                "id": enrollment_request_id,
-                "status": EnrollmentCRUDStatus.CREATED,
-                "message": "",
-                "data": enrollment_request_data,
-            }
+            return results
+
+    def create_enrollment_request(
+        self,
+        enrollment_request_data: CreateUpdateEnrollmentRequestDict,
+    ) -> dict:
+        return self.create_enrollment_requests([enrollment_request_data])[0]
+
+    def _create_enrollment_request(
+        self,
+        enrollment_request_data: CreateUpdateEnrollmentRequestDict,
+        program: Program,
+        service_provider: ServiceProvider,
+        der: DerInfo,
+    ) -> EnrollmentRequest:
+        # Create Enrollment Request object and set fields
+        enrollment_request = self.enrollment_service.create_enrollment_request(
+            program_id=program.id,
+            service_provider_id=service_provider.id,
+            der_id=der.der_id,
+        )
+        self.enrollment_service.set_enrollment_request_fields(
+            enrollment_request, enrollment_request_data, program
+        )
+
+        # Run Eligibility Check
+        status, reason = self.eligibility_service.eligibility_check(
+            program, der, enrollment_request
+        )
+        if status == EnrollmentRequestStatus.ACCEPTED:
+            self.enrollment_service.accept_enrollment_request(enrollment_request)
+        elif status == EnrollmentRequestStatus.REJECTED and reason:
+            self.enrollment_service.reject_enrollment_request(enrollment_request, reason)
+        return enrollment_request
 
     def get_all_enrollment_requests(self) -> list[EnrollmentRequest]:
         with self.unit_of_work as uow:
@@ -159,30 +204,67 @@ class EnrollmentController:
             )
             return self.enrollment_service.create_enrollment_report(enrollment_requests)
 
+    def _get_enrollment_batch(
+        self,
+        enrollment_requests_data: list[CreateUpdateEnrollmentRequestDict],
+        uow: EnrollmentUOW,
+    ) -> EnrollmentBatch:
+        general_fields = [data["general_fields"] for data in enrollment_requests_data]
+        program_ids = {f["program_id"] for f in general_fields if f.get("program_id")}
+        service_provider_ids = {
+            f["service_provider_id"]
+            for f in general_fields
+            if isinstance(f.get("service_provider_id"), int)
+        }
+        der_ids = {f["der_id"] for f in general_fields if f.get("der_id")}
+        contract_keys = {
+            (f["program_id"], f["service_provider_id"], f["der_id"])
+            for f in general_fields
+            if f.get("program_id")
+            and isinstance(f.get("service_provider_id"), int)
+            and f.get("der_id")
+        }
+        batch = EnrollmentBatch()
+        if program_ids:
+            programs = uow.program_repository.get_programs_by_ids(program_ids)
+            batch.programs = {program.id: program for program in programs}
+        if service_provider_ids:
+            service_providers = uow.service_provider_repository.get_service_providers_by_ids(
+                service_provider_ids
+            )
+            batch.service_providers = {sp.id: sp for sp in service_providers}
+        if der_ids:
+            ders = uow.der_info_repository.get_ders_by_der_ids(der_ids)
+            batch.ders = {der.der_id: der for der in ders}
+        if contract_keys:
+            contracts = uow.contract_repository.get_contracts_by_unique_constraints(contract_keys)
+            batch.contracts = {
+                (c.program_id, c.service_provider_id, c.der_id): c for c in contracts
+            }
+        return batch
+
     def _validate_extract_enrollment_request_fields(
         self,
         enrollment_request_data: CreateUpdateEnrollmentRequestDict,
-        uow: EnrollmentUOW,
+        batch: EnrollmentBatch,
     ) -> tuple[Program, ServiceProvider, DerInfo]:
-        program_id, program = self.is_non_archived_program_existing(enrollment_request_data, uow)
+        program_id, program = self.is_non_archived_program_existing(enrollment_request_data, batch)
         enrollment_request_data = self.enrollment_service.validate_enrollment_request(
             enrollment_request_data, program
         )
         service_provider_id, service_provider = self.is_service_provider_existing(
-            enrollment_request_data, uow
+            enrollment_request_data, batch
         )
-        der_id, der = self.is_der_existing(enrollment_request_data, uow)
-        self.is_contract_already_existing(uow, program_id, program, service_provider_id, der_id)
+        der_id, der = self.is_der_existing(enrollment_request_data, batch)
+        self.is_contract_already_existing(batch, program_id, program, service_provider_id, der_id)
         return program, service_provider, der
 
-    def is_non_archived_program_existing(self, enrollment_request_data, uow):
+    def is_non_archived_program_existing(self, enrollment_request_data, batch):
         program_id = enrollment_request_data["general_fields"].get("program_id")
         if not program_id:
             logger.error("Create Enrollment Request failed due to missing program_id")
             raise InvalidEnrollmentRequestArgs(message="Enrollment Request is missing program_id")
-        program = uow.program_repository.get_program_or_raise(
-            program_id, eager_load_relationships=False
-        )
+        program = ProgramRepository.check_program_found(program_id, batch.programs.get(program_id))
         if program.status == ProgramStatus.ARCHIVED:
             logger.error("Create Enrollment Request failed due to expired program_id")
             raise InvalidEnrollmentRequestArgs(
@@ -191,21 +273,21 @@ class EnrollmentController:
 
         return program_id, program
 
-    def is_service_provider_existing(self, enrollment_request_data, uow):
+    def is_service_provider_existing(self, enrollment_request_data, batch):
         service_provider_id = enrollment_request_data["general_fields"]["service_provider_id"]
-        service_provider = uow.service_provider_repository.get_service_provider_or_raise(
-            service_provider_id, include_inactive=False
+        service_provider = ServiceProviderRepository.check_service_provider_found(
+            service_provider_id,
+            batch.service_providers.get(service_provider_id),
+            include_inactive=False,
         )
 
         return service_provider_id, service_provider
 
-    def is_contract_already_existing(self, uow, program_id, program, service_provider_id, der_id):
-        existing_contract = uow.contract_repository.get_contract_by_unique_constraint(
-            program_id, service_provider_id, der_id
-        )
+    def is_contract_already_existing(self, batch, program_id, program, service_provider_id, der_id):
+        existing_contract = batch.contracts.get((program_id, service_provider_id, der_id))
         self.enrollment_service.create_enrollment_allowed(program, existing_contract)
 
-    def is_der_existing(self, enrollment_request_data, uow):
+    def is_der_existing(self, enrollment_request_data, batch):
         der_id = enrollment_request_data["general_fields"]["der_id"]
-        der = uow.der_info_repository.get_der_or_raise_exception(der_id=der_id)
+        der = DerInfoRepository.check_der_found(batch.ders.get(der_id))
         return der_id, der
@@ -38,26 +38,27 @@ class EventController:
             dispatches = BuildDerDispatchDicts.build(contract_ids, data)
             logger.info(f"Inserting {len(dispatches)} der dispatches")
             uow.repository.bulk_insert_der_dispatches(dispatches)
+            uow.repository.add_dispatches_to_rollup(dispatches)
             uow.commit()
             logger.info(f"Committed {len(dispatches)} der dispatches")
 
-    def create_der_response(self, data: CreateDerResponseDict):
+    def create_der_response(self, data: list[CreateDerResponseDict]):
         """Creates a der response."""
         with self.unit_of_work as uow:
             logger.info(f"Inserting {len(data)} der responses")
-            uow.repository.bulk_insert_der_responses(data)
+            responses = uow.repository.bulk_insert_der_responses(data)
+            uow.repository.add_opt_outs_to_rollup(responses)
             uow.commit()
             logger.info(f"Committed {len(data)} der responses")
 
     def calculate_contract_constraints(self, day: datetime):
-        """Create and save a summary of the constraints"""
+        """Create and save a summary of the constraints for every active contract.
+        The summaries are calculated with a few grouped queries and saved in one commit."""
         with self.unit_of_work as uow:
-            for contract in uow.repository.get_all_active_contracts():
-                summary = uow.repository.calculate_contract_constraints(
-                    day, contract.id, contract.program
-                )
-                uow.repository.save(summary)
-                uow.commit()
+            summaries = uow.repository.calculate_all_contract_constraints(day)
+            logger.info(f"Saving {len(summaries)} contract constraint summaries")
+            uow.repository.upsert_constraint_summaries(summaries)
+            uow.commit()
 
     def get_processed_constraints(self, contract_id: int) -> dict:
         """Get the processed constraints from ContractConstraintSummary model.
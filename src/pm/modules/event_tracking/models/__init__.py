@@ -1,2 +1,3 @@
+from .contract_event_rollup import ContractEventRollup  # noqa
 from .der_dispatch import DerDispatch  # noqa
 from .der_response import DerResponse  # noqa
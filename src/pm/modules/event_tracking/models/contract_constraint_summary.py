@@ -183,11 +183,12 @@ class ContractConstraintSummary(CreatedAtUpdatedAtMixin, Base):
                     }
         return constraint_fields
 
-    @classmethod
-    def create_from_constraints(
-        cls, contract_id: int, day: date, constraints: list[Constraint]
-    ) -> ContractConstraintSummary:
-        """Create a ContractConstraintSummary from a list of ContractConstraint"""
+    @staticmethod
+    def create_dict_from_constraints(
+        contract_id: int, day: date, constraints: list[Constraint]
+    ) -> dict[str, Any]:
+        """Create the column values of a ContractConstraintSummary from a list of
+        ContractConstraint. Used to bulk insert summaries without the ORM."""
         constraint_dict: dict[str, Any] = {}
         for col in ContractConstraintSummary.__table__.columns:
             if col.name not in ["id", "contract_id", "day", "created_at", "updated_at"]:
@@ -196,4 +197,6 @@ class ContractConstraintSummary(CreatedAtUpdatedAtMixin, Base):
             constraint_dict[c.label] = c.value
             constraint_dict[f"{c.label}_warning"] = c.has_warning
             constraint_dict[f"{c.label}_violation"] = c.has_violation
-        return cls(**constraint_dict, contract_id=contract_id, day=day)
+        constraint_dict["contract_id"] = contract_id
+        constraint_dict["day"] = day
+        return constraint_dict
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+from typing import TypedDict
+
+from sqlalchemy import Column, Date, ForeignKey, Integer, Numeric
+
+from shared.system.database import Base
+
+
+class ContractEventRollupDict(TypedDict):
+    contract_id: int
+    day: date
+    cumulative_event_duration_mins: int
+    max_total_energy: Decimal
+    event_count: int
+    opt_out_count: int
+
+
+class ContractEventRollup(Base):
+    """Daily totals of the der dispatches of a contract.
+
+    Updated incrementally when der dispatches and der responses are created, so the
+    contract constraints can be calculated without scanning the der_dispatch history.
+    Dispatches with an opt out are only counted in opt_out_count.
+    """
+
+    __tablename__ = "contract_event_rollup"
+    contract_id: int = Column(Integer, ForeignKey("contract.id"), primary_key=True)
+    day: date = Column(Date, primary_key=True, doc="UTC day of the dispatch start time")
+    cumulative_event_duration_mins: int = Column(Integer, nullable=False, default=0)
+    max_total_energy: Decimal = Column(  # type: ignore
+        Numeric(precision=20, scale=4), nullable=False, default=0
+    )
+    event_count: int = Column(Integer, nullable=False, default=0)
+    opt_out_count: int = Column(Integer, nullable=False, default=0)
@@ -1,123 +1,139 @@
-from datetime import datetime
-from typing import Generator, Optional, Sequence
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Generator, Iterable, Optional, Sequence
 
-from sqlalchemy import and_, case, func, or_, select
+import pendulum
+from sqlalchemy import RowMapping, and_, case, func, select
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import joinedload
 
 from pm.modules.enrollment.enums import ContractStatus
 from pm.modules.enrollment.models.enrollment import Contract
 from pm.modules.event_tracking.builders.der_dispatch_dicts import InsertDerDispatchDict
-from pm.modules.event_tracking.constraints import Constraint, ConstraintsBuilder
+from pm.modules.event_tracking.constraints import ConstraintsBuilder
 from pm.modules.event_tracking.models.contract_constraint_summary import (
     ContractConstraintSummary,
 )
+from pm.modules.event_tracking.models.contract_event_rollup import (
+    ContractEventRollup,
+    ContractEventRollupDict,
+)
 from pm.modules.event_tracking.models.der_dispatch import DerDispatch
 from pm.modules.event_tracking.models.der_response import (
     CreateDerResponseDict,
     DerResponse,
 )
+from pm.modules.progmgmt.enums import ProgramTimePeriod
 from pm.modules.progmgmt.models.program import Program
 from pm.modules.reports.models.report import EventDetails
 from shared.repository import SQLRepository
 
+# number of summary rows sent in one INSERT ... ON CONFLICT statement
+UPSERT_BATCH_SIZE = 1000
+
 
 class EventRepository(SQLRepository):
-    def _get_der_dispatch_constraints(
-        self, contract_id: int, constraints: list[Constraint]
-    ) -> list[Constraint]:
-        """Gets the constraints that need to sum the der dispatches,
-        ignoring any dispatches that have an opt out
+    def _get_window_start_days(self, current_day: datetime) -> dict[ProgramTimePeriod, Any]:
+        """The first rollup day of each constraint timeperiod. PROGRAM_DURATION depends on
+        the program of each contract, so it is taken from the joined program row.
+        Rollups are daily, so the windows start at the beginning of the (UTC) day.
         """
-        sums = [
-            func.sum(
-                case(
-                    (
-                        DerDispatch.start_date_time >= c.timestamp,
-                        c.event_property,
-                    )
-                )
-            )
-            for c in constraints
-        ]
-        stmt = (
-            select(*sums)
-            .outerjoin(DerResponse, DerResponse.control_id == DerDispatch.control_id)
-            .where(
-                DerDispatch.contract_id == contract_id,
-                or_(DerResponse.is_opt_out.is_(False), DerResponse.is_opt_out.is_(None)),
-            )
-            .group_by(DerDispatch.contract_id)
+        timestamps = ProgramTimePeriod.get_timestamps_for_periods(current_day, current_day)
+        window_start_days: dict[ProgramTimePeriod, Any] = {
+            timeperiod: self._get_rollup_day(timestamp)
+            for timeperiod, timestamp in timestamps.items()
+        }
+        window_start_days[ProgramTimePeriod.PROGRAM_DURATION] = func.date(
+            func.timezone("UTC", Program.start_date)
         )
-        result = self.session.execute(stmt).one_or_none()
-        if result:
-            for i, r in enumerate(result):
-                constraints[i].set_value(r)
-        return constraints
-
-    def _get_opt_out_constraints(
-        self, contract_id: int, constraints: list[Constraint]
-    ) -> list[Constraint]:
-        """Count the number of events with an opt out for each constraint timeperiod"""
-        counts = [
-            func.count(case((DerDispatch.start_date_time >= c.timestamp, 1), else_=None))
-            for c in constraints
-        ]
-        stmt = (
-            select(*counts)
-            .join(
-                DerResponse,
-                and_(
-                    DerResponse.control_id == DerDispatch.control_id,
-                    DerResponse.is_opt_out.is_(True),
+        return window_start_days
+
+    @staticmethod
+    def _total_label(name: str, timeperiod: ProgramTimePeriod) -> str:
+        return f"{name}_{timeperiod.value.lower()}"
+
+    def _get_rollup_totals_by_contract(self, current_day: datetime) -> dict[int, RowMapping]:
+        """Sums the daily rollups of every active contract for each timeperiod in a single
+        grouped query. Duration and energy are None when there are no events without an opt
+        out in the timeperiod. Contracts without rollups are not returned.
+        """
+        aggregates = []
+        for timeperiod, start_day in self._get_window_start_days(current_day).items():
+            in_window = ContractEventRollup.day >= start_day
+            has_events = and_(in_window, ContractEventRollup.event_count > 0)
+            aggregates += [
+                func.sum(
+                    case((has_events, ContractEventRollup.cumulative_event_duration_mins))
+                ).label(self._total_label("cumulative_event_duration_mins", timeperiod)),
+                func.sum(case((has_events, ContractEventRollup.max_total_energy))).label(
+                    self._total_label("max_total_energy", timeperiod)
                 ),
-            )
-            .where(
-                DerDispatch.contract_id == contract_id,
-            )
-        )
-        result = self.session.execute(stmt).one_or_none()
-        if result:
-            for i, r in enumerate(result):
-                constraints[i].set_value(r)
-        return constraints
-
-    def _get_event_count_constraints(
-        self, contract_id: int, constraints: list[Constraint]
-    ) -> list[Constraint]:
-        """Count the number of events that don't have an opt out for each constraint timeperiod"""
-        counts = [
-            func.count(case((DerDispatch.start_date_time >= c.timestamp, 1), else_=None))
-            for c in constraints
-        ]
+                func.coalesce(
+                    func.sum(case((in_window, ContractEventRollup.event_count))), 0
+                ).label(self._total_label("event_count", timeperiod)),
+                func.coalesce(
+                    func.sum(case((in_window, ContractEventRollup.opt_out_count))), 0
+                ).label(self._total_label("opt_out_count", timeperiod)),
+            ]
         stmt = (
-            select(*counts)
-            .outerjoin(DerResponse, DerResponse.control_id == DerDispatch.control_id)
-            .where(
-                DerDispatch.contract_id == contract_id,
-                or_(DerResponse.is_opt_out.is_(False), DerResponse.is_opt_out.is_(None)),
-            )
-        )
-        result = self.session.execute(stmt).one_or_none()
-        if result:
-            for i, r in enumerate(result):
-                constraints[i].set_value(r)
-        return constraints
-
-    def calculate_contract_constraints(
-        self, current_day: datetime, contract_id: int, program: Program
-    ) -> ContractConstraintSummary:
-        """Creates a constraint summary of program constraints for a contract for the current day"""
-        constraints = ConstraintsBuilder.build(current_day, program)
-        if constraints.der_dispatch:
-            self._get_der_dispatch_constraints(contract_id, constraints.der_dispatch)
-        if constraints.opt_out:
-            self._get_opt_out_constraints(contract_id, constraints.opt_out)
-        if constraints.event_count:
-            self._get_event_count_constraints(contract_id, constraints.event_count)
-        return ContractConstraintSummary.create_from_constraints(
-            contract_id, current_day, constraints.return_all_constraints()
+            select(ContractEventRollup.contract_id, *aggregates)
+            .join(Contract, Contract.id == ContractEventRollup.contract_id)
+            .join(Program, Program.id == Contract.program_id)
+            .where(Contract.contract_status == ContractStatus.ACTIVE)
+            .group_by(ContractEventRollup.contract_id)
         )
+        return {row["contract_id"]: row for row in self.session.execute(stmt).mappings()}
+
+    def calculate_all_contract_constraints(self, current_day: datetime) -> list[dict[str, Any]]:
+        """Creates the constraint summaries of every active contract for the current day.
+
+        The totals for all contracts are read from the daily rollups at once, and the
+        constraints are then checked in memory.
+        Returns a list of ContractConstraintSummary column dicts.
+        """
+        rollup_totals = self._get_rollup_totals_by_contract(current_day)
+        summaries = []
+        for contract in self.get_all_active_contracts():
+            builder = ConstraintsBuilder()
+            constraints = builder.get_constraints(current_day, contract.program)
+            timeperiods = {timestamp: period for period, timestamp in builder.timeperiods.items()}
+            totals = rollup_totals.get(contract.id)
+            if totals:
+                for c in constraints.der_dispatch:
+                    label = self._total_label(c.event_property.key, timeperiods[c.timestamp])
+                    c.set_value(totals[label])
+            for c in constraints.event_count:
+                label = self._total_label("event_count", timeperiods[c.timestamp])
+                c.set_value(totals[label] if totals else 0)
+            for c in constraints.opt_out:
+                label = self._total_label("opt_out_count", timeperiods[c.timestamp])
+                c.set_value(totals[label] if totals else 0)
+            summaries.append(
+                ContractConstraintSummary.create_dict_from_constraints(
+                    contract.id, current_day, constraints.return_all_constraints()
+                )
+            )
+        return summaries
+
+    def upsert_constraint_summaries(self, summaries: list[dict[str, Any]]):
+        """Bulk insert constraint summaries from dictionaries. Replaces the summary
+        if the contract already has one for that day."""
+        for start in range(0, len(summaries), UPSERT_BATCH_SIZE):
+            end = start + UPSERT_BATCH_SIZE
+            stmt = insert(ContractConstraintSummary).values(summaries[start:end])
+            update_columns: dict[str, Any] = {
+                k: stmt.excluded[k] for k in summaries[start] if k not in ("contract_id", "day")
+            }
+            update_columns["updated_at"] = func.current_timestamp()
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[
+                    ContractConstraintSummary.contract_id,
+                    ContractConstraintSummary.day,
+                ],
+                set_=update_columns,
+            )
+            self.session.execute(stmt)
 
     def get_all_active_contracts(self) -> Generator[Contract, None, None]:
         """Gets all contracts with a status of ACTIVE. Returns them in batches of 1000, and yields
@@ -197,12 +213,129 @@ class EventRepository(SQLRepository):
 
     def bulk_insert_der_dispatches(self, dispatches: list[InsertDerDispatchDict]):
         """Bulk insert dispatches from dictionaries"""
-        self.session.execute(insert(DerDispatch), dispatches)
+        self.bulk_insert(DerDispatch, dispatches)  # type: ignore
 
-    def bulk_insert_der_responses(self, responses: list[CreateDerResponseDict]):
+    def bulk_insert_der_responses(
+        self, responses: list[CreateDerResponseDict]
+    ) -> list[CreateDerResponseDict]:
         """Bulk insert der responses from dictionaries. Will first check if the der_id
         exists in the contract table, and will insert the response record if it does.
+        Returns the inserted responses.
         """
         filtered_responses = self._filter_der_id_set(responses)
-        if filtered_responses:
-            self.session.execute(insert(DerResponse), filtered_responses)
+        self.bulk_insert(DerResponse, filtered_responses)  # type: ignore
+        return filtered_responses
+
+    @staticmethod
+    def _get_rollup_day(start_date_time: datetime) -> date:
+        return pendulum.instance(start_date_time).in_timezone("UTC").date()
+
+    def _get_or_create_rollup(
+        self,
+        rollups: dict[tuple[int, date], ContractEventRollupDict],
+        contract_id: int,
+        start_date_time: datetime,
+    ) -> ContractEventRollupDict:
+        day = self._get_rollup_day(start_date_time)
+        if (contract_id, day) not in rollups:
+            rollups[(contract_id, day)] = ContractEventRollupDict(
+                contract_id=contract_id,
+                day=day,
+                cumulative_event_duration_mins=0,
+                max_total_energy=Decimal(0),
+                event_count=0,
+                opt_out_count=0,
+            )
+        return rollups[(contract_id, day)]
+
+    def _upsert_rollups(self, rollups: dict[tuple[int, date], ContractEventRollupDict]):
+        """Adds the rollup values to the existing daily rollups.
+        Rows are written in key order so concurrent batches can't deadlock."""
+        if not rollups:
+            return
+        stmt = insert(ContractEventRollup).values([rollups[k] for k in sorted(rollups)])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ContractEventRollup.contract_id, ContractEventRollup.day],
+            set_={
+                col: getattr(ContractEventRollup, col) + stmt.excluded[col]
+                for col in (
+                    "cumulative_event_duration_mins",
+                    "max_total_energy",
+                    "event_count",
+                    "opt_out_count",
+                )
+            },
+        )
+        self.session.execute(stmt)
+
+    def _lock_controls(self, control_ids: Iterable[str]):
+        """Take a transaction level advisory lock on each control id, in lock key order so
+        concurrent transactions can't deadlock.
+
+        The dispatches and the responses of a control are added to the rollups by different
+        transactions, and each one checks for the rows of the other. Under READ COMMITTED,
+        if both committed at the same time neither would see the other's row and the opt out
+        would never reach the rollup. With the lock, the second transaction waits for the
+        first to commit, and its check (a later statement) then sees the first one's row.
+        Must be called after inserting the rows, and before checking for the other rows.
+        """
+        ids = func.unnest(sorted(set(control_ids))).table_valued("control_id").render_derived()
+        lock_key = func.hashtext(ids.c.control_id)
+        self.session.execute(select(func.pg_advisory_xact_lock(lock_key)).order_by(lock_key))
+
+    def add_dispatches_to_rollup(self, dispatches: list[InsertDerDispatchDict]):
+        """Adds der dispatches to the daily contract rollups. Dispatches that already
+        have an opt out response are only counted as opt outs.
+        Must be called after the dispatches have been inserted."""
+        control_ids = {d["control_id"] for d in dispatches}
+        self._lock_controls(control_ids)
+        stmt = select(DerResponse.control_id).where(
+            DerResponse.control_id.in_(control_ids), DerResponse.is_opt_out.is_(True)
+        )
+        opt_out_control_ids = set(self.session.execute(stmt).scalars().all())
+        rollups: dict[tuple[int, date], ContractEventRollupDict] = {}
+        for d in dispatches:
+            rollup = self._get_or_create_rollup(rollups, d["contract_id"], d["start_date_time"])
+            if d["control_id"] in opt_out_control_ids:
+                rollup["opt_out_count"] += 1
+            else:
+                rollup["cumulative_event_duration_mins"] += d["cumulative_event_duration_mins"]
+                rollup["max_total_energy"] += d["max_total_energy"]
+                rollup["event_count"] += 1
+        self._upsert_rollups(rollups)
+
+    def add_opt_outs_to_rollup(self, responses: list[CreateDerResponseDict]):
+        """Moves the dispatches that got their first opt out response from the event totals
+        to the opt out count of the daily contract rollups.
+        Must be called after the responses have been inserted.
+        """
+        batch_counts = Counter(r["control_id"] for r in responses if r["is_opt_out"])
+        if not batch_counts:
+            return
+        self._lock_controls(batch_counts)
+        counts_stmt = (
+            select(DerResponse.control_id, func.count())
+            .where(DerResponse.control_id.in_(batch_counts), DerResponse.is_opt_out.is_(True))
+            .group_by(DerResponse.control_id)
+        )
+        db_counts = dict(self.session.execute(counts_stmt).tuples().all())
+        # a control that already had an opt out before this batch is already counted
+        new_opt_out_control_ids = [
+            control_id for control_id, n in batch_counts.items() if db_counts.get(control_id) == n
+        ]
+        if not new_opt_out_control_ids:
+            return
+        dispatches_stmt = select(
+            DerDispatch.contract_id,
+            DerDispatch.start_date_time,
+            DerDispatch.cumulative_event_duration_mins,
+            DerDispatch.max_total_energy,
+        ).where(DerDispatch.control_id.in_(new_opt_out_control_ids))
+        rollups: dict[tuple[int, date], ContractEventRollupDict] = {}
+        for d in self.session.execute(dispatches_stmt):
+            rollup = self._get_or_create_rollup(rollups, d.contract_id, d.start_date_time)
+            rollup["cumulative_event_duration_mins"] -= d.cumulative_event_duration_mins
+            rollup["max_total_energy"] -= d.max_total_energy
+            rollup["event_count"] -= 1
+            rollup["opt_out_count"] += 1
+        self._upsert_rollups(rollups)
@@ -1,7 +1,24 @@
-from pm.modules.outbox.repository import OutboxRepository
+from typing import Optional, Sequence
+
+import pendulum
+
+from pm.modules.outbox.model import Outbox
+from pm.modules.outbox.repository import OutboxRepository, OutboxStats
 from shared.repository import UOW
+from shared.system import loggingsys
 from shared.tasks.producer import Producer
 
+logger = loggingsys.get_logger(name=__name__)
+
+# number of outbox messages claimed and produced before each flush & commit
+OUTBOX_BATCH_SIZE = 500
+# time before messages claimed by a dispatcher can be claimed by another one
+OUTBOX_LEASE_SECONDS = 60
+# sent messages older than this are removed from the outbox
+OUTBOX_RETENTION_DAYS = 7
+# number of old messages removed per transaction
+OUTBOX_RETENTION_BATCH_SIZE = 10000
+
 
 class OutboxUOW(UOW):
     def __enter__(self):
@@ -14,16 +31,119 @@ class OutboxController:
     def __init__(self):
         self.unit_of_work = OutboxUOW()
 
-    def send_message(self):
-        """Send a message to the message broker."""
-        with self.unit_of_work as uow:
-            for message in uow.repository.get_unsent():
+    def _produce_batch(self, messages: Sequence[Outbox]) -> list[int]:
+        """Produce a batch of messages and flush once.
+        Returns the ids of the messages the broker confirmed as delivered."""
+        delivered_ids: list[int] = []
+
+        def on_delivery(message_id: int):
+            def callback(err, _):
+                if err is None:
+                    delivered_ids.append(message_id)
+                else:
+                    logger.error(f"Outbox message {message_id} was not delivered: {err}")
+
+            return callback
+
+        try:
+            for message in messages:
                 Producer.send_json(
                     topic=message.topic,
                     json_str=message.get_json(),
                     headers=message.headers,
+                    key=message.key,
+                    on_delivery=on_delivery(message.id),
                 )
-                # flush each time, effectively making this a synchronous call
-                # this is required because we want to commit the transaction
-                # after each message is sent
-                Producer.flush()
+        except Exception as e:
+            # messages queued before the error are still flushed and marked as sent
+            logger.error(f"Error producing outbox messages: {e}")
+        finally:
+            # the delivery callbacks are called during the flush
+            Producer.flush()
+        return delivered_ids
+
+    @staticmethod
+    def _sent_in_order(
+        messages: Sequence[Outbox], delivered_ids: list[int]
+    ) -> tuple[list[int], list[int]]:
+        """Split the messages in the ids to mark as sent and the ids to release.
+        The delivered messages that follow an undelivered message of the same topic and key
+        are released, so they are sent again after it."""
+        delivered = set(delivered_ids)
+        failed_keys: set[tuple[str, Optional[str]]] = set()
+        sent_ids: list[int] = []
+        unsent_ids: list[int] = []
+        for message in messages:
+            topic_key = (message.topic, message.key)
+            if message.id in delivered and topic_key not in failed_keys:
+                sent_ids.append(message.id)
+                continue
+            unsent_ids.append(message.id)
+            if message.key is not None:
+                failed_keys.add(topic_key)
+        return sent_ids, unsent_ids
+
+    def send_message(
+        self, batch_size: int = OUTBOX_BATCH_SIZE, lease_seconds: int = OUTBOX_LEASE_SECONDS
+    ):
+        """Send the unsent outbox messages to the message broker.
+
+        Messages are claimed in batches, so several dispatchers can drain the outbox at the
+        same time without sending duplicates. Each batch is produced with a single flush, and
+        only the messages the broker confirmed are marked as sent, so a message is sent at
+        least once. The claim on undelivered messages is released and they are retried on
+        the next run. If a dispatcher dies, its claimed messages are picked up again once
+        lease_seconds have passed.
+
+        The messages of a key are claimed by one dispatcher at a time, in id order. When a
+        message isn't delivered, the later messages of its key in the batch are released
+        too, even if they were delivered, so they are sent again after it: consumers may
+        get duplicates, but the last message they get for a key is the latest one.
+        Messages without a key have no ordering guarantee.
+        """
+        sent_count = 0
+        with self.unit_of_work as uow:
+            while True:
+                messages = uow.repository.claim_unsent(batch_size, lease_seconds)
+                # commit the claim so the row locks are released while sending
+                uow.commit()
+                if not messages:
+                    break
+                sent_ids, unsent_ids = self._sent_in_order(messages, self._produce_batch(messages))
+                uow.repository.mark_as_sent(sent_ids)
+                uow.repository.release(unsent_ids)
+                uow.commit()
+                sent_count += len(sent_ids)
+                if unsent_ids or len(messages) < batch_size:
+                    break
+        if sent_count:
+            logger.info(f"Sent {sent_count} messages from the outbox.")
+
+    def remove_old_messages(
+        self,
+        retention_days: int = OUTBOX_RETENTION_DAYS,
+        batch_size: int = OUTBOX_RETENTION_BATCH_SIZE,
+        archive: bool = False,
+    ) -> int:
+        """Remove sent messages created more than retention_days ago.
+
+        Messages are deleted (or moved to the archive table) in batches of batch_size, with
+        a commit per batch, so the outbox isn't locked for long. Unsent messages are never
+        removed. Returns the number of removed messages.
+        """
+        cutoff = pendulum.now().subtract(days=retention_days)
+        removed_count = 0
+        with self.unit_of_work as uow:
+            while True:
+                removed = uow.repository.delete_sent_before(cutoff, batch_size, archive)
+                uow.commit()
+                removed_count += removed
+                if removed < batch_size:
+                    break
+        logger.info(f"Removed {removed_count} sent messages older than {cutoff} from the outbox.")
+        return removed_count
+
+    def get_stats(self) -> OutboxStats:
+        """Get the outbox table size and the unsent backlog size and age."""
+        with self.unit_of_work as uow:
+            return uow.repository.get_stats()
@@ -0,0 +1,57 @@
+import select
+from typing import Optional
+
+import psycopg2
+import psycopg2.extensions
+
+from shared.system import loggingsys
+
+logger = loggingsys.get_logger(name=__name__)
+
+# channel notified by the outbox insert trigger (see V14 migration)
+OUTBOX_CHANNEL = "outbox_inserted"
+
+
+class OutboxListener:
+    """Waits for the notifications sent when messages are added to the outbox.
+
+    Uses its own connection, since LISTEN needs an autocommit connection that stays
+    open, and it can't be shared with the session pool.
+
+    example usage:
+        with OutboxListener(dsn) as listener:
+            while True:
+                listener.wait(timeout=5)
+                send_messages()
+    """
+
+    def __init__(self, dsn: str, channel: str = OUTBOX_CHANNEL):
+        self.dsn = dsn
+        self.channel = channel
+        self.connection: Optional[psycopg2.extensions.connection] = None
+
+    def __enter__(self):
+        self.connection = connection = psycopg2.connect(self.dsn)
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        logger.info(f"Listening for notifications on '{self.channel}'")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def wait(self, timeout: float) -> bool:
+        """Block until a notification arrives or the timeout (in seconds) expires.
+        Returns True if at least one notification was received."""
+        connection = self.connection
+        if connection is None:
+            raise RuntimeError("OutboxListener.wait must be called inside its with block")
+        if select.select([connection], [], [], timeout) == ([], [], []):
+            return False
+        connection.poll()
+        notified = bool(connection.notifies)
+        connection.notifies.clear()
+        return notified
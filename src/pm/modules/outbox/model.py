@@ -1,12 +1,14 @@
 from __future__ import annotations
 
-import json
+from datetime import datetime
+from typing import Optional
 
-from sqlalchemy import Boolean, Column, Integer, UnicodeText
+from sqlalchemy import Boolean, Column, Integer, UnicodeText, func
 from sqlalchemy.dialects.postgresql import JSONB
 
-from shared.model import CreatedAtUpdatedAtMixin
+from shared.model import CreatedAtUpdatedAtMixin, make_timestamptz
 from shared.system.database import Base
+from shared.tasks import codec
 
 
 class Outbox(CreatedAtUpdatedAtMixin, Base):
@@ -18,15 +20,40 @@ class Outbox(CreatedAtUpdatedAtMixin, Base):
     This is required because we want to be able to send Kafka messages from within a transaction,
     which is important for ensuring data consistency. If we send the message directly to kafka,
     we can't guarantee that the message will be sent and the transaction will be committed.
+
+    Several dispatchers can send messages at the same time. A dispatcher claims a chunk of
+    messages by setting claimed_until, and the other dispatchers skip them until the lease
+    expires (e.g. if the dispatcher crashed before sending them).
     """
 
     __tablename__ = "outbox"
     id: int = Column(Integer, primary_key=True)
     topic: str = Column(UnicodeText, nullable=False)
+    key: Optional[str] = Column(  # type: ignore
+        UnicodeText, nullable=True, doc="The Kafka partition key"
+    )
     headers: dict = Column(JSONB, nullable=True)
     message: dict = Column(JSONB, nullable=False)
     is_sent: bool = Column(Boolean, nullable=False, default=False, index=True)
+    claimed_until: Optional[datetime] = Column(make_timestamptz(), nullable=True)
 
     def get_json(self) -> str:
         """Get the message as a json string."""
-        return json.dumps(self.message)
+        return codec.dumps_str(self.message)
+
+
+class OutboxArchive(Base):
+    """Sent outbox messages that are older than the retention period.
+    Only used when archiving is enabled, otherwise old messages are deleted."""
+
+    __tablename__ = "outbox_archive"
+    id: int = Column(Integer, primary_key=True, autoincrement=False, doc="The outbox id")
+    topic: str = Column(UnicodeText, nullable=False)
+    key: Optional[str] = Column(UnicodeText, nullable=True)  # type: ignore
+    headers: dict = Column(JSONB, nullable=True)
+    message: dict = Column(JSONB, nullable=False)
+    created_at: datetime = Column(make_timestamptz(), nullable=False)
+    sent_at: datetime = Column(make_timestamptz(), nullable=False)
+    archived_at: datetime = Column(
+        make_timestamptz(), server_default=func.current_timestamp(), nullable=False
+    )
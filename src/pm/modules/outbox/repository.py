@@ -1,24 +1,154 @@
-from typing import Generator
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
 
-from sqlalchemy import select
+from sqlalchemy import delete, exists, func, insert, or_, select, text, update
+from sqlalchemy.orm import aliased
 
-from pm.modules.outbox.model import Outbox
+from pm.modules.outbox.model import Outbox, OutboxArchive
 from shared.repository import SQLRepository
 from shared.system import loggingsys
 
 logger = loggingsys.get_logger(name=__name__)
 
+# advisory lock taken by each claim. It is global: the claims of all the dispatchers run one
+# at a time (the sending isn't serialized, only the claim transactions, which are short)
+OUTBOX_CLAIM_LOCK = "outbox_claim"
+
+
+@dataclass
+class OutboxStats:
+    table_size_bytes: int
+    approx_row_count: int
+    unsent_count: int
+    oldest_unsent_age_seconds: Optional[float]
+
 
 class OutboxRepository(SQLRepository):
-    def get_unsent(self) -> Generator[Outbox, None, None]:
-        """Get all unsent messages from the outbox."""
-        stmt = select(Outbox).where(Outbox.is_sent.is_(False)).order_by(Outbox.id)
-        records = self.session.execute(stmt).scalars().all()
-        for r in records:
-            yield r
-            r.is_sent = True
-            self.session.add(r)
-            # we want to commit every successful sent message, since the
-            # message broker might get blocked if kafka is down
-            self.session.commit()
-        logger.info(f"Sent {len(records)} messages from the outbox.")
+    def claim_unsent(self, limit: int, lease_seconds: int) -> Sequence[Outbox]:
+        """Claim the oldest unsent messages, up to limit messages.
+
+        Messages claimed by another dispatcher are skipped until their lease expires, so
+        dispatchers running at the same time never get the same messages.
+        A message with a key is also skipped while an earlier message of the same topic and
+        key is claimed by another dispatcher, so the messages of a key are never sent by two
+        dispatchers at once, and are sent in id order. Claims take the global OUTBOX_CLAIM_LOCK
+        advisory lock, so the claims of all the dispatchers are serialized and each one sees
+        the claims committed before it. The lookup of the earlier messages of a key uses the
+        partial idx_outbox_unsent_topic_key index.
+        The claim must be committed before sending the messages. The messages are detached
+        from the session so they can still be used after the commit.
+        """
+        self.session.execute(select(func.pg_advisory_xact_lock(func.hashtext(OUTBOX_CLAIM_LOCK))))
+        now = func.current_timestamp()
+        earlier = aliased(Outbox)
+        earlier_claimed = exists().where(
+            earlier.topic == Outbox.topic,
+            earlier.key == Outbox.key,
+            earlier.id < Outbox.id,
+            earlier.is_sent.is_(False),
+            earlier.claimed_until >= now,
+        )
+        claimable = (
+            select(Outbox.id)
+            .where(
+                Outbox.is_sent.is_(False),
+                or_(Outbox.claimed_until.is_(None), Outbox.claimed_until < now),
+                ~earlier_claimed,
+            )
+            .order_by(Outbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(Outbox)
+            .where(Outbox.id.in_(claimable.scalar_subquery()))
+            .values(claimed_until=now + timedelta(seconds=lease_seconds))
+            .returning(Outbox)
+            .execution_options(synchronize_session=False)
+        )
+        messages = sorted(self.session.execute(stmt).scalars().all(), key=lambda m: m.id)
+        for message in messages:
+            self.session.expunge(message)
+        return messages
+
+    def mark_as_sent(self, ids: list[int]):
+        """Mark messages as sent with a single update."""
+        if not ids:
+            return
+        stmt = (
+            update(Outbox)
+            .where(Outbox.id.in_(ids))
+            .values(is_sent=True, claimed_until=None, updated_at=func.current_timestamp())
+            .execution_options(synchronize_session=False)
+        )
+        self.session.execute(stmt)
+
+    def release(self, ids: list[int]):
+        """Release the claim on messages that could not be sent,
+        so they can be claimed again straight away."""
+        if not ids:
+            return
+        stmt = (
+            update(Outbox)
+            .where(Outbox.id.in_(ids))
+            .values(claimed_until=None)
+            .execution_options(synchronize_session=False)
+        )
+        self.session.execute(stmt)
+
+    def delete_sent_before(self, cutoff: datetime, limit: int, archive: bool = False) -> int:
+        """Delete up to limit sent messages created before cutoff, oldest first.
+        If archive is set, the messages are moved to the outbox_archive table.
+        Returns the number of deleted messages.
+        """
+        ids = (
+            select(Outbox.id)
+            .where(Outbox.is_sent.is_(True), Outbox.created_at < cutoff)
+            .order_by(Outbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        deleted = delete(Outbox).where(Outbox.id.in_(ids))
+        if not archive:
+            return len(self.session.execute(deleted.returning(Outbox.id)).all())
+        deleted_rows = deleted.returning(
+            Outbox.id,
+            Outbox.topic,
+            Outbox.key,
+            Outbox.headers,
+            Outbox.message,
+            Outbox.created_at,
+            Outbox.updated_at,
+        ).cte("deleted_rows")
+        stmt = insert(OutboxArchive).from_select(
+            ["id", "topic", "key", "headers", "message", "created_at", "sent_at"],
+            select(deleted_rows),
+        )
+        return len(self.session.execute(stmt.returning(OutboxArchive.id)).all())
+
+    def get_stats(self) -> OutboxStats:
+        """Get the size of the outbox table and the size and age of the unsent backlog.
+        The row count is the planner estimate, so it doesn't scan the table."""
+        table_size_bytes, approx_row_count = self.session.execute(
+            text(
+                "SELECT pg_total_relation_size(oid), reltuples::bigint "
+                "FROM pg_class WHERE relname = :table"
+            ),
+            {"table": Outbox.__tablename__},
+        ).one()
+        unsent_count, oldest_unsent_age_seconds = self.session.execute(
+            select(
+                func.count(),
+                func.extract("epoch", func.current_timestamp() - func.min(Outbox.created_at)),
+            ).where(Outbox.is_sent.is_(False))
+        ).one()
+        return OutboxStats(
+            table_size_bytes=table_size_bytes,
+            approx_row_count=max(approx_row_count, 0),
+            unsent_count=unsent_count,
+            oldest_unsent_age_seconds=(
+                float(oldest_unsent_age_seconds) if oldest_unsent_age_seconds is not None else None
+            ),
+        )
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, Sequence
+from typing import Iterable, Optional, Sequence
 
 import pendulum
 from sqlalchemy import and_, asc, desc, select, text
@@ -117,12 +117,26 @@ class ProgramRepository(SQLRepository):
         program = self.get(
             program_id, include_draft=True, eager_load_relationships=eager_load_relationships
         )
+        return self.check_program_found(program_id, program, include_draft)
+
+    @staticmethod
+    def check_program_found(
+        program_id: int, program: Optional[Program], include_draft=False
+    ) -> Program:
+        """Raise a ProgramNotFound exception if the program wasn't found,
+        or is in draft status and draft programs aren't included.
+        """
         if not program:
             raise ProgramNotFound(f"program with ID {program_id} not found")
         elif program.status == ProgramStatus.DRAFT and not include_draft:
             raise ProgramNotFound(f"program with ID {program_id} is in draft status")
         return program
 
+    def get_programs_by_ids(self, program_ids: Iterable[int]) -> Sequence[Program]:
+        """Gets the programs with the given IDs, including draft programs"""
+        stmt = select(Program).where(Program.id.in_(program_ids))
+        return self.session.execute(stmt).scalars().all()
+
     def get_programs_to_activate(self) -> Sequence[Program]:
         stmt = select(Program).where(
             and_(Program.status == ProgramStatus.PUBLISHED, Program.start_date <= pendulum.now())
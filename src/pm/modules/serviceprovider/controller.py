@@ -129,69 +129,73 @@ class ServiceProviderController:
             return id
 
     def associate_ders(self, service_provider_id: int, der_list: list[DerList]) -> list[dict]:
-        ders_uuid = []
-        ders_output = []
+        """Associate a list of DERs with a service provider.
+
+        All the DERs are associated by set-based UPDATEs and a single commit. Returns the
+        outcome of each DER, in order, with a status code:
+        1: duplicate der_id, 2: missing der_id, 3: associated, 4: DER not found or already
+        associated with a service provider.
+        """
         with self.unit_of_work as uow:
             uow.repository.get_service_provider_or_raise(
                 service_provider_id, include_inactive=False
             )
-        with self.unit_of_work as uow:
-            for der in der_list:
-                incorrect_data = False
-                if ("der_id" in der) and (str(der["der_id"])):
-                    if der["der_id"] in ders_uuid:
-                        ders_output.append(
-                            {
-                                "der_id": der["der_id"],
-                                "outcome": "could not associated to service provider with id "
-                                + str(service_provider_id),
-                                "reason": "Duplicate der_id",
-                                "status_code": 1,
-                            }
-                        )
-                        continue
-                    existing_der = uow.repository.get_der_without_serviceprovider(
-                        der_id=der["der_id"]
-                    )
-                    ders_uuid.append(der["der_id"])
-                else:
-                    existing_der = None
-                    incorrect_data = True
+        not_associated = "could not associated to service provider with id " + str(
+            service_provider_id
+        )
+        ders_uuid: set[str] = set()
+        ders_output: list[dict] = []
+        for der in der_list:
+            if ("der_id" in der) and (str(der["der_id"])):
+                if der["der_id"] in ders_uuid:
                     ders_output.append(
                         {
-                            "der_id": "",
-                            "outcome": "could not associated to service provider with id "
-                            + str(service_provider_id),
-                            "reason": "Either incorrect format, values or missing der_id",
-                            "status_code": 2,
+                            "der_id": der["der_id"],
+                            "outcome": not_associated,
+                            "reason": "Duplicate der_id",
+                            "status_code": 1,
                         }
                     )
+                    continue
+                ders_uuid.add(der["der_id"])
+                # the outcome is set once the DERs are associated
+                ders_output.append({"der_id": der["der_id"]})
+            else:
+                ders_output.append(
+                    {
+                        "der_id": "",
+                        "outcome": not_associated,
+                        "reason": "Either incorrect format, values or missing der_id",
+                        "status_code": 2,
+                    }
+                )
 
-                if not incorrect_data:
-                    if existing_der is not None:
-                        uow.repository.update_der(service_provider_id, der["der_id"])
-                        ders_output.append(
-                            {
-                                "der_id": der["der_id"],
-                                "outcome": "Associated to service provider with id "
-                                + str(service_provider_id),
-                                "reason": "",
-                                "status_code": 3,
-                            }
-                        )
-                    else:
-                        ders_output.append(
-                            {
-                                "der_id": der["der_id"],
-                                "outcome": "could not associated to service provider with id "
-                                + str(service_provider_id),
-                                "reason": "No DER found with der_id "
-                                + str(der["der_id"])
-                                + " or it is already associated with a different service provider.",
-                                "status_code": 4,
-                            }
-                        )
+        with self.unit_of_work as uow:
+            associated = uow.repository.associate_ders(service_provider_id, list(ders_uuid))
             uow.commit()
+
+        for output in ders_output:
+            if "status_code" in output:
+                continue
+            if output["der_id"] in associated:
+                output.update(
+                    {
+                        "outcome": "Associated to service provider with id "
+                        + str(service_provider_id),
+                        "reason": "",
+                        "status_code": 3,
+                    }
+                )
+            else:
+                output.update(
+                    {
+                        "outcome": not_associated,
+                        "reason": "No DER found with der_id "
+                        + str(output["der_id"])
+                        + " or it is already associated with a different service provider.",
+                        "status_code": 4,
+                    }
+                )
         return ders_output
 
     def associate_ders_file_upload(
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Optional, Sequence
+from typing import Iterable, Optional, Sequence
 
 from sqlalchemy import and_, select, update
 from sqlalchemy.orm import joinedload
@@ -14,6 +14,9 @@ from shared.system.loggingsys import get_logger
 
 logger = get_logger(__name__)
 
+# maximum number of DERs associated by one UPDATE statement
+ASSOCIATE_DERS_BATCH_SIZE = 10000
+
 
 class ServiceProviderRepository(SQLRepository):
     """Deals with ALL writes and reads related to commands & queries to the DB"""
@@ -59,6 +62,17 @@ class ServiceProviderRepository(SQLRepository):
         self, service_provider_id: int, load_ders=False, include_inactive=True
     ) -> ServiceProvider:
         service_provider = self.get_service_provider(service_provider_id, load_ders)
+        return self.check_service_provider_found(
+            service_provider_id, service_provider, include_inactive
+        )
+
+    @staticmethod
+    def check_service_provider_found(
+        service_provider_id: int, service_provider: Optional[ServiceProvider], include_inactive=True
+    ) -> ServiceProvider:
+        """Raise a ServiceProviderNotFound exception if the service provider wasn't found,
+        or is inactive and inactive service providers aren't included.
+        """
         if not service_provider:
             raise ServiceProviderNotFound(
                 errors={"error": "Not Found"},
@@ -72,6 +86,17 @@ class ServiceProviderRepository(SQLRepository):
                 )
         return service_provider
 
+    def get_service_providers_by_ids(
+        self, service_provider_ids: Iterable[int]
+    ) -> Sequence[ServiceProvider]:
+        """Gets the service providers with the given IDs that aren't deleted, without their DERs"""
+        stmt = (
+            select(ServiceProvider)
+            .where(ServiceProvider.deleted == False)  # noqa: E712
+            .where(ServiceProvider.id.in_(service_provider_ids))
+        )
+        return self.session.execute(stmt).scalars().all()
+
     def count_by_name(self, name: str) -> int:
         stmt = select(ServiceProvider.id).where(
             and_(ServiceProvider.name == name, ServiceProvider.deleted == False)  # noqa: E712
@@ -116,29 +141,26 @@ class ServiceProviderRepository(SQLRepository):
         )
         return self.session.execute(stmt).unique().scalar_one_or_none()
 
-    def get_der_without_serviceprovider(self, der_id: str) -> Optional[DerInfo]:  # type: ignore
-        stmt = (
-            select(DerInfo)
-            .where(DerInfo.der_id == der_id)
-            .where(DerInfo.service_provider_id == None)  # noqa: E711
-            .where(DerInfo.is_deleted == False)  # noqa: E712
-        )
-        return self.session.execute(stmt).unique().scalar_one_or_none()
-
-    def update_der(self, service_provider_id: int, der_id):  # type: ignore
-        existing_der = self.get_der_without_serviceprovider(der_id=der_id)
-        if not existing_der:
-            raise ServiceProviderDerAssociationNotFound(
-                errors={"error": "Not Found"},
-                message=f"Association of Service Provider with id {service_provider_id} with Der with id {der_id} is not found",  # noqa: E501
+    def associate_ders(self, service_provider_id: int, der_ids: list[str]) -> set[str]:
+        """Associate the DERs with the service provider, in a set-based UPDATE per batch of
+        ASSOCIATE_DERS_BATCH_SIZE der_ids.
+        Only DERs that aren't deleted or associated with a service provider already are
+        associated. Returns the der_ids of the associated DERs.
+        """
+        associated: set[str] = set()
+        for start in range(0, len(der_ids), ASSOCIATE_DERS_BATCH_SIZE):
+            end = start + ASSOCIATE_DERS_BATCH_SIZE
+            stmt = (
+                update(DerInfo)
+                .where(DerInfo.der_id.in_(der_ids[start:end]))
+                .where(DerInfo.service_provider_id == None)  # noqa: E711
+                .where(DerInfo.is_deleted == False)  # noqa: E712
+                .values(service_provider_id=service_provider_id)
+                .returning(DerInfo.der_id)
+                .execution_options(synchronize_session=False)
             )
-
-        stmt = (
-            update(DerInfo)
-            .where(DerInfo.der_id == der_id)
-            .values(service_provider_id=service_provider_id)
-        )
-        self.session.execute(stmt)
+            associated.update(self.session.execute(stmt).scalars().all())
+        return associated
 
     def get_ders_service_provider(self, service_provider_id: int) -> Sequence[DerInfo]:
         stmt = (
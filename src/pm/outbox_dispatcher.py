@@ -0,0 +1,77 @@
+import time
+
+from dotenv import load_dotenv
+
+from pm.config import PMConfig
+
+# models
+from pm.modules.enrollment.models import *  # noqa
+from pm.modules.outbox.controller import OutboxController
+from pm.modules.outbox.listener import OutboxListener
+from pm.modules.progmgmt.models import *  # noqa
+from pm.modules.serviceprovider.models import *  # noqa
+from shared.system import configuration, database, loggingsys
+
+# load env variables
+load_dotenv()
+config = configuration.init_config(PMConfig)
+
+# setup logging
+loggingsys.init(config=config)
+
+# init SQL Alchemy
+database.init(config=config)
+
+logger = loggingsys.get_logger(name=__name__)
+
+
+def send_outbox_messages(controller: OutboxController):
+    try:
+        controller.send_message(
+            batch_size=config.OUTBOX_BATCH_SIZE, lease_seconds=config.OUTBOX_LEASE_SECONDS
+        )
+    except Exception as e:
+        logger.error(f"Error sending outbox messages: {e}", exc_info=True)
+
+
+def dispatch_outbox_messages():
+    """Drain the outbox every OUTBOX_POLL_INTERVAL_SECONDS.
+
+    Messages are claimed in chunks with a lease, so any number of dispatchers
+    can run at the same time without sending duplicates.
+    """
+    controller = OutboxController()
+    while True:
+        send_outbox_messages(controller)
+        time.sleep(config.OUTBOX_POLL_INTERVAL_SECONDS)
+
+
+def dispatch_outbox_messages_on_notify():
+    """Drain the outbox as soon as messages are inserted.
+
+    Blocks on LISTEN for the notification sent by the outbox insert trigger. The outbox
+    is also drained every OUTBOX_POLL_INTERVAL_SECONDS without a notification, as a
+    safety net for missed notifications. If the listening connection is lost, the
+    dispatcher reconnects.
+    """
+    controller = OutboxController()
+    dsn = database.pgdsn_from_config(config)
+    while True:
+        try:
+            with OutboxListener(dsn) as listener:
+                # send anything added before we started listening
+                send_outbox_messages(controller)
+                while True:
+                    listener.wait(timeout=config.OUTBOX_POLL_INTERVAL_SECONDS)
+                    send_outbox_messages(controller)
+        except Exception as e:
+            logger.error(f"Outbox listener error, reconnecting: {e}", exc_info=True)
+            time.sleep(config.OUTBOX_POLL_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    logger.info("Starting outbox dispatcher...")
+    if config.OUTBOX_POLL_ONLY:
+        dispatch_outbox_messages()
+    else:
+        dispatch_outbox_messages_on_notify()
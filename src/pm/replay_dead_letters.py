@@ -0,0 +1,51 @@
+import argparse
+
+from dotenv import load_dotenv
+
+from pm.config import PMConfig
+from shared.system import configuration, loggingsys
+from shared.tasks.dead_letter import DEAD_LETTER_REPLAY_GROUP_ID, replay_dead_letters
+
+# load env variables
+load_dotenv()
+config = configuration.init_config(PMConfig)
+
+# setup logging
+loggingsys.init(config=config)
+
+logger = loggingsys.get_logger(name=__name__)
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments.
+    --topic: The topic to replay, its messages are read from `<topic>.dlq`.
+    --max-messages: Stop after replaying this many messages. Replays everything by default.
+    --group-id: The consumer group used to read the dead letter topic.
+    """
+    parser = argparse.ArgumentParser(description="Replay dead letter messages")
+    parser.add_argument("--topic", type=str, required=True, help="The topic to replay.")
+    parser.add_argument(
+        "--max-messages",
+        type=int,
+        default=None,
+        help="Stop after replaying this many messages. Default is all of them.",
+    )
+    parser.add_argument(
+        "--group-id",
+        type=str,
+        default=DEAD_LETTER_REPLAY_GROUP_ID,
+        help=f"Consumer group reading the dead letter topic. Default is "
+        f"'{DEAD_LETTER_REPLAY_GROUP_ID}'.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    logger.info(f"Replaying dead letters of {args.topic}...")
+    replay_dead_letters(
+        kafka_url=config.KAFKA_URL,
+        topic=args.topic,
+        group_id=args.group_id,
+        max_messages=args.max_messages,
+    )
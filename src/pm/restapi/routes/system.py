@@ -5,6 +5,7 @@ from flask.views import MethodView
 from flask_smorest import Blueprint  # type: ignore
 from marshmallow import Schema, fields
 
+from pm.modules.outbox.controller import OutboxController
 from shared.system.loggingsys import get_logger
 
 logger = get_logger(__name__)
@@ -23,6 +24,21 @@ class HealthCheck(MethodView):
         return jsonify({"message": "online"}), HTTPStatus.OK
 
 
+class OutboxStatsSchema(Schema):
+    table_size_bytes = fields.Integer(required=True)
+    approx_row_count = fields.Integer(required=True)
+    unsent_count = fields.Integer(required=True)
+    oldest_unsent_age_seconds = fields.Float(required=True, allow_none=True)
+
+
+@blueprint.route("/outbox")
+class OutboxStats(MethodView):
+    @blueprint.response(HTTPStatus.OK, OutboxStatsSchema)
+    def get(self):
+        """Get the outbox table size and the size and age of the unsent message backlog"""
+        return OutboxController().get_stats()
+
+
 @blueprint.route("/debug/headers")
 @blueprint.response(HTTPStatus.OK)
 def debug_headers():
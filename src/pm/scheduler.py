@@ -32,9 +32,20 @@ logger.info("Starting scheduler...")
 
 
 @log_time(logger)
-def check_for_kafka_messages():
-    """Check for new messages in the Kafka topic and process them."""
-    OutboxController().send_message()
+def remove_old_outbox_messages():
+    """Delete or archive sent outbox messages older than the retention period."""
+    OutboxController().remove_old_messages(
+        retention_days=config.OUTBOX_RETENTION_DAYS, archive=config.OUTBOX_ARCHIVE
+    )
+
+
+def report_outbox_stats():
+    """Log the outbox table size and the unsent backlog."""
+    stats = OutboxController().get_stats()
+    logger.info(
+        f"Outbox: {stats.table_size_bytes} bytes, ~{stats.approx_row_count} rows, "
+        f"{stats.unsent_count} unsent, oldest unsent {stats.oldest_unsent_age_seconds}s old"
+    )
 
 
 @log_time(logger)
@@ -73,14 +84,16 @@ def init_scheduler():
 
     The default scheduler uses a ThreadPoolExecutor with 10 workers,
     and it will run until the app is shut down.
+    The outbox is drained by pm.outbox_dispatcher, not by the scheduler.
 
     See: https://apscheduler.readthedocs.io/en/stable/userguide.html#background-scheduler
     """
     scheduler = BackgroundScheduler()
     scheduler.start()
-    scheduler.add_job(check_for_kafka_messages, "interval", seconds=5)
     scheduler.add_job(calculate_daily_constraints, "cron", hour=2)
     scheduler.add_job(update_program_status, "interval", hours=1)
+    scheduler.add_job(remove_old_outbox_messages, "cron", hour=3)
+    scheduler.add_job(report_outbox_stats, "interval", minutes=5)
 
     try:
         while True:
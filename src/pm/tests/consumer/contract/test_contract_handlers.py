@@ -6,7 +6,7 @@ from confluent_kafka import Message
 from pm.consumers.contract import handlers
 from pm.modules.enrollment.contract_repository import ContractRepository
 from pm.tests import factories
-from pm.tests.consumer.mocks import MockSingleMessageConsumer
+from pm.tests.consumer.mocks import MockKafkaConsumer, MockSingleMessageConsumer
 from pm.topics import ContractMessage
 from shared.tasks.producer import Producer
 
@@ -33,15 +33,19 @@ class TestContractHandler:
         factories.ContractFactory(
             id=1, enrollment_request=enrollment, program=program, service_provider=service_provider
         )
-        consumer = [
-            Mock(
-                spec=Message,
-                topic=lambda: ContractMessage.TOPIC,
-                value=lambda: contract_payload_bytes,
-                headers=lambda: [("operation", b"create")],
-            ),
-        ]
+        message = Mock(
+            spec=Message,
+            topic=lambda: ContractMessage.TOPIC,
+            partition=lambda: 0,
+            offset=lambda: 0,
+            value=lambda: contract_payload_bytes,
+            headers=lambda: [("operation", b"create")],
+        )
+        consumer = MockKafkaConsumer([message])
         topic_handlers = {ContractMessage.TOPIC: [handlers.handle_contract]}
         MockSingleMessageConsumer(consumer=consumer, topics=topic_handlers).listen()
         # assert Kafka producer was called
         assert Producer._producer.produce.call_count == 1
+        # the handler succeeded, so the offset of the message is stored
+        consumer.store_offsets.assert_called_once_with(message=message)
+        consumer.pause.assert_not_called()
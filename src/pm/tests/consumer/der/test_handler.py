@@ -1,3 +1,4 @@
+import json
 from unittest.mock import Mock
 from uuid import uuid4
 
@@ -18,22 +19,48 @@ from pm.modules.derinfo.models.der_info import DerInfo
 from pm.modules.enrollment.enums import EnrollmentCRUDStatus
 from pm.modules.enrollment.repository import EnrollmentRequestRepository
 from pm.tests import factories
-from pm.tests.consumer.mocks import MockSingleMessageConsumer
 from shared.minio_manager import convert_strings_to_float
+from shared.tasks.consumer import ConsumerMessage
 
 
 class TestDerWHHandlers:
-    def test_handle_der(self, der_payload_bytes, db_session):
-        consumer = [
+    def _message(self, payload: bytes) -> ConsumerMessage:
+        return ConsumerMessage(
             Mock(
                 spec=Message,
                 topic=lambda: handlers.DER_WAREHOUSE_DER_TOPIC,
-                value=lambda: der_payload_bytes,
+                value=lambda: payload,
                 headers=lambda: [("service_provider_id", b"1")],
-            ),
+            )
+        )
+
+    def test_handle_der(self, der_payload_bytes, db_session):
+        handlers.handle_derwh_der([self._message(der_payload_bytes)])
+        with db_session() as session:
+            ders = session.query(DerInfo).all()
+        assert [der.der_id for der in ders] == ["1234-someId-5678"]
+
+    def test_handle_der_batch_keeps_latest_version(self, der_payload_bytes, db_session):
+        """The last message of a DER in the batch wins, and invalid messages are skipped."""
+        sp = factories.ServiceProviderFactory()
+        factories.DerFactory(der_id="1234-someId-5678", service_provider_id=sp.id)
+        deleted = {**json.loads(der_payload_bytes), "name": "deleted", "is_deleted": True}
+        other = {**json.loads(der_payload_bytes), "der_id": "other-der"}
+        invalid = {**json.loads(der_payload_bytes), "der_id": "invalid", "der_type": "NOT_A_TYPE"}
+        messages = [
+            self._message(der_payload_bytes),
+            self._message(json.dumps(deleted).encode()),
+            self._message(json.dumps(other).encode()),
+            self._message(json.dumps(invalid).encode()),
         ]
-        topic_handlers = {handlers.DER_WAREHOUSE_DER_TOPIC: [handlers.handle_derwh_der]}
-        MockSingleMessageConsumer(consumer=consumer, topics=topic_handlers).listen()
+        handlers.handle_derwh_der(messages)
+        with db_session() as session:
+            ders = {der.der_id: der for der in session.query(DerInfo).all()}
+        assert set(ders) == {"1234-someId-5678", "other-der"}
+        assert ders["1234-someId-5678"].name == "deleted"
+        assert ders["1234-someId-5678"].is_deleted is True
+        assert ders["1234-someId-5678"].service_provider_id is None
+        assert ders["other-der"].is_deleted is False
 
 
 class TestEnrollDerIntoServiceProvider:
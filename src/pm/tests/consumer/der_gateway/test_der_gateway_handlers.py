@@ -31,11 +31,14 @@ class TestDerGatewayHandlers:
     def _assert_handles_messages(self, expected_count: int, messages: ConsumerMessage):
         controller_mock = Mock(spec=EventController)
         with mock.patch("pm.consumers.der_gateway.handlers.EventController", controller_mock):
-            handle_der_control(messages)
+            valid, _ = ConsumerMessage.validate_batch(handle_der_control.schema, messages)
+            handle_der_control(valid)
             instance = controller_mock.return_value
             assert instance.create_der_dispatch.call_count == 1
             args = instance.create_der_dispatch.call_args[0][0]
             assert len(args) == expected_count
+            assert isinstance(args[0]["contract_id"], int)
+            assert args[0]["end_date_time"] == 1635497100
 
     def test_der_control(self):
         messages_number = 500
@@ -88,11 +91,14 @@ class TestDerGatewayHandlers:
     def _assert_handles_messages_response(self, expected_count: int, messages: ConsumerMessage):
         controller_mock = Mock(spec=EventController)
         with mock.patch("pm.consumers.der_gateway.handlers.EventController", controller_mock):
-            handle_der_response(messages)
+            valid, _ = ConsumerMessage.validate_batch(handle_der_response.schema, messages)
+            handle_der_response(valid)
             instance = controller_mock.return_value
             assert instance.create_der_response.call_count == 1
             args = instance.create_der_response.call_args[0][0]
             assert len(args) == expected_count
+            assert args[0]["der_response_status"] == 4
+            assert args[0]["is_opt_out"] is True
 
     def test_der_response(self):
         messages_number = 500
@@ -1,8 +1,21 @@
+from unittest.mock import Mock
+
 from confluent_kafka import Message
 
 from shared.tasks.consumer import SingleMessageConsumer
 
 
+class MockKafkaConsumer(list):
+    """A list of messages that is iterated like a Kafka consumer, with mocks for the
+    offset and retry calls the consumer makes on it"""
+
+    def __init__(self, messages: list[Message]):
+        super().__init__(messages)
+        self.store_offsets = Mock()
+        self.pause = Mock()
+        self.seek = Mock()
+
+
 class MockSingleMessageConsumer(SingleMessageConsumer):
     def listen(self):
         """The same as the listen method on the consumer, but errors will not be caught.
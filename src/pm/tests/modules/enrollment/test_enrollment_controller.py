@@ -548,6 +548,45 @@ class TestEnrollmentController(TestDataMixin):
         assert enrollment_req[0]["status"] == EnrollmentCRUDStatus.NOT_CREATED
         assert message.lower() in enrollment_req[0]["message"].lower()
 
+    def test_create_enrollment_requests_batch(self, db_session, enrollment_dict):
+        """Each enrollment request of a batch gets its own result, and a contract created
+        earlier in the batch blocks a duplicate enrollment request."""
+        factories.ProgramFactory(id=1, check_der_eligibility=False)
+        factories.ServiceProviderFactory(id=1)
+        factories.DerFactory(der_id="der 1", service_provider_id=1)
+        factories.DerFactory(der_id="der 2", service_provider_id=1)
+
+        def enrollment_args(der_id):
+            return {
+                **enrollment_dict,
+                "general_fields": {**enrollment_dict["general_fields"], "der_id": der_id},
+            }
+
+        batch = [
+            enrollment_args("der 1"),
+            enrollment_args("der 2"),
+            enrollment_args("der 1"),
+            enrollment_args("missing der"),
+        ]
+        results = EnrollmentController().create_enrollment_requests(batch)
+
+        assert [r["status"] for r in results] == [
+            EnrollmentCRUDStatus.CREATED,
+            EnrollmentCRUDStatus.CREATED,
+            EnrollmentCRUDStatus.NOT_CREATED,
+            EnrollmentCRUDStatus.NOT_CREATED,
+        ]
+        assert results[2]["message"] == (
+            "Contract already exists for this program, service provider, and der"
+        )
+        assert results[3]["message"] == "DER was not found"
+        enrollments = self._get_all_enrollments(db_session)
+        assert sorted(e.id for e in enrollments) == sorted([results[0]["id"], results[1]["id"]])
+        contracts = self._get_all_contracts(db_session)
+        assert sorted(c.enrollment_request_id for c in contracts) == sorted(
+            e.id for e in enrollments
+        )
+
     def test_get_one_enrollment(self, db_session, enrollment):
         program_id = enrollment.program_id
         got_enrollment = EnrollmentController().get_enrollment_request(enrollment.id)
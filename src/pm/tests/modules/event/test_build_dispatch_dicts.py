@@ -137,3 +137,36 @@ class TestBuildDispatchDicts:
             assert got["control_id"] == "B94E28E2C65547B3B1F9C096D4F8952B"
             assert got["cumulative_event_duration_mins"] == exp["cumulative_event_duration_mins"]
             assert got["max_total_energy"] == exp["max_total_energy"]
+
+    def test_build_batch_matches_create_dicts(self):
+        """The batch builder gives the same dicts as building them one by one."""
+        day_start = pendulum.datetime(2023, 10, 18).int_timestamp
+        times = [
+            (day_start + 3600, day_start + 7200),
+            (day_start - 3600, day_start + 3600 * 3),
+            (day_start, day_start + 86400),
+            (day_start + 60, day_start + 86400 * 3 + 1234),
+            (day_start + 3600, day_start + 7200),
+        ]
+        data = [
+            CreateDerDispatchDict(
+                event_id=f"event-{i}",
+                start_date_time=start,
+                end_date_time=end,
+                event_status="scheduled",
+                control_command=control_command,
+                control_type="kW % Rated Capacity",
+                contract_id=1,
+                control_id=f"control-{i}",
+            )
+            for i, ((start, end), control_command) in enumerate(
+                zip(times, ["1.00", "2.5", "0.33", "7", "1.00"])
+            )
+        ]
+        expected = []
+        for d in data:
+            expected += BuildDerDispatchDicts().create_dicts(d)
+
+        result = BuildDerDispatchDicts().create_dicts_batch(data)
+
+        assert result == expected
@@ -0,0 +1,104 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from pm.modules.derinfo.enums import DerAssetType, DerResourceCategory, LimitUnitType
+from pm.modules.derinfo.models.der_info import DerInfo
+from pm.modules.event_tracking.models.der_dispatch import DerDispatch
+from pm.tests import factories
+from shared import repository
+from shared.repository import COPY_MIN_ROWS, SQLRepository
+
+
+class TestBulkInsert:
+    """The COPY path must store the same data as the executemany path"""
+
+    @pytest.fixture
+    def insert_with(self, db_session, monkeypatch):
+        def insert(model, rows: list[dict], copy: bool):
+            monkeypatch.setattr(repository, "COPY_MIN_ROWS", 1 if copy else len(rows) + 1)
+            with db_session() as session:
+                SQLRepository(session).bulk_insert(model, rows)
+                session.commit()
+
+        return insert
+
+    def _der_rows(self, prefix: str) -> list[dict]:
+        return [
+            dict(
+                der_id=f"{prefix}-{i}",
+                # a literal \N must not be read as NULL, nor quotes and separators split
+                name="\\N" if i % 3 == 0 else f'der "{i}",\n{i}',
+                # None is left out, so the server default is used
+                is_deleted=None if i < COPY_MIN_ROWS // 2 else True,
+                der_type=list(DerAssetType)[i % len(DerAssetType)],
+                nameplate_rating=Decimal("12.3456") * i,
+                nameplate_rating_unit=LimitUnitType.kW,
+                resource_category=DerResourceCategory.RES,
+                created_at=datetime(2024, 1, 1, 12, 30, i % 60, tzinfo=timezone.utc),
+                service_provider_id=None,
+            )
+            for i in range(COPY_MIN_ROWS)
+        ]
+
+    def test_copy_matches_executemany(self, db_session, insert_with):
+        insert_with(DerInfo, self._der_rows("copy"), copy=True)
+        insert_with(DerInfo, self._der_rows("many"), copy=False)
+
+        def stored(prefix: str) -> list[tuple]:
+            with db_session() as session:
+                ders = (
+                    session.query(DerInfo)
+                    .filter(DerInfo.der_id.startswith(f"{prefix}-"))
+                    .order_by(DerInfo.id)
+                    .all()
+                )
+                return [
+                    (
+                        d.der_id.removeprefix(prefix),
+                        d.name,
+                        d.is_deleted,
+                        d.der_type,
+                        d.nameplate_rating,
+                        d.nameplate_rating_unit,
+                        d.resource_category,
+                        d.created_at,
+                        d.service_provider_id,
+                    )
+                    for d in ders
+                ]
+
+        copied = stored("copy")
+        assert len(copied) == COPY_MIN_ROWS
+        assert copied == stored("many")
+        assert copied[0][1] == "\\N"
+        assert copied[0][2] is False
+        assert copied[-1][2] is True
+        assert copied[0][8] is None
+
+    def test_copy_applies_model_defaults(self, db_session, insert_with):
+        factories.ContractFactory(id=1)
+        rows = [
+            dict(
+                event_id=f"event-{i}",
+                start_date_time=datetime(2024, 1, 1, tzinfo=timezone.utc),
+                end_date_time=datetime(2024, 1, 1, 2, tzinfo=timezone.utc),
+                event_status="scheduled",
+                control_id=f"control-{i}",
+                control_type="kW % Rated Capacity",
+                control_command=Decimal("1.25"),
+                contract_id=1,
+                # an explicit None also gets the Python-side default
+                max_total_energy=None,
+            )
+            for i in range(COPY_MIN_ROWS)
+        ]
+        insert_with(DerDispatch, rows, copy=True)
+
+        with db_session() as session:
+            dispatches = session.query(DerDispatch).all()
+            assert len(dispatches) == COPY_MIN_ROWS
+            assert {d.max_total_energy for d in dispatches} == {Decimal(0)}
+            assert {d.cumulative_event_duration_mins for d in dispatches} == {0}
+            assert {d.control_command for d in dispatches} == {Decimal("1.25")}
@@ -12,8 +12,10 @@ from pm.modules.event_tracking.controller import CreateDerResponseDict, EventCon
 from pm.modules.event_tracking.models.contract_constraint_summary import (
     ContractConstraintSummary,
 )
+from pm.modules.event_tracking.models.contract_event_rollup import ContractEventRollup
 from pm.modules.event_tracking.models.der_dispatch import DerDispatch
 from pm.modules.event_tracking.models.der_response import DerResponse
+from pm.modules.event_tracking.repository import EventRepository
 from pm.modules.progmgmt.enums import ProgramTimePeriod
 from pm.modules.progmgmt.models.dispatch_opt_out import DispatchOptOut
 from pm.modules.progmgmt.models.program import Constraints, DemandManagementConstraints
@@ -224,6 +226,7 @@ class TestEventController:
 
         with db_session() as session:
             events = []
+            dispatches = []
             now = pendulum.now().subtract(hours=number_of_events)
             for n in range(number_of_events):
                 control_id = f"{uuid4()}"
@@ -242,6 +245,7 @@ class TestEventController:
                 )
 
                 events.append(DerDispatch(**dispatch_data))
+                dispatches.append(dispatch_data)
                 if create_response(n):
                     response_data = CreateDerResponseDict(
                         der_id=f"{uuid4()}",
@@ -255,6 +259,8 @@ class TestEventController:
                 now = now.add(hours=1)
                 session.add_all(events)
                 session.commit()
+            EventRepository(session).add_dispatches_to_rollup(dispatches)
+            session.commit()
             return now
 
     @freeze_time("2023-02-24 23:59:00")
@@ -626,3 +632,73 @@ class TestEventController:
             summary_dict.pop("created_at")
             summary_dict.pop("updated_at")
             assert summary_dict == expected_result
+
+    @freeze_time("2023-02-24 23:59:00")
+    def test_calculate_constraints_multiple_contracts_upserts_summary(self, db_session):
+        now = pendulum.now().utcnow()
+        with mock.patch("pendulum.now", return_value=now):
+            program = factories.ProgramFactory(
+                start_date=pendulum.now().subtract(hours=2000),
+                dispatch_constraints=Constraints.from_dict(
+                    dict(max_number_of_events_per_timeperiod=dict(DAY=10, PROGRAM_DURATION=10))
+                ),
+                dispatch_max_opt_outs=[DispatchOptOut(timeperiod="DAY", value=10)],
+            )
+            self._create_events(db_session, 5, program, 2, contract_id=1, enrollment_request_id=1)
+            day = self._create_events(
+                db_session, 3, program, None, contract_id=2, enrollment_request_id=2
+            )
+            EventController().calculate_contract_constraints(day)
+            # running again on the same day replaces the summaries
+            EventController().calculate_contract_constraints(day)
+            summaries = {
+                s.contract_id: s for s in self._get_all(db_session, ContractConstraintSummary)
+            }
+
+            assert len(summaries) == 2
+            assert summaries[1].max_number_of_events_per_timeperiod_program_duration == 2
+            assert summaries[1].opt_outs_day == 3
+            assert summaries[2].max_number_of_events_per_timeperiod_program_duration == 3
+            assert summaries[2].opt_outs_day == 0
+
+    def test_rollup_updated_on_dispatch_and_opt_out(self, db_session):
+        der = factories.DerFactory(der_id="9101080001")
+        factories.ContractFactory(id=1, der=der)
+        data = [
+            dict(
+                event_id=f"event-{i}",
+                start_date_time=1635489900,
+                end_date_time=1635497100,
+                event_status="scheduled",
+                control_command="1.00",
+                control_type="kW % Rated Capacity",
+                contract_id=1,
+                control_id=f"control-{i}",
+            )
+            for i in range(3)
+        ]
+        EventController().create_der_dispatch(data)
+        [rollup] = self._get_all(db_session, ContractEventRollup)
+        assert rollup.day == date(2021, 10, 29)
+        assert rollup.event_count == 3
+        assert rollup.opt_out_count == 0
+        assert rollup.cumulative_event_duration_mins == 360
+        assert rollup.max_total_energy == Decimal("360")
+
+        responses = [
+            CreateDerResponseDict(
+                der_id="9101080001",
+                der_response_status=4,
+                der_response_time=pendulum.now(tz="UTC"),
+                control_id="control-0",
+                is_opt_out=True,
+            )
+        ]
+        EventController().create_der_response(responses)
+        # a second opt out for the same control is not counted again
+        EventController().create_der_response(responses)
+        [rollup] = self._get_all(db_session, ContractEventRollup)
+        assert rollup.event_count == 2
+        assert rollup.opt_out_count == 1
+        assert rollup.cumulative_event_duration_mins == 240
+        assert rollup.max_total_energy == Decimal("240")
@@ -2,13 +2,16 @@ from pm.modules.outbox.model import Outbox
 
 
 class OutboxTestMixin:
-    def generate_messages(self, db_session, num_messages: int, is_sent=False) -> None:
+    def generate_messages(
+        self, db_session, num_messages: int, is_sent=False, key: str | None = None
+    ) -> None:
         """Generate a number of messages in the outbox."""
         with db_session() as session:
             for _ in range(num_messages):
                 session.add(
                     Outbox(
                         topic="test",
+                        key=key,
                         message={"test": "test"},
                         headers={"test": "test"},
                         is_sent=is_sent,
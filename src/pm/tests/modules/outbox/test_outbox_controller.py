@@ -1,10 +1,36 @@
+from unittest.mock import patch
+
+import pendulum
+import pytest
+from sqlalchemy import update
+
 from pm.modules.outbox.controller import OutboxController
+from pm.modules.outbox.model import Outbox
 from pm.tests.modules.outbox.mixins import OutboxTestMixin
 from shared.tasks.producer import Producer
 
 
+@pytest.fixture
+def kafka_producer():
+    """Kafka producer mock that calls the delivery callback of each message,
+    with an error for the message ids in `failed_ids`."""
+    with patch("shared.tasks.producer.KafkaProducer") as kafka_producer_class:
+        producer = kafka_producer_class.return_value
+        producer.failed_ids = set()
+        delivery_count = iter(range(1, 100000))
+
+        def produce(**kwargs):
+            message_id = next(delivery_count)
+            error = "delivery failed" if message_id in producer.failed_ids else None
+            kwargs["callback"](error, None)
+
+        producer.produce.side_effect = produce
+        Producer._producer = None
+        yield producer
+
+
 class TestOutboxController(OutboxTestMixin):
-    def test_send_message(self, db_session):
+    def test_send_message(self, db_session, kafka_producer):
         """If there are messages in the outbox, they should be sent."""
         message_count = 50
         self.generate_messages(db_session, message_count)
@@ -15,6 +41,49 @@ class TestOutboxController(OutboxTestMixin):
         assert len(messages) == message_count
         assert all(message.is_sent for message in messages)
 
+    def test_send_message_with_key(self, db_session, kafka_producer):
+        """The partition key of the messages is sent, so the messages of a key stay in order."""
+        self.generate_messages(db_session, 2, key="42")
+        OutboxController().send_message()
+        assert [c.kwargs["key"] for c in kafka_producer.produce.call_args_list] == ["42", "42"]
+
+    def test_send_message_flushes_once_per_batch(self, db_session, kafka_producer):
+        message_count = 50
+        self.generate_messages(db_session, message_count)
+        OutboxController().send_message(batch_size=20)
+        assert kafka_producer.produce.call_count == message_count
+        assert kafka_producer.flush.call_count == 3
+        assert all(message.is_sent for message in self.get_all_messages(db_session))
+
+    def test_send_message_only_delivered_marked_sent(self, db_session, kafka_producer):
+        """Messages the broker did not confirm stay unsent, and are sent again next time."""
+        message_count = 10
+        kafka_producer.failed_ids = {3, 7}
+        self.generate_messages(db_session, message_count)
+        OutboxController().send_message()
+
+        messages = self.get_all_messages(db_session)
+        assert sorted(m.id for m in messages if not m.is_sent) == [3, 7]
+
+        OutboxController().send_message()
+        assert kafka_producer.produce.call_count == message_count + 2
+        assert all(message.is_sent for message in self.get_all_messages(db_session))
+
+    def test_send_message_keeps_key_order(self, db_session, kafka_producer):
+        """When a message isn't delivered, the later messages of its key are sent again
+        after it, so the last message sent for a key is the latest one."""
+        kafka_producer.failed_ids = {1}
+        self.generate_messages(db_session, 3, key="42")
+        self.generate_messages(db_session, 1)
+        OutboxController().send_message()
+
+        messages = self.get_all_messages(db_session)
+        assert sorted(m.id for m in messages if not m.is_sent) == [1, 2, 3]
+
+        OutboxController().send_message()
+        assert kafka_producer.produce.call_count == 4 + 3
+        assert all(message.is_sent for message in self.get_all_messages(db_session))
+
     def test_send_message_no_messages(self, db_session):
         """If there are no messages in the outbox, nothing should be sent,
         and no errors should be raised."""
@@ -34,7 +103,7 @@ class TestOutboxController(OutboxTestMixin):
         messages = self.get_all_messages(db_session)
         assert len(messages) == message_count
 
-    def test_send_messages_some_sent_messages(self, db_session):
+    def test_send_messages_some_sent_messages(self, db_session, kafka_producer):
         """Messages that have already been sent should not be sent again."""
         message_count = 50
         self.generate_messages(db_session, message_count, is_sent=True)
@@ -45,3 +114,18 @@ class TestOutboxController(OutboxTestMixin):
         messages = self.get_all_messages(db_session)
         assert len(messages) == message_count * 2
         assert all(message.is_sent for message in messages)
+
+    def test_remove_old_messages(self, db_session):
+        """Old sent messages are removed in batches, unsent messages are kept."""
+        self.generate_messages(db_session, 25, is_sent=True)
+        self.generate_messages(db_session, 5)
+        with db_session() as session:
+            session.execute(update(Outbox).values(created_at=pendulum.now().subtract(days=30)))
+            session.commit()
+
+        removed = OutboxController().remove_old_messages(retention_days=7, batch_size=10)
+
+        assert removed == 25
+        messages = self.get_all_messages(db_session)
+        assert len(messages) == 5
+        assert not any(message.is_sent for message in messages)
@@ -0,0 +1,21 @@
+from sqlalchemy import text
+
+from pm.modules.outbox.listener import OUTBOX_CHANNEL, OutboxListener
+from shared.system import configuration, database
+
+
+class TestOutboxListener:
+    def test_wait_notified(self, db_session):
+        dsn = database.pgdsn_from_config(configuration.get_config())
+        with OutboxListener(dsn) as listener:
+            with db_session() as session:
+                session.execute(text(f"NOTIFY {OUTBOX_CHANNEL}"))
+                session.commit()
+            assert listener.wait(timeout=5) is True
+            # notifications are consumed
+            assert listener.wait(timeout=0.1) is False
+
+    def test_wait_timeout(self, db_session):
+        dsn = database.pgdsn_from_config(configuration.get_config())
+        with OutboxListener(dsn) as listener:
+            assert listener.wait(timeout=0.1) is False
@@ -1,27 +1,136 @@
+import pendulum
+from sqlalchemy import update
+
+from pm.modules.outbox.model import Outbox, OutboxArchive
 from pm.modules.outbox.repository import OutboxRepository
 from pm.tests.modules.outbox.mixins import OutboxTestMixin
 
 
 class TestOutboxRepository(OutboxTestMixin):
-    def test_send_messages_error_after_some_sent(self, db_session):
-        """If an error occurs while sending messages, we need to make sure
-        we save all successfully sent messages."""
+    def test_claim_unsent_limit(self, db_session):
+        """The oldest unsent messages are claimed, up to the limit."""
+        self.generate_messages(db_session, 5, is_sent=True)
+        self.generate_messages(db_session, 20)
+        with db_session() as session:
+            messages = OutboxRepository(session).claim_unsent(10, lease_seconds=60)
+            session.commit()
+            assert [m.id for m in messages] == list(range(6, 16))
+            assert all(m.claimed_until is not None for m in messages)
+
+    def test_claimed_messages_are_skipped(self, db_session):
+        """Messages claimed by another dispatcher are not claimed again."""
+        self.generate_messages(db_session, 20)
+        with db_session() as session:
+            repository = OutboxRepository(session)
+            first = repository.claim_unsent(10, lease_seconds=60)
+            session.commit()
+            second = repository.claim_unsent(10, lease_seconds=60)
+            session.commit()
+            third = repository.claim_unsent(10, lease_seconds=60)
+            session.commit()
+        assert [m.id for m in first] == list(range(1, 11))
+        assert [m.id for m in second] == list(range(11, 21))
+        assert third == []
+
+    def test_expired_claims_are_claimed_again(self, db_session):
+        """Messages of a dispatcher that didn't finish are claimed again after the lease."""
+        self.generate_messages(db_session, 10)
+        with db_session() as session:
+            repository = OutboxRepository(session)
+            repository.claim_unsent(10, lease_seconds=-1)
+            session.commit()
+            messages = repository.claim_unsent(10, lease_seconds=60)
+            session.commit()
+        assert [m.id for m in messages] == list(range(1, 11))
+
+    def test_keys_are_claimed_in_order(self, db_session):
+        """The messages of a key aren't claimed while an earlier one is claimed."""
+        self.generate_messages(db_session, 2, key="a")
+        self.generate_messages(db_session, 2, key="b")
+        self.generate_messages(db_session, 1)
+        with db_session() as session:
+            repository = OutboxRepository(session)
+            first = repository.claim_unsent(1, lease_seconds=60)
+            session.commit()
+            second = repository.claim_unsent(10, lease_seconds=60)
+            session.commit()
+            repository.mark_as_sent([1])
+            session.commit()
+            third = repository.claim_unsent(10, lease_seconds=60)
+            session.commit()
+        assert [m.id for m in first] == [1]
+        assert [m.id for m in second] == [3, 4, 5]
+        assert [m.id for m in third] == [2]
+
+    def test_release(self, db_session):
+        """Released messages can be claimed again straight away."""
+        self.generate_messages(db_session, 10)
+        with db_session() as session:
+            repository = OutboxRepository(session)
+            repository.claim_unsent(10, lease_seconds=60)
+            repository.release([1, 2])
+            session.commit()
+            messages = repository.claim_unsent(10, lease_seconds=60)
+            session.commit()
+        assert [m.id for m in messages] == [1, 2]
+
+    def test_mark_as_sent(self, db_session):
+        """Only the given messages are marked as sent."""
         message_count = 50
         num_to_send = 25
         self.generate_messages(db_session, message_count)
         with db_session() as session:
-            try:
-                for message in OutboxRepository(session).get_unsent():
-                    if message.id > num_to_send:
-                        # if we get to a message with an id > num_to_send, raise an
-                        # error to simulate an error occurring while sending messages
-                        raise Exception()
-            except Exception:
-                pass
-
-            messages = self.get_all_messages(db_session)
-            assert len(messages) == message_count
-            for message in messages:
-                # assert that all messages with an id <= num_to_send have been sent
-                # the rest should not have been sent
-                assert message.is_sent == (message.id <= num_to_send)
+            OutboxRepository(session).mark_as_sent(list(range(1, num_to_send + 1)))
+            session.commit()
+
+        messages = self.get_all_messages(db_session)
+        assert len(messages) == message_count
+        for message in messages:
+            assert message.is_sent == (message.id <= num_to_send)
+            assert message.claimed_until is None
+
+    def _age_messages(self, db_session, days: int):
+        with db_session() as session:
+            session.execute(update(Outbox).values(created_at=pendulum.now().subtract(days=days)))
+            session.commit()
+
+    def test_delete_sent_before(self, db_session):
+        """Only sent messages older than the cutoff are deleted, up to the limit."""
+        self.generate_messages(db_session, 10, is_sent=True)
+        self.generate_messages(db_session, 5)
+        self._age_messages(db_session, days=10)
+        self.generate_messages(db_session, 5, is_sent=True)
+        cutoff = pendulum.now().subtract(days=7)
+        with db_session() as session:
+            repository = OutboxRepository(session)
+            assert repository.delete_sent_before(cutoff, limit=6) == 6
+            assert repository.delete_sent_before(cutoff, limit=6) == 4
+            assert repository.delete_sent_before(cutoff, limit=6) == 0
+            session.commit()
+
+        messages = self.get_all_messages(db_session)
+        assert sorted(m.id for m in messages) == list(range(11, 21))
+
+    def test_delete_sent_before_archive(self, db_session):
+        """Archived messages are moved to the archive table."""
+        self.generate_messages(db_session, 3, is_sent=True)
+        self._age_messages(db_session, days=10)
+        cutoff = pendulum.now().subtract(days=7)
+        with db_session() as session:
+            assert OutboxRepository(session).delete_sent_before(cutoff, 10, archive=True) == 3
+            session.commit()
+            archived = session.query(OutboxArchive).order_by(OutboxArchive.id).all()
+
+        assert self.get_all_messages(db_session) == []
+        assert [m.id for m in archived] == [1, 2, 3]
+        assert archived[0].message == {"test": "test"}
+
+    def test_get_stats(self, db_session):
+        self.generate_messages(db_session, 3, is_sent=True)
+        self.generate_messages(db_session, 2)
+        self._age_messages(db_session, days=1)
+        with db_session() as session:
+            stats = OutboxRepository(session).get_stats()
+        assert stats.unsent_count == 2
+        assert stats.oldest_unsent_age_seconds >= 24 * 60 * 60
+        assert stats.table_size_bytes > 0
@@ -205,6 +205,25 @@ class TestServiceProviderController(TestDataMixin):
         ders = self._get_all_ders(db_session)
         assert len(ders) == 1
 
+    def test_associate_ders_outcomes(self, db_session, service_provider):
+        factories.DerFactory(der_id="free_der", service_provider_id=None, is_deleted=False)
+        ders_list = [
+            {"der_id": "free_der"},
+            {"der_id": "free_der"},
+            {"der_rdf_id": "free_der"},
+            {"der_id": "missing_der"},
+        ]
+        outcomes = ServiceProviderController().associate_ders(service_provider.id, ders_list)
+        assert [(o["der_id"], o["status_code"]) for o in outcomes] == [
+            ("free_der", 3),
+            ("free_der", 1),
+            ("", 2),
+            ("missing_der", 4),
+        ]
+        assert outcomes[0]["outcome"] == (
+            f"Associated to service provider with id {service_provider.id}"
+        )
+
     def test_associate_ders_failing_inactive(self, db_session, service_provider):
         der_uuid = f"{uuid4()}"
 
@@ -105,15 +105,24 @@ class TestServiceProviderRepository:
             got = ServiceProviderRepository(session).get_service_provider(service_provider.id)
         assert got is not None
 
-    def test_update_der(self, db_session, service_provider):
-        der1 = factories.DerFactory(
-            der_id="der1_id", service_provider_id=service_provider.id, is_deleted=False
-        )
-        der2 = factories.DerFactory(der_id="der2_id", service_provider_id=None, is_deleted=False)
+    def test_associate_ders(self, db_session, service_provider):
+        other = factories.ServiceProviderFactory()
+        factories.DerFactory(der_id="free_der", service_provider_id=None, is_deleted=False)
+        factories.DerFactory(der_id="taken_der", service_provider_id=other.id, is_deleted=False)
+        factories.DerFactory(der_id="deleted_der", service_provider_id=None, is_deleted=True)
+        # the commit expires the factory instances, so read their ids before it
+        service_provider_id = service_provider.id
+        other_id = other.id
         with db_session() as session:
-            with pytest.raises(ServiceProviderDerAssociationNotFound):
-                ServiceProviderRepository(session).update_der(service_provider.id, der2.der_id)
-                ServiceProviderRepository(session).update_der(service_provider.id, der1.der_id)
+            associated = ServiceProviderRepository(session).associate_ders(
+                service_provider_id, ["free_der", "taken_der", "deleted_der", "missing_der"]
+            )
+            session.commit()
+        assert associated == {"free_der"}
+        ders = {der.der_id: der for der in self._get_all_ders(db_session)}
+        assert ders["free_der"].service_provider_id == service_provider_id
+        assert ders["taken_der"].service_provider_id == other_id
+        assert ders["deleted_der"].service_provider_id is None
 
     def test_get_der_with_uuid(self, db_session, service_provider):
         der1 = factories.DerFactory(
@@ -153,18 +162,3 @@ class TestServiceProviderRepository:
         with db_session() as session:
             got = ServiceProviderRepository(session).get_ders_service_provider(service_provider.id)
         assert len(got) == 1
-
-    def test_get_der_without_serviceprovider(self, db_session):
-        der_id = f"{uuid4()}"
-        factories.DerFactory(
-            der_id=der_id,
-            name="test",
-            nameplate_rating=100,
-            nameplate_rating_unit=LimitUnitType.kW,
-            der_type=DerAssetType.PV,
-            resource_category=DerResourceCategory.GENERIC,
-            is_deleted=False,
-        )
-        with db_session() as session:
-            got = ServiceProviderRepository(session).get_der_without_serviceprovider(der_id)
-        assert got is not None
@@ -2,7 +2,9 @@
 # flake8: noqa
 # type: ignore
 
+import csv
 import io
+import threading
 from dataclasses import dataclass
 from io import StringIO
 from pathlib import Path
@@ -14,9 +16,15 @@ import pytest
 from faker import Faker
 from marshmallow import ValidationError
 from minio import Minio
+from minio.error import S3Error
 from minio.helpers import ObjectWriteResult
 
-from pm.bucket_watcher import MinioManager, send_batches_to_kafka
+from pm.bucket_watcher import (
+    BatchProgressTracker,
+    MinioManager,
+    process_files_concurrently,
+    send_batches_to_kafka,
+)
 from pm.data_transfer_objects.csv_upload_kafka_messages import (
     EnrollmentRequestMessage,
     ServiceProviderDERAssociateMessage,
@@ -239,6 +247,15 @@ class TestMinioManager:
             mock_minio.assert_called_once()
             assert result.read() == "test_file_data"
 
+    def test_get_text_stream(self, miniomanager_client, generate_test_label):
+        response = io.BytesIO("\ufeffname,city\nJosé,Zürich\n".encode("utf-8"))
+        with patch.object(Minio, "get_object", return_value=response) as mock_minio:
+            with miniomanager_client.get_text_stream(file_name=generate_test_label) as result:
+                rows = list(csv.DictReader(result))
+            mock_minio.assert_called_once()
+            assert rows == [{"name": "José", "city": "Zürich"}]
+            assert response.closed
+
     def test_put_filehandle(self, miniomanager_client, generate_test_label):
         with patch.object(Minio, "put_object") as mock_minio:
             file_data = io.BytesIO(b"test")
@@ -504,6 +521,108 @@ class TestNotifications:
     #     assert mock_notification.call_args_list[0][0][0] == "error"
     #     assert mock_notification.call_args_list[1][0][0] == "progress"
 
+    def test_send_batches_to_kafka_resume(self):
+        """Batches before start_batch are skipped, and each batch sent is checkpointed."""
+        checkpoints = []
+        with mock.patch.object(FakeMessage, "_send_notification") as mock_notification:
+            processed = send_batches_to_kafka(
+                message_class=FakeMessage,
+                row_generator=[{"program_id": i} for i in range(120)],
+                tags={"user_id": "test_user_id"},
+                start_batch=1,
+                on_batch_done=checkpoints.append,
+                checkpoint_interval_seconds=0,
+            )
+            assert processed
+        assert checkpoints == [1, 2]
+        assert [c.kwargs["batch_number"] for c in mock_notification.call_args_list] == [1, 2]
+
+    def test_send_batches_to_kafka_decoding_error(self):
+        """A file that can't be decoded part way through is processed unsuccessfully, so it is
+        tagged as failed and moved, instead of being retried forever."""
+
+        def rows():
+            yield from ({"program_id": i} for i in range(60))
+            raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+
+        def send_batch_to_kafka(batch, on_delivery):
+            on_delivery(None, None)
+
+        with mock.patch.object(
+            FakeMessage, "send_batch_to_kafka", side_effect=send_batch_to_kafka
+        ), mock.patch.object(FakeMessage, "_send_notification"), mock.patch.object(
+            FakeMessage, "poll_kafka"
+        ), mock.patch.object(
+            FakeMessage, "flush_kafka"
+        ) as flush_kafka:
+            processed = send_batches_to_kafka(
+                message_class=FakeMessage,
+                row_generator=rows(),
+                tags={"user_id": "test_user_id"},
+            )
+        assert not processed
+        assert flush_kafka.called
+
+    def test_batch_progress_tracker(self):
+        """Progress is notified as batches are confirmed, and the checkpoint only moves past
+        batches once all earlier batches are done."""
+        checkpoints = []
+        tracker = BatchProgressTracker(
+            FakeMessage, {}, on_batch_done=checkpoints.append, checkpoint_interval_seconds=0
+        )
+        with mock.patch.object(FakeMessage, "_send_notification") as mock_notification:
+            tracker.delivery_callback(1)(None, None)
+            assert checkpoints == []
+            tracker.delivery_callback(0)(None, None)
+            assert checkpoints == [1]
+            tracker.delivery_callback(2)("delivery failed", None)
+            assert checkpoints == [1, 2]
+        assert [c.kwargs["batch_number"] for c in mock_notification.call_args_list] == [1, 0]
+        assert not tracker.success
+
+    def test_batch_progress_tracker_throttles_checkpoints(self):
+        """A checkpoint error is logged and doesn't fail the callback, which may run on the
+        thread of another file."""
+        on_batch_done = Mock(side_effect=[S3Error("code", "msg", "", "", "", None), None])
+        tracker = BatchProgressTracker(
+            FakeMessage, {}, on_batch_done=on_batch_done, checkpoint_interval_seconds=60
+        )
+        tracker.batch_failed(0)
+        tracker.batch_failed(1)  # too soon after the previous checkpoint
+        assert [c.args for c in on_batch_done.call_args_list] == [(0,)]
+
+    def test_batch_progress_tracker_waits_for_deliveries(self):
+        """Delivery callbacks run by another thread are waited for."""
+        tracker = BatchProgressTracker(FakeMessage, {})
+        on_delivery = tracker.delivery_callback(0)
+        threading.Timer(0.05, on_delivery, args=("delivery failed", None)).start()
+        with mock.patch.object(FakeMessage, "poll_kafka"):
+            tracker.wait_for_deliveries()
+        assert not tracker.success
+
+    def test_process_files_concurrently(self):
+        lock = threading.Lock()
+        running = []
+        max_running = []
+        processed = []
+
+        def process_file(file_name):
+            with lock:
+                running.append(file_name)
+                max_running.append(len(running))
+            sleep(0.01)
+            with lock:
+                running.remove(file_name)
+                processed.append(file_name)
+            if file_name == "bad.csv":
+                raise ValidationError("bad file")
+
+        file_names = ["bad.csv"] + [f"file{i}.csv" for i in range(10)]
+        with patch("pm.bucket_watcher.process_file", side_effect=process_file):
+            process_files_concurrently(file_names, max_workers=3)
+        assert sorted(processed) == sorted(file_names)
+        assert max(max_running) <= 3
+
     def test_notification_content(self):
         with mock.patch.object(Notification, "send_to_kafka") as mock_notification_send:
             processed = send_batches_to_kafka(
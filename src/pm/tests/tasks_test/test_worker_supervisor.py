@@ -0,0 +1,49 @@
+import sys
+from unittest import mock
+
+import pytest
+
+from pm.worker_supervisor import WorkerSpec, WorkerSupervisor, parse_worker_plan
+
+
+def test_parse_worker_plan():
+    got = parse_worker_plan("der-control=batch:4, *=SINGLE:1,")
+    assert got == [WorkerSpec("der-control", "batch", 4), WorkerSpec(None, "single", 1)]
+
+
+@pytest.mark.parametrize("plan", ["der-control=batch", "der-control=stream:1", "*=batch:x"])
+def test_parse_worker_plan_invalid(plan):
+    with pytest.raises(ValueError):
+        parse_worker_plan(plan)
+
+
+def test_get_command():
+    command = WorkerSupervisor.get_command(WorkerSpec("der-control", "batch", 2))
+    assert command[1:] == [
+        "-m",
+        "pm.worker",
+        "--consumer-type",
+        "batch",
+        "--include-topics",
+        "der-control",
+    ]
+    assert "--include-topics" not in WorkerSupervisor.get_command(WorkerSpec(None, "single", 1))
+
+
+def test_restarts_crashed_workers_and_stops():
+    supervisor = WorkerSupervisor(
+        [WorkerSpec(None, "single", 2)], restart_delay_seconds=0, stop_timeout_seconds=5
+    )
+    crash = [sys.executable, "-c", "import sys; sys.exit(1)"]
+    sleep = [sys.executable, "-c", "import time; time.sleep(60)"]
+    with mock.patch.object(WorkerSupervisor, "get_command", side_effect=[crash, sleep, sleep]):
+        for worker in supervisor.workers:
+            supervisor.start_worker(worker)
+        supervisor.workers[0].process.wait()
+        supervisor.check_workers()  # schedules the restart of the crashed worker
+        supervisor.check_workers()  # restarts it
+        assert supervisor.workers[0].restarts == 1
+        assert supervisor.workers[1].restarts == 0
+        assert all(w.process.poll() is None for w in supervisor.workers)
+        supervisor.stop()
+    assert all(w.process.poll() is not None for w in supervisor.workers)
@@ -1,13 +1,17 @@
+import json
+from unittest.mock import Mock
+
 import pendulum
 import pytest as pytest
+from confluent_kafka import Message
 from sqlalchemy import select
 
 from pm.consumers.der_warehouse import handlers
 from pm.modules.derinfo.models.der_info import DerInfo
-from pm.modules.derinfo.repository import DerUpdate
 from pm.modules.enrollment.enums import ContractStatus
 from pm.modules.enrollment.models.enrollment import Contract
 from pm.tests import factories
+from shared.tasks.consumer import ConsumerMessage
 
 
 @pytest.fixture
@@ -26,7 +30,8 @@ def der_deleted_data():
         "created_at": str(pendulum.now()),
         "updated_at": str(pendulum.now()),
     }
-    return DerUpdate.from_dict(data)
+    message = Mock(spec=Message, value=lambda: json.dumps(data).encode(), headers=lambda: None)
+    return [ConsumerMessage(message)]
 
 
 class TestPM438:
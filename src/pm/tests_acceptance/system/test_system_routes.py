@@ -3,3 +3,12 @@ class TestHealthCheck:
         resp = client.get("/api/system/health-check")
         assert resp.status_code == 200
         assert resp.json["message"] == "online"
+
+
+class TestOutboxStats:
+    def test_outbox_stats(self, client):
+        resp = client.get("/api/system/outbox")
+        assert resp.status_code == 200
+        assert resp.json["unsent_count"] >= 0
+        assert "table_size_bytes" in resp.json
+        assert "oldest_unsent_age_seconds" in resp.json
@@ -1,4 +1,4 @@
-from dataclasses import asdict, dataclass, field
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional
 
@@ -17,8 +17,8 @@ from pm.modules.enrollment.models.enrollment import (
     DynamicOperatingEnvelopesDict,
 )
 from pm.modules.outbox.model import Outbox
+from shared.tasks import codec
 from shared.tasks.producer import MessageData, SendToKafkaMessage
-from shared.utils import convert_datetimes_and_enums_to_string
 from shared.validators.der_gateway_data import DerGatewayProgram
 
 
@@ -35,8 +35,9 @@ class OutboxMessage(MessageData):
         message.headers = headers or {}
         outbox = Outbox(
             topic=message.TOPIC,
-            headers=convert_datetimes_and_enums_to_string(message.headers),
-            message=convert_datetimes_and_enums_to_string(asdict(message)),
+            key=message.get_key(),
+            headers=codec.to_primitive(message.headers),
+            message=codec.to_primitive(message),
         )
         session.add(outbox)
 
@@ -56,6 +57,9 @@ class EnrollmentMessage(OutboxMessage, DataClassJsonMixin):
     demand_response: Optional[DemandResponseDict] = None
     rejection_reason: Optional[EnrollmentRejectionReason] = None
 
+    def get_key(self) -> Optional[str]:
+        return str(self.id)
+
 
 @dataclass
 class ContractMessage(OutboxMessage, DataClassJsonMixin):
@@ -86,11 +90,18 @@ class ContractMessage(OutboxMessage, DataClassJsonMixin):
     dynamic_operating_envelopes: Optional[DynamicOperatingEnvelopesDict] = None
     demand_response: Optional[DemandResponseDict] = None
 
+    def get_key(self) -> Optional[str]:
+        return str(self.id)
+
 
 @dataclass
 class DerGatewayProgramMessage(SendToKafkaMessage, DerGatewayProgram, DataClassJsonMixin):
     TOPIC = "der-gateway-program"
     headers = {"operation": "create"}
 
+    def get_key(self) -> Optional[str]:
+        # the relay sends the operations on a program in order, and coalesces them
+        return str(self.program.id)
+
 
 DOCUMENTED_TOPICS = [EnrollmentMessage, ContractMessage, DerGatewayProgramMessage]
@@ -60,6 +60,7 @@ MAX_BULK_MESSAGES = 1000
 # Consumer type env variable constants
 INCLUDE_TOPICS = "INCLUDE_TOPICS"
 CONSUMER_TYPE = "CONSUMER_TYPE"
+PARTITION_WORKERS = "PARTITION_WORKERS"
 
 
 def split_and_strip(s: str) -> list[str]:
@@ -71,11 +72,15 @@ def parse_arguments() -> dict:
     The following command line arguments are available:
     --include-topics: A comma separated list of topics to include.
     --bulk-ingest: A boolean flag to enable bulk ingestion.
+    --partition-workers: Number of threads used by the batch consumer to process
+    partitions in parallel.
 
     The following environment variables are available:
     INCLUDE_TOPICS: A comma separated list of topics to include.
     CONSUMER_TYPE: A string to set the worker type. Options are "batch" or "single".
     Will default to "single".
+    PARTITION_WORKERS: Number of partition worker threads for the batch consumer.
+    Will default to 1 (serial processing).
     """
     parser = argparse.ArgumentParser(description="PM Worker")
     parser.add_argument(
@@ -89,22 +94,30 @@ def parse_arguments() -> dict:
         default=SINGLE_CONSUMER,
         help="The consumer type. Default is 'single'.",
     )
+    parser.add_argument(
+        "--partition-workers",
+        type=int,
+        default=1,
+        help="Number of threads processing partitions in parallel (batch only). Default is 1.",
+    )
     args = parser.parse_args()
     parser
     include_topics = os.getenv(INCLUDE_TOPICS, args.include_topics)
     consumer_type = os.getenv(CONSUMER_TYPE, args.consumer_type)
+    partition_workers = int(os.getenv(PARTITION_WORKERS, args.partition_workers))
     if include_topics:
         include_topics = split_and_strip(include_topics)
     return {
         "include_topics": include_topics,
         "consumer_type": consumer_type,
+        "partition_workers": partition_workers,
     }
 
 
 if __name__ == "__main__":
     if config.DEV_MODE:
         # create topics if they don't exist, dev mode only
-        create_kafka_topics(config.KAFKA_URL)
+        create_kafka_topics(config.KAFKA_URL, num_partitions=config.KAFKA_TOPIC_PARTITIONS)
 
     settings = parse_arguments()
     consumer: Consumer
@@ -115,6 +128,7 @@ if __name__ == "__main__":
             url=config.KAFKA_URL,
             include_topics=settings["include_topics"],
             max_bulk_messages=MAX_BULK_MESSAGES,
+            max_partition_workers=settings["partition_workers"],
         )
     elif settings["consumer_type"] == SINGLE_CONSUMER:
         consumer = SingleMessageConsumer.factory(
@@ -0,0 +1,170 @@
+"""Runs several pm.worker consumer processes in the same consumer group.
+
+The processes are described by the WORKER_PLAN setting, a comma separated list of
+`topic=consumer_type:processes` entries, where `*` stands for all the registered topics of
+the consumer type. e.g. "der-control=batch:4,*=batch:1,*=single:1"
+
+Crashed workers are restarted after WORKER_RESTART_DELAY_SECONDS. On SIGTERM or SIGINT the
+workers are asked to stop with SIGTERM, and killed if they are still running after
+WORKER_STOP_TIMEOUT_SECONDS.
+"""
+import os
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from pm.config import PMConfig
+from shared.system import configuration, loggingsys
+
+# load env variables
+load_dotenv()
+config = configuration.init_config(PMConfig)
+
+# setup logging
+loggingsys.init(config=config)
+
+logger = loggingsys.get_logger(name=__name__)
+
+ALL_TOPICS = "*"
+CONSUMER_TYPES = ("batch", "single")
+CHECK_INTERVAL_SECONDS = 1.0
+# the worker reads these before its command line arguments
+WORKER_ENV_OVERRIDES = ("INCLUDE_TOPICS", "CONSUMER_TYPE")
+
+
+@dataclass
+class WorkerSpec:
+    topic: Optional[str]  # None for all the registered topics of the consumer type
+    consumer_type: str
+    processes: int
+
+
+def parse_worker_plan(plan: str) -> list[WorkerSpec]:
+    """Parse `topic=consumer_type:processes` entries separated by commas.
+    parse_worker_plan("der-control=batch:4,*=single:1")
+    >>> [WorkerSpec("der-control", "batch", 4), WorkerSpec(None, "single", 1)]
+    """
+    specs = []
+    for entry in filter(None, (e.strip() for e in plan.split(","))):
+        try:
+            topic, setting = entry.split("=")
+            consumer_type, processes = setting.split(":")
+            spec = WorkerSpec(
+                topic=None if topic.strip() == ALL_TOPICS else topic.strip(),
+                consumer_type=consumer_type.strip().lower(),
+                processes=int(processes),
+            )
+        except ValueError:
+            raise ValueError(
+                f"Invalid worker plan entry '{entry}'. Expected 'topic=consumer_type:processes'"
+            )
+        if spec.consumer_type not in CONSUMER_TYPES:
+            raise ValueError(
+                f"Invalid consumer type '{spec.consumer_type}' in worker plan entry '{entry}'. "
+                f"Must be one of {CONSUMER_TYPES}"
+            )
+        specs.append(spec)
+    return specs
+
+
+@dataclass
+class WorkerProcess:
+    spec: WorkerSpec
+    process: Optional[subprocess.Popen] = None
+    restart_at: float = 0
+    restarts: int = 0
+
+
+class WorkerSupervisor:
+    """Starts a process for each worker of the plan, and restarts the ones that exit."""
+
+    def __init__(
+        self,
+        plan: list[WorkerSpec],
+        restart_delay_seconds: float = 5,
+        stop_timeout_seconds: float = 30,
+    ):
+        self.workers = [WorkerProcess(spec) for spec in plan for _ in range(spec.processes)]
+        self.restart_delay_seconds = restart_delay_seconds
+        self.stop_timeout_seconds = stop_timeout_seconds
+        self.stopping = False
+
+    @staticmethod
+    def get_command(spec: WorkerSpec) -> list[str]:
+        command = [sys.executable, "-m", "pm.worker", "--consumer-type", spec.consumer_type]
+        if spec.topic:
+            command += ["--include-topics", spec.topic]
+        return command
+
+    def start_worker(self, worker: WorkerProcess):
+        env = {k: v for k, v in os.environ.items() if k not in WORKER_ENV_OVERRIDES}
+        worker.process = subprocess.Popen(self.get_command(worker.spec), env=env)
+        logger.info(
+            f"Started {worker.spec.consumer_type} worker for "
+            f"{worker.spec.topic or 'all topics'} (pid {worker.process.pid})"
+        )
+
+    def check_workers(self):
+        """Schedule the restart of the workers that exited, and restart the ones that are due."""
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.process is None:
+                if now >= worker.restart_at:
+                    worker.restarts += 1
+                    self.start_worker(worker)
+                continue
+            exit_code = worker.process.poll()
+            if exit_code is None:
+                continue
+            logger.error(
+                f"Worker {worker.process.pid} for {worker.spec.topic or 'all topics'} exited "
+                f"with code {exit_code}, restarting in {self.restart_delay_seconds} seconds"
+            )
+            worker.process = None
+            worker.restart_at = now + self.restart_delay_seconds
+
+    def request_stop(self, signum, frame):
+        logger.info(f"Received signal {signum}, stopping the workers...")
+        self.stopping = True
+
+    def stop(self):
+        """Ask the workers to stop, and kill the ones still running after the timeout."""
+        running = [w.process for w in self.workers if w.process and w.process.poll() is None]
+        for process in running:
+            process.terminate()
+        deadline = time.monotonic() + self.stop_timeout_seconds
+        for process in running:
+            try:
+                process.wait(timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                logger.warning(f"Worker {process.pid} did not stop in time, killing it")
+                process.kill()
+                process.wait()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        for worker in self.workers:
+            self.start_worker(worker)
+        try:
+            while not self.stopping:
+                time.sleep(CHECK_INTERVAL_SECONDS)
+                self.check_workers()
+        finally:
+            self.stop()
+        logger.info("All workers stopped")
+
+
+if __name__ == "__main__":
+    plan = parse_worker_plan(config.WORKER_PLAN)
+    logger.info(f"Starting worker supervisor with plan: {config.WORKER_PLAN}")
+    WorkerSupervisor(
+        plan,
+        restart_delay_seconds=config.WORKER_RESTART_DELAY_SECONDS,
+        stop_timeout_seconds=config.WORKER_STOP_TIMEOUT_SECONDS,
+    ).run()
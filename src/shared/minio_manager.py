@@ -31,6 +31,9 @@ from shared.tools.utils import (
 
 DEFAULT_BATCH_MESSAGE_SIZE = 50
 
+# size of the chunks read from the minio response stream when decoding a text file
+STREAM_CHUNK_SIZE = 64 * 1024
+
 FILE_TYPE_TAG = "FILE_TYPE"
 
 logger = logging.getLogger(__name__)
@@ -140,9 +143,10 @@ class Message:
         )
 
     @classmethod
-    def send_batch_to_kafka(cls, list_of_messages):
+    def send_batch_to_kafka(cls, list_of_messages, on_delivery=None):
         """Send a batch of messages to kafka
         :param list_of_messages: list[Message]
+        :param on_delivery: optional delivery report callback for the batch, (error, message)
         Note we use the first item's Meta for the message headers and topic
         """
         json_data: str = cls.schema().dumps(list_of_messages, many=True)  # type: ignore
@@ -151,8 +155,13 @@ class Message:
             json_str=json_data,
             topic=last_message.Meta.topic,
             headers=last_message.headers,
+            on_delivery=on_delivery,
         )
 
+    @classmethod
+    def poll_kafka(cls):
+        Producer.poll()
+
     @classmethod
     def flush_kafka(cls):
         Producer.flush()
@@ -285,8 +294,11 @@ class FakeMessage(Message, DataClassJsonMixin):
     def process_message(self):
         print("process_message")
 
-    def send_batch_to_kafka(self):
+    @classmethod
+    def send_batch_to_kafka(cls, list_of_messages, on_delivery=None):
         print("162: send_batch_to_kafka: FakeMessage")
+        if on_delivery:
+            on_delivery(None, None)
 
 
 @dataclass
@@ -374,6 +386,24 @@ class MinioManager:
         response = self.client.get_object(self.bucket_name, file_name)
         return io.StringIO(response.data.decode("UTF-8-sig"))
 
+    def get_text_stream(self, file_name: str, encoding: str = "UTF-8-sig") -> io.TextIOWrapper:
+        """Open a file as a text stream that is decoded incrementally as it is read.
+
+        Unlike get_string_io the file is never held in memory in full: the minio response
+        is read in STREAM_CHUNK_SIZE chunks, so a csv.DictReader on top of it runs in
+        constant memory. The default encoding strips a leading UTF-8 BOM.
+        Closing the stream closes the connection to minio.
+        """
+        response = self.client.get_object(self.bucket_name, file_name)
+        reader = io.BufferedReader(  # type: ignore[arg-type, type-var]
+            response, buffer_size=STREAM_CHUNK_SIZE
+        )
+        return io.TextIOWrapper(
+            reader,
+            encoding=encoding,
+            newline="",
+        )
+
     def get_byte_io(self, file_name: str) -> BytesIO:
         response = self.client.get_object(self.bucket_name, file_name)
         return io.BytesIO(response.data)
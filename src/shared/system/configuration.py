@@ -3,9 +3,10 @@ from __future__ import annotations
 import os
 import sys
 from dataclasses import dataclass, fields
-from typing import Optional, Type
+from typing import Optional, Type, TypeVar
 
 CONFIG: Optional[Config] = None
+ConfigT = TypeVar("ConfigT", bound="Config")
 
 
 class ConfigNotInitialized(Exception):
@@ -14,7 +15,7 @@ class ConfigNotInitialized(Exception):
 
 @dataclass
 class Config:
-    DEV_MODE: bool = True
+    DEV_MODE: bool = False
     OFFLINE_MODE: bool = False
 
     DER_WAREHOUSE_URL: str = ""
@@ -43,13 +44,14 @@ class Config:
     MAX_HOL_CAL_FILE_SIZE: int = 10000
 
     @classmethod
-    def from_env(cls) -> Config:
+    def from_env(cls: Type[ConfigT]) -> ConfigT:
         envs_defined: dict = {}
-        for f in fields(Config):
+        for f in fields(cls):
             val = None
             match f.type:
                 case "bool":
-                    val = env_flag(f.name)
+                    # an unset variable keeps the default of the field
+                    val = env_flag(f.name, f.default if isinstance(f.default, bool) else False)
                 case "int":
                     val = os.environ.get(f.name)
                     val = int(val) if val else None
@@ -71,7 +73,7 @@ def get_config() -> Config:
     return CONFIG
 
 
-def init_config(MyConfig: Type[Config]) -> Config:
+def init_config(MyConfig: Type[ConfigT]) -> ConfigT:
     global CONFIG
     CONFIG = MyConfig.from_env()
     return CONFIG
@@ -0,0 +1,58 @@
+"""JSON codec for Kafka payloads and outbox messages.
+
+Uses orjson, which serializes dataclasses, enums and datetimes natively, and falls back to
+the standard library json if it isn't installed. Both produce the same JSON:
+    - dataclasses are serialized as objects, without copying them with asdict
+    - enums are serialized as their value
+    - datetimes, dates and times are serialized in ISO 8601 format
+    - Decimals (and any other unknown type) are serialized as strings
+    - strings are encoded in UTF-8, without escaping non-ASCII characters
+"""
+import dataclasses
+import enum
+import json
+from datetime import date, datetime, time
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None  # type: ignore
+
+
+def default(obj: Any) -> Any:
+    """Serialize the types that the JSON library does not handle natively."""
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        # shallow, unlike asdict: nested values are passed back to the encoder
+        return {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)}
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    return str(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize obj to UTF-8 encoded JSON, ready to be sent to Kafka."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+    data = json.dumps(obj, default=default, separators=(",", ":"), ensure_ascii=False)
+    return data.encode("utf-8")
+
+
+def dumps_str(obj: Any) -> str:
+    """Serialize obj to a JSON string."""
+    return dumps(obj).decode("utf-8")
+
+
+def loads(data: bytes | str) -> Any:
+    """Deserialize a JSON document, bytes are expected to be UTF-8 encoded."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def to_primitive(obj: Any) -> Any:
+    """Convert obj to JSON compatible dicts, lists and scalars.
+    e.g. a dataclass with datetime and enum fields, before storing it in a JSONB column."""
+    return loads(dumps(obj))
@@ -1,60 +1,360 @@
 from __future__ import annotations
 
 import abc
-import json
+import signal
+import threading
+import time
 from collections import defaultdict
-from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Optional, Tuple
 
 from confluent_kafka import Consumer as KafkaConsumer
-from confluent_kafka import Message
-from confluent_kafka.admin import AdminClient, NewTopic
+from confluent_kafka import KafkaError, KafkaException, Message, TopicPartition
+from confluent_kafka.admin import AdminClient, NewPartitions, NewTopic
+from marshmallow import Schema, ValidationError
 
 from shared.minio_manager import Message as KafkaCustomMessage
 from shared.system import loggingsys
+from shared.tasks import codec
+from shared.tasks.dead_letter import get_dead_letter_topic, send_to_dead_letter_topic
 from shared.tasks.decorators import (
+    DEFAULT_RETRY_POLICY,
     ConsumerType,
     RegisterTopic,
+    RegisterTopicHandlerDecorator,
     registered_topic_handlers,
 )
+from shared.tasks.offsets import (
+    COMMIT_EVERY_MESSAGES,
+    COMMIT_INTERVAL_SECONDS,
+    CommitMetricsHook,
+    OffsetCommitter,
+    log_commit_metrics,
+)
+from shared.tasks.producer import Producer
 
 # Timing constants
 ONE_SECOND = 1.0
 KAFKA_POLL_INTERVAL = ONE_SECOND
 
+DEFAULT_TOPIC_PARTITIONS = 6
+
 
 logger = loggingsys.get_logger(name=__name__)
 
-# TODO allow some Kafka topics to be processed in parallel
-# TODO allow retries on error with backoff
+# runs the handler on a list of Kafka messages
+RunHandler = Callable[[RegisterTopicHandlerDecorator, list[Message]], None]
+# the handlers that failed on each partition, with their error
+HandlerFailures = dict[int, list[tuple[RegisterTopicHandlerDecorator, Exception]]]
 
 
-def create_kafka_topics(kafka_url: str):
-    """Create Kafka topics if they don't exist."""
+def create_kafka_topics(kafka_url: str, num_partitions: int = DEFAULT_TOPIC_PARTITIONS):
+    """Create Kafka topics, and their dead letter topics, if they don't exist.
+    Existing topics with fewer partitions are given more partitions, since a topic can't be
+    consumed by more consumers than it has partitions.
+
+    Messages are only consumed in order within a partition: the messages whose order matters
+    must be sent with a partition key (see MessageData.get_key). Adding partitions changes the
+    partition of existing keys, so the messages sent just before and after may be reordered.
+    """
     admin_client = AdminClient({"bootstrap.servers": kafka_url})
     logger.info("Creating topics...")
-    topic_list = [NewTopic(t, num_partitions=1) for t in registered_topic_handlers.keys()]
+    topic_list = [
+        NewTopic(name, num_partitions=num_partitions)
+        for t in registered_topic_handlers.keys()
+        for name in (t, get_dead_letter_topic(t))
+    ]
     fs = admin_client.create_topics(topic_list)
 
+    existing = []
     for topic, f in fs.items():
         try:
             f.result()  # The result itself is None
             logger.info(f"Topic {topic} created")
+        except KafkaException as e:
+            if e.args[0].code() == KafkaError.TOPIC_ALREADY_EXISTS:
+                existing.append(topic)
+            else:
+                logger.info(f"Failed to create topic {topic}: {e}")
+    if existing:
+        add_topic_partitions(admin_client, existing, num_partitions)
+
+
+def add_topic_partitions(admin_client: AdminClient, topics: list[str], num_partitions: int):
+    """Increase the partitions of the topics that have fewer than num_partitions."""
+    metadata = admin_client.list_topics(timeout=10)
+    new_partitions = [
+        NewPartitions(topic, num_partitions)
+        for topic in topics
+        if topic in metadata.topics and len(metadata.topics[topic].partitions) < num_partitions
+    ]
+    if not new_partitions:
+        return
+    for topic, f in admin_client.create_partitions(new_partitions).items():
+        try:
+            f.result()
+            logger.info(f"Topic {topic} now has {num_partitions} partitions")
         except Exception as e:
-            logger.info(f"Failed to create topic {topic}: {e}")
+            logger.info(f"Failed to add partitions to topic {topic}: {e}")
+
+
+@dataclass
+class PendingRetry:
+    """A partition paused and rewound after some of its handlers failed.
+    Only the failed handlers are run again on the messages up to last_offset."""
+
+    attempt: int
+    resume_at: float
+    last_offset: int
+    handlers: list[RegisterTopicHandlerDecorator]
+    paused: bool = True
 
 
 class Consumer(abc.ABC):
-    def __init__(self, consumer: KafkaConsumer, topics: RegisterTopic):
+    """Base class for the consumers.
+
+    A handler that raises is retried according to its retry policy. The partitions of the
+    failed messages are paused and rewound to the first failed message, and resumed once the
+    backoff is over, so the other partitions keep being consumed in the meantime. Once the
+    retries are exhausted, the messages are sent to the `<topic>.dlq` dead letter topic.
+
+    Auto commit is disabled. Offsets are stored once their messages are processed or sent to
+    the dead letter topic, so messages waiting for a retry are not committed, and the stored
+    offsets are committed every commit_every messages or commit_interval_seconds. on_commit
+    is called after each commit with its CommitMetrics (latency, messages, partitions).
+
+    Shutdown is cooperative: on SIGTERM or SIGINT (or stop()) the consumer stops polling,
+    finishes the current batch, commits its offsets and closes, leaving the group right away.
+    Before partitions are revoked in a rebalance, the offsets processed so far are committed,
+    so the new owner of the partitions does not process them again. on_partitions_assigned is
+    called with the partitions assigned after each rebalance, e.g. to drop state kept about
+    the messages of partitions another consumer may have processed in the meantime.
+    """
+
+    def __init__(
+        self,
+        consumer: KafkaConsumer,
+        topics: RegisterTopic,
+        commit_every: int = COMMIT_EVERY_MESSAGES,
+        commit_interval_seconds: float = COMMIT_INTERVAL_SECONDS,
+        on_commit: CommitMetricsHook = log_commit_metrics,
+        on_partitions_assigned: Optional[Callable[[list[TopicPartition]], None]] = None,
+    ):
         self.consumer = consumer
+        self.on_partitions_assigned = on_partitions_assigned
         self.topics_consumers_lookup = topics
+        self.pending_retries: dict[tuple[str, int], PendingRetry] = {}
+        self.running = False
+        self.previous_signal_handlers: dict[int, Any] = {}
+        self.committer = OffsetCommitter(
+            consumer,
+            commit_every=commit_every,
+            commit_interval_seconds=commit_interval_seconds,
+            on_commit=on_commit,
+        )
+
+    @staticmethod
+    def convert_header_to_dict(headers: list[Tuple]):
+        """example: [('TOPIC', b'service_provider'), ('service_provider_id', b'9998'),
+        ('FILE_TYPE', b'SERVICE_PROVIDER'),
+        ('row_number', b'1'), ('approx_row_count', b'22')]
+
+        Note headers values are all strings.
+        """
+        headers = headers or []
+        return {k: v.decode("utf-8") for k, v in headers}
+
+    def run_handlers(self, topic: str, messages: list[Message], run: RunHandler):
+        """Run the handlers of a topic on its messages, from one or more partitions.
+        Handlers that already processed the messages of a partition waiting for a retry are
+        not run again on them. Raises KeyError if the topic has no handler."""
+        pending = self.take_pending_retries(topic, messages)
+        failures = self.run_topic_handlers(topic, messages, run, pending)
+        self.settle(topic, messages, failures, pending)
+
+    def take_pending_retries(self, topic: str, messages: list[Message]) -> dict[int, PendingRetry]:
+        """Remove the pending retries of the partitions of the messages, by partition"""
+        return {
+            partition: self.pending_retries.pop((topic, partition))
+            for partition in {message.partition() for message in messages}
+            if (topic, partition) in self.pending_retries
+        }
+
+    def run_topic_handlers(
+        self,
+        topic: str,
+        messages: list[Message],
+        run: RunHandler,
+        pending: dict[int, PendingRetry],
+    ) -> HandlerFailures:
+        """Run the handlers, and return the handlers that failed on each partition.
+        Doesn't use the Kafka consumer, so it can run on a partition worker thread.
+        Raises KeyError if the topic has no handler."""
+        consumer_functions = self.topics_consumers_lookup[topic]
+        failures: HandlerFailures = defaultdict(list)
+        for fn in consumer_functions:
+            handler_messages = [
+                message
+                for message in messages
+                if not self._is_processed_by(fn, message, pending.get(message.partition()))
+            ]
+            if not handler_messages:
+                continue
+            try:
+                run(fn, handler_messages)
+            except Exception as e:
+                logger.error(f"Error executing consumer: {fn.__name__} : {e}", exc_info=True)
+                for partition in {message.partition() for message in handler_messages}:
+                    failures[partition].append((fn, e))
+        return failures
+
+    def settle(
+        self,
+        topic: str,
+        messages: list[Message],
+        failures: HandlerFailures,
+        pending: dict[int, PendingRetry],
+    ):
+        """Store the offsets of the partitions whose handlers all succeeded, and retry or dead
+        letter the others. Uses the Kafka consumer, so it must run on the polling thread."""
+        for partition, partition_messages in self.group_by_partition(messages).items():
+            if partition in failures:
+                self.retry_or_dead_letter(
+                    topic,
+                    partition,
+                    partition_messages,
+                    failures[partition],
+                    pending.get(partition),
+                )
+            else:
+                self.consumer.store_offsets(message=partition_messages[-1])
+
+    @staticmethod
+    def _is_processed_by(
+        fn: RegisterTopicHandlerDecorator, message: Message, pending: Optional[PendingRetry]
+    ) -> bool:
+        return (
+            pending is not None
+            and fn not in pending.handlers
+            and message.offset() <= pending.last_offset
+        )
+
+    @staticmethod
+    def group_by_partition(messages: list[Message]) -> dict[int, list[Message]]:
+        partitions: dict[int, list[Message]] = defaultdict(list)
+        for message in messages:
+            partitions[message.partition()].append(message)
+        return partitions
+
+    def retry_or_dead_letter(
+        self,
+        topic: str,
+        partition: int,
+        messages: list[Message],
+        failures: list[tuple[RegisterTopicHandlerDecorator, Exception]],
+        pending: Optional[PendingRetry],
+    ):
+        """Schedule a retry of the failed handlers whose retries are not exhausted,
+        and send the messages of the others to the dead letter topic.
+        Validation errors are not retried."""
+        attempt = pending.attempt + 1 if pending else 1
+        retry_handlers = []
+        dead_letters = 0
+        for fn, error in failures:
+            retry_policy = getattr(fn, "retry_policy", DEFAULT_RETRY_POLICY)
+            if not isinstance(error, ValidationError) and attempt <= retry_policy.max_retries:
+                retry_handlers.append(fn)
+                continue
+            for message in messages:
+                send_to_dead_letter_topic(message, fn.__name__, error, attempt)
+            dead_letters += len(messages)
+        if dead_letters:
+            # make sure the dead letters are delivered before storing their offsets
+            Producer.flush()
+            logger.warning(f"Sent {dead_letters} messages to the dead letter topic of {topic}")
+        if not retry_handlers:
+            self.consumer.store_offsets(message=messages[-1])
+            return
+        delay = max(
+            getattr(fn, "retry_policy", DEFAULT_RETRY_POLICY).get_delay(attempt)
+            for fn in retry_handlers
+        )
+        self.consumer.pause([TopicPartition(topic, partition)])
+        self.consumer.seek(TopicPartition(topic, partition, messages[0].offset()))
+        self.pending_retries[(topic, partition)] = PendingRetry(
+            attempt=attempt,
+            resume_at=time.monotonic() + delay,
+            last_offset=messages[-1].offset(),
+            handlers=retry_handlers,
+        )
+        logger.warning(
+            f"Retrying {topic} partition {partition} from offset {messages[0].offset()} "
+            f"in {delay} seconds (attempt {attempt})"
+        )
+
+    def resume_due_partitions(self):
+        """Resume the paused partitions whose backoff is over."""
+        now = time.monotonic()
+        for (topic, partition), pending in list(self.pending_retries.items()):
+            if pending.paused and pending.resume_at <= now:
+                self.consumer.resume([TopicPartition(topic, partition)])
+                pending.paused = False
 
     def _subscribe(self):
         """Subscribe to topics."""
-        self.consumer.subscribe(list(self.topics_consumers_lookup.keys()))
+        self.consumer.subscribe(
+            list(self.topics_consumers_lookup.keys()),
+            on_assign=self.on_assign,
+            on_revoke=self.on_revoke,
+        )
         logger.info(
             f"Listening for the following topics: {self._get_topic_list_and_function_count()}"
         )
 
+    def _start(self):
+        """Subscribe, and stop gracefully on SIGTERM and SIGINT."""
+        self.running = True
+        # signal handlers can only be set from the main thread
+        if threading.current_thread() is threading.main_thread():
+            self.previous_signal_handlers = {
+                signum: signal.signal(signum, self.handle_stop_signal)
+                for signum in (signal.SIGTERM, signal.SIGINT)
+            }
+        self._subscribe()
+
+    def _close(self):
+        """Commit the processed offsets and leave the group."""
+        self.committer.commit()
+        self.consumer.close()
+        for signum, handler in self.previous_signal_handlers.items():
+            signal.signal(signum, handler)
+        self.previous_signal_handlers = {}
+        logger.info("Consumer closed")
+
+    def stop(self):
+        """Stop polling. The current batch is finished before the consumer closes."""
+        self.running = False
+
+    def handle_stop_signal(self, signum, frame):
+        logger.info(f"Received signal {signum}, stopping the consumer...")
+        self.stop()
+
+    def on_assign(self, consumer: KafkaConsumer, partitions: list[TopicPartition]):
+        logger.info(f"Partitions assigned: {[(p.topic, p.partition) for p in partitions]}")
+        if self.on_partitions_assigned:
+            self.on_partitions_assigned(partitions)
+
+    def on_revoke(self, consumer: KafkaConsumer, partitions: list[TopicPartition]):
+        """Called before the partitions move to another consumer, between two batches.
+        Commits the processed offsets and drops the retries of the revoked partitions,
+        the new owner resumes from their uncommitted messages."""
+        logger.info(f"Partitions revoked: {[(p.topic, p.partition) for p in partitions]}")
+        self.committer.commit()
+        for p in partitions:
+            self.pending_retries.pop((p.topic, p.partition), None)
+
     def _get_topic_list_and_function_count(self):
         # console message: topics are being listened to
         # & how many functions are listening to each topic
@@ -103,11 +403,25 @@ class Consumer(abc.ABC):
             "bootstrap.servers": url,
             "group.id": group_id,
             "session.timeout.ms": 6000,
-            "on_commit": lambda err, partitions: print("Committed offsets: ", partitions),
             "auto.offset.reset": "earliest",
+            # offsets are stored once processed and committed by the OffsetCommitter
+            "enable.auto.commit": False,
+            "enable.auto.offset.store": False,
         }
         return KafkaConsumer(conf)
 
+    @staticmethod
+    def commit_kwargs(kwargs: dict) -> dict:
+        """Pick the offset commit and rebalance settings from the factory keyword arguments."""
+        return {
+            "commit_every": kwargs.get("commit_every", COMMIT_EVERY_MESSAGES),
+            "commit_interval_seconds": kwargs.get(
+                "commit_interval_seconds", COMMIT_INTERVAL_SECONDS
+            ),
+            "on_commit": kwargs.get("on_commit", log_commit_metrics),
+            "on_partitions_assigned": kwargs.get("on_partitions_assigned"),
+        }
+
     @classmethod
     @abc.abstractmethod
     def factory(
@@ -142,40 +456,29 @@ class SingleMessageConsumer(Consumer):
     This is ideal for low frequency messages, and is the default strategy.
     """
 
-    def convert_header_to_dict(self, headers: list[Tuple]):
-        """example: [('TOPIC', b'service_provider'), ('service_provider_id', b'9998'),
-        ('FILE_TYPE', b'SERVICE_PROVIDER'),
-        ('row_number', b'1'), ('approx_row_count', b'22')]
-
-        Note headers values are all strings.
-        """
-        headers = headers or []
-        return {k: v.decode("utf-8") for k, v in headers}
-
     def execute_consumers_on_topic(self, message: Message):
         # Message is a 'confluent_kafka.Message' not one of our 'Message' dataclass
         try:
-            consumer_functions = self.topics_consumers_lookup[message.topic()]
-            for fn in consumer_functions:
-                try:
-                    # can't type hint them or the line is too long & mypy has a problem
-                    messages: list
-                    if fn.schema:
-                        messages = fn.schema.loads(message.value())
-                    else:
-                        # convert from bytestring to json
-                        messages = json.loads(message.value().decode("utf-8"))
-                    header_dict: dict = self.convert_header_to_dict(message.headers())
-                    self.set_each_message_with_shared_header(header_dict, messages)
-                    fn(
-                        data=messages,
-                        headers=header_dict,
-                    )
-                except Exception as e:
-                    logger.error(f"Error executing consumer: {fn.__name__} : {e}", exc_info=True)
+            self.run_handlers(message.topic(), [message], self.run_handler)
         except KeyError as e:
             logger.info(f"Message on topic '{message.topic}' has no consumer : {e}")
 
+    def run_handler(self, fn: RegisterTopicHandlerDecorator, messages: list[Message]):
+        for message in messages:
+            # can't type hint them or the line is too long & mypy has a problem
+            data: list
+            if fn.schema:
+                data = fn.schema.loads(message.value())
+            else:
+                # convert from bytestring to json
+                data = codec.loads(message.value())
+            header_dict: dict = self.convert_header_to_dict(message.headers())
+            self.set_each_message_with_shared_header(header_dict, data)
+            fn(
+                data=data,
+                headers=header_dict,
+            )
+
     def set_each_message_with_shared_header(self, header_dict, list_of_messages):
         try:
             self.get_messages_class(list_of_messages).batch_set_header(
@@ -191,18 +494,21 @@ class SingleMessageConsumer(Consumer):
         return list_of_messages[0].__class__
 
     def listen(self):
-        self._subscribe()
+        self._start()
         try:
-            while True:
+            while self.running:
+                self.resume_due_partitions()
                 msg: Message = self.consumer.poll(KAFKA_POLL_INTERVAL)
                 if msg is None:
+                    self.committer.processed(0)
                     continue
                 if msg.error():
                     logger.error("Consumer error: {}".format(msg.error()))
                     continue
                 self.execute_consumers_on_topic(message=msg)
+                self.committer.processed(1)
         finally:
-            self.consumer.close()
+            self._close()
 
     @classmethod
     def factory(
@@ -214,27 +520,38 @@ class SingleMessageConsumer(Consumer):
     ) -> SingleMessageConsumer:
         """Creates the Kafka consumer and filters topics based on the include list.
 
-        If no topics are specified, all available topics will be consumed."""
+        If no topics are specified, all available topics will be consumed.
+
+        Accepts the following additional keyword arguments:
+            commit_every - int: commit the offsets every N messages (default 1000)
+            commit_interval_seconds - float: commit the offsets at least every N seconds
+                (default 5)
+            on_commit - CommitMetricsHook: called with the metrics of each commit
+                (default logs them)
+            on_partitions_assigned - called with the partitions assigned after each rebalance
+        """
         topics = cls.filter_topics(
             topic_handlers=registered_topic_handlers,
             include_topics=include_topics,
             consumer_type=ConsumerType.SINGLE,
         )
         consumer = cls.make_kafka_consumer(url=url, group_id=group_id)
-        return SingleMessageConsumer(consumer=consumer, topics=topics)
+        return SingleMessageConsumer(consumer=consumer, topics=topics, **cls.commit_kwargs(kwargs))
 
 
 class ConsumerMessage:
-    """Wrapper for Kafka message with headers and deserialized value."""
+    """Wrapper for Kafka message with headers and deserialized value.
+    `data` is the record loaded from the value, once the message is validated with a schema."""
 
     headers: dict[str, str]
     value: dict
+    data: Any = None
 
     def __init__(self, kafka_message: Message):
         if kafka_message.headers() is not None:
             self.headers = {k: v.decode("utf-8") for k, v in kafka_message.headers()}
         message = kafka_message.value()
-        self.value = json.loads(message.decode("utf-8"))
+        self.value = codec.loads(message)
 
     @classmethod
     def from_message_list_sort_by_topic(
@@ -246,6 +563,28 @@ class ConsumerMessage:
                 messages[msg.topic()].append(cls(msg))
         return messages
 
+    @staticmethod
+    def validate_batch(
+        schema: Schema, messages: list[ConsumerMessage]
+    ) -> Tuple[list[ConsumerMessage], dict[int, Any]]:
+        """Validate the values of a batch of messages with a single schema call.
+
+        Sets the loaded record on the `data` attribute of each valid message.
+        Returns the valid messages, and the validation errors of the invalid ones
+        by their index in the batch. Only a batch with invalid messages is loaded twice.
+        """
+        errors: dict[int, Any] = {}
+        valid = messages
+        try:
+            records = schema.load([message.value for message in messages], many=True)
+        except ValidationError as e:
+            errors = e.normalized_messages()  # type: ignore
+            valid = [message for i, message in enumerate(messages) if i not in errors]
+            records = schema.load([message.value for message in valid], many=True)
+        for message, record in zip(valid, records):
+            message.data = record
+        return valid, errors
+
 
 class BatchMessageConsumer(Consumer):
     """Consumes messages in batches and passes lists of messages to the handler.
@@ -260,8 +599,16 @@ class BatchMessageConsumer(Consumer):
     example:
         from pm.consumers.event import handlers as event_handlers
 
-    Suited for topics that have frequent messages. The messages will not be validated
-    against a schema, and will be passed as a list of ConsumerMessage objects.
+    Suited for topics that have frequent messages. The messages are passed as a list of
+    ConsumerMessage objects. If the handler is registered with a schema, the batch is
+    validated with one schema call: invalid messages are logged and dropped, and each valid
+    message carries its loaded record in `data`.
+
+    Setting max_partition_workers above 1 enables partition-parallel mode. Each consumed
+    batch is split by topic-partition and every partition is handled on its own worker
+    thread, so ordering is kept within a partition. The workers only run the handlers: the
+    offsets are stored on the polling thread once every partition in the batch has finished,
+    and committed in batches like in serial mode.
     """
 
     def __init__(
@@ -270,39 +617,151 @@ class BatchMessageConsumer(Consumer):
         topics: RegisterTopic,
         max_bulk_messages: int = 500,
         bulk_timeout_seconds: int = 1,
+        max_partition_workers: int = 1,
+        **commit_kwargs,
     ):
         self.max_bulk_messages = max_bulk_messages
         self.bulk_timeout_seconds = bulk_timeout_seconds
-        super().__init__(consumer, topics)
+        self.max_partition_workers = max_partition_workers
+        self.executor: Optional[ThreadPoolExecutor] = None
+        if max_partition_workers > 1:
+            self.executor = ThreadPoolExecutor(
+                max_workers=max_partition_workers, thread_name_prefix="partition-worker"
+            )
+        super().__init__(consumer, topics, **commit_kwargs)
+
+    @staticmethod
+    def group_messages_by_topic(messages: list[Message]) -> dict[str, list[Message]]:
+        kafka_messages: dict[str, list[Message]] = defaultdict(list)
+        for msg in messages:
+            if not msg.error() and msg.value():
+                kafka_messages[msg.topic()].append(msg)
+        return kafka_messages
 
     def send_messages_to_handler(self, messages: list[Message]):
-        consumer_messages = ConsumerMessage.from_message_list_sort_by_topic(messages)
-        for topic, message_list in consumer_messages.items():
+        for topic, message_list in self.group_messages_by_topic(messages).items():
             try:
-                consumer_functions = self.topics_consumers_lookup[topic]
-                for fn in consumer_functions:
-                    try:
-                        fn(data=message_list)
-                    except Exception as e:
-                        logger.error(
-                            f"Error executing consumer: {fn.__name__} : {e}", exc_info=True
-                        )
+                self.run_handlers(topic, message_list, self.decode_and_run_handler(message_list))
             except KeyError as e:
                 logger.info(f"Message on topic '{topic}' has no consumer : {e}")
 
+    def decode_and_run_handler(self, messages: list[Message]) -> RunHandler:
+        # decode each message once, whatever the number of handlers
+        decoded = {id(msg): ConsumerMessage(msg) for msg in messages}
+        return partial(self.run_handler, decoded=decoded)
+
+    def run_partition_handlers(
+        self, topic: str, messages: list[Message], pending: dict[int, PendingRetry]
+    ) -> HandlerFailures:
+        """Decode the messages of a partition and run the handlers, on a worker thread"""
+        return self.run_topic_handlers(
+            topic, messages, self.decode_and_run_handler(messages), pending
+        )
+
+    @staticmethod
+    def run_handler(
+        fn: RegisterTopicHandlerDecorator,
+        messages: list[Message],
+        decoded: dict[int, ConsumerMessage],
+    ):
+        topic = messages[0].topic()
+        message_list = [decoded[id(msg)] for msg in messages]
+        data = message_list
+        schema = getattr(fn, "schema", None)
+        if isinstance(schema, Schema):
+            data, errors = ConsumerMessage.validate_batch(schema, message_list)
+            for index, error in errors.items():
+                logger.warning(
+                    f"Invalid message on topic '{topic}': {error}, "
+                    f"value: {message_list[index].value}"
+                )
+        fn(data=data)
+
+    @staticmethod
+    def group_messages_by_partition(
+        messages: list[Message],
+    ) -> dict[tuple[str, int], list[Message]]:
+        """Split a batch into lists of messages per (topic, partition).
+        The consumed order is kept inside each list."""
+        partitions: dict[tuple[str, int], list[Message]] = defaultdict(list)
+        for msg in messages:
+            partitions[(msg.topic(), msg.partition())].append(msg)
+        return partitions
+
+    def send_messages_to_handler_by_partition(self, messages: list[Message]):
+        """Run the handlers for each partition of the batch on the worker pool.
+
+        The workers only run the handlers. The Kafka consumer calls (storing the offsets,
+        pausing and rewinding the partitions to retry) and the pending retries are only used
+        on the polling thread, once every partition's work has finished. The stored offsets
+        are committed by the committer, like in serial mode."""
+        if self.executor is None:
+            raise ValueError("Partition-parallel mode requires max_partition_workers > 1")
+        jobs = []
+        for (topic, _), partition_messages in self.group_messages_by_partition(messages).items():
+            partition_messages = self.group_messages_by_topic(partition_messages)[topic]
+            if not partition_messages:
+                continue
+            if topic not in self.topics_consumers_lookup:
+                logger.info(f"Message on topic '{topic}' has no consumer")
+                continue
+            pending = self.take_pending_retries(topic, partition_messages)
+            future = self.executor.submit(
+                self.run_partition_handlers, topic, partition_messages, pending
+            )
+            jobs.append((topic, partition_messages, pending, future))
+        wait([future for *_, future in jobs])
+        for topic, partition_messages, pending, future in jobs:
+            try:
+                failures = future.result()
+            except Exception as e:
+                # e.g. a message that can't be decoded: retried, then dead-lettered, like a
+                # handler failure, so the offsets of the partition don't move past it
+                logger.error(f"Error processing partition: {e}", exc_info=True)
+                failures = self.fail_handlers(topic, partition_messages, pending, e)
+            self.settle(topic, partition_messages, failures, pending)
+
+    def fail_handlers(
+        self,
+        topic: str,
+        messages: list[Message],
+        pending: dict[int, PendingRetry],
+        error: Exception,
+    ) -> HandlerFailures:
+        """The failures of every handler still to run on the messages, for an error raised
+        outside of the handlers."""
+        failures: HandlerFailures = {}
+        for partition in {message.partition() for message in messages}:
+            handlers = (
+                pending[partition].handlers
+                if partition in pending
+                else self.topics_consumers_lookup[topic]
+            )
+            failures[partition] = [(fn, error) for fn in handlers]
+        return failures
+
     def listen(self):
         """Listen for messages and pass them to the handler(s)."""
-        self._subscribe()
+        self._start()
         try:
-            while True:
+            while self.running:
+                self.resume_due_partitions()
                 messages = self.consumer.consume(
                     self.max_bulk_messages, timeout=self.bulk_timeout_seconds
                 )
                 logger.info(f"Consumed {len(messages)} messages")
-                if messages:
+                if not messages:
+                    self.committer.processed(0)
+                    continue
+                if self.executor:
+                    self.send_messages_to_handler_by_partition(messages=messages)
+                else:
                     self.send_messages_to_handler(messages=messages)
+                self.committer.processed(len(messages))
         finally:
-            self.consumer.close()
+            if self.executor:
+                self.executor.shutdown(wait=True)
+            self._close()
 
     @classmethod
     def factory(
@@ -319,9 +778,18 @@ class BatchMessageConsumer(Consumer):
         Accepts the following additional keyword arguments for the Kafka consumer:
             max_bulk_messages - int: max number of messages to consume in one batch (default 500)
             bulk_timeout_seconds - int: max time to wait for messages in one batch (default 1)
+            max_partition_workers - int: number of threads used to process partitions in
+                parallel. 1 processes the batch serially on the poll thread (default 1)
+            commit_every - int: commit the offsets every N messages (default 1000)
+            commit_interval_seconds - float: commit the offsets at least every N seconds
+                (default 5)
+            on_commit - CommitMetricsHook: called with the metrics of each commit
+                (default logs them)
+            on_partitions_assigned - called with the partitions assigned after each rebalance
         """
         max_bulk_messages = kwargs.get("max_bulk_messages", 500)
         bulk_timeout_seconds = kwargs.get("bulk_timeout_seconds", 1)
+        max_partition_workers = kwargs.get("max_partition_workers", 1)
         topics = cls.filter_topics(
             topic_handlers=registered_topic_handlers,
             include_topics=include_topics,
@@ -333,4 +801,6 @@ class BatchMessageConsumer(Consumer):
             topics=topics,
             max_bulk_messages=max_bulk_messages,
             bulk_timeout_seconds=bulk_timeout_seconds,
+            max_partition_workers=max_partition_workers,
+            **cls.commit_kwargs(kwargs),
         )
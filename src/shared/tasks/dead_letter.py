@@ -0,0 +1,107 @@
+"""Dead letter topics for messages that the consumer handlers failed to process.
+
+After its retries are exhausted, a failed message is sent to `<topic>.dlq` with its original
+key, value and headers, plus the dead letter headers below describing the failure.
+"""
+from typing import Optional
+
+from confluent_kafka import Consumer as KafkaConsumer
+from confluent_kafka import Message
+
+from shared.system import loggingsys
+from shared.tasks.producer import Producer
+
+logger = loggingsys.get_logger(name=__name__)
+
+DEAD_LETTER_TOPIC_SUFFIX = ".dlq"
+DEAD_LETTER_REPLAY_GROUP_ID = "dead-letter-replay"
+
+# dead letter headers
+DEAD_LETTER_HEADER_PREFIX = "dlq-"
+DLQ_ORIGINAL_TOPIC = "dlq-original-topic"
+DLQ_ORIGINAL_PARTITION = "dlq-original-partition"
+DLQ_ORIGINAL_OFFSET = "dlq-original-offset"
+DLQ_HANDLER = "dlq-handler"
+DLQ_ERROR = "dlq-error"
+DLQ_ATTEMPTS = "dlq-attempts"
+
+
+def get_dead_letter_topic(topic: str) -> str:
+    return f"{topic}{DEAD_LETTER_TOPIC_SUFFIX}"
+
+
+def decode_headers(message: Message) -> dict[str, str]:
+    return {k: v.decode("utf-8") if v is not None else "" for k, v in message.headers() or []}
+
+
+def send_to_dead_letter_topic(message: Message, handler_name: str, error: Exception, attempts: int):
+    """Send a message that could not be processed to the dead letter topic of its topic."""
+    headers = decode_headers(message)
+    headers.update(
+        {
+            DLQ_ORIGINAL_TOPIC: message.topic(),
+            DLQ_ORIGINAL_PARTITION: str(message.partition()),
+            DLQ_ORIGINAL_OFFSET: str(message.offset()),
+            DLQ_HANDLER: handler_name,
+            DLQ_ERROR: f"{type(error).__name__}: {error}",
+            DLQ_ATTEMPTS: str(attempts),
+        }
+    )
+    Producer.send_json(
+        topic=get_dead_letter_topic(message.topic()),
+        json_str=message.value(),
+        headers=headers,
+        key=message.key(),
+    )
+
+
+def replay_dead_letters(
+    kafka_url: str,
+    topic: str,
+    group_id: str = DEAD_LETTER_REPLAY_GROUP_ID,
+    max_messages: Optional[int] = None,
+    timeout_seconds: float = 5,
+) -> int:
+    """Re-inject the messages of the `<topic>.dlq` dead letter topic into `topic`.
+
+    Reads the dead letter topic with its own consumer group until no message arrives for
+    timeout_seconds, or max_messages are replayed. The original headers are kept and the
+    dead letter headers are removed. The offsets are committed once the replayed messages
+    are delivered, so the next replay only picks up new dead letters.
+
+    Returns the number of replayed messages.
+    """
+    consumer = KafkaConsumer(
+        {
+            "bootstrap.servers": kafka_url,
+            "group.id": group_id,
+            "auto.offset.reset": "earliest",
+            "enable.auto.commit": False,
+        }
+    )
+    consumer.subscribe([get_dead_letter_topic(topic)])
+    replayed = 0
+    try:
+        while max_messages is None or replayed < max_messages:
+            message = consumer.poll(timeout_seconds)
+            if message is None:
+                break
+            if message.error():
+                logger.error(f"Consumer error: {message.error()}")
+                continue
+            headers = {
+                k: v
+                for k, v in decode_headers(message).items()
+                if not k.startswith(DEAD_LETTER_HEADER_PREFIX)
+            }
+            Producer.send_json(
+                topic=topic, json_str=message.value(), headers=headers, key=message.key()
+            )
+            replayed += 1
+        Producer.flush()
+        if replayed:
+            consumer.commit(asynchronous=False)
+        logger.info(f"Replayed {replayed} messages from {get_dead_letter_topic(topic)}")
+    finally:
+        consumer.close()
+    return replayed
@@ -1,5 +1,6 @@
 import logging
 from collections import defaultdict
+from dataclasses import dataclass
 from enum import Enum
 from typing import Optional, Protocol
 
@@ -13,6 +14,26 @@ class ConsumerType(Enum):
     BATCH = "BATCH"
 
 
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How many times a failing handler is retried, and how long to wait between attempts.
+    The wait grows exponentially from backoff_seconds, up to max_backoff_seconds.
+    Once the retries are exhausted, the messages are sent to the dead letter topic."""
+
+    max_retries: int = 3
+    backoff_seconds: float = 1.0
+    backoff_multiplier: float = 2.0
+    max_backoff_seconds: float = 60.0
+
+    def get_delay(self, attempt: int) -> float:
+        """Seconds to wait before retrying after the failed attempt number `attempt` (from 1)."""
+        delay = self.backoff_seconds * self.backoff_multiplier ** (attempt - 1)
+        return min(delay, self.max_backoff_seconds)
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
 class RegisterTopicHandlerDecorator(Protocol):
     """Protocol for the register_topic_handler decorator.
     This is used to type hint the decorator.
@@ -20,9 +41,8 @@ class RegisterTopicHandlerDecorator(Protocol):
 
     schema: Optional[Schema]
     consumer_type: ConsumerType
-
-    def __name__(self) -> str:
-        ...
+    retry_policy: RetryPolicy
+    __name__: str
 
     def __call__(self, *args, **kwargs) -> None:
         ...
@@ -38,6 +58,7 @@ def register_topic_handler(
     event: str,
     schema: Optional[Schema] = None,
     consumer_type: ConsumerType = ConsumerType.SINGLE,
+    retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY,
 ):
     """Registers a handler for a kafka topic.
     Takes in an event (topic) and a marshmallow schema to validate
@@ -47,8 +68,14 @@ def register_topic_handler(
     to validate the payload. If the schema is not provided, the payload will
     not be validated.
 
-    Batch consumers will not validate the payload, and will pass a list of
-    ConsumerMessages to the handler.
+    Batch consumers pass a list of ConsumerMessages to the handler. If a schema
+    is provided, the whole batch is validated with one call: invalid messages are
+    logged and left out, and the loaded record of each valid message is set on
+    its `data` attribute.
+
+    A handler that raises is retried with backoff according to its retry policy, without
+    blocking the other partitions. When the retries are exhausted, the messages are sent to
+    the `<topic>.dlq` dead letter topic. RetryPolicy(max_retries=0) skips the retries.
 
     example usage:
         @register_topic_handler("some-topic", MyMarshmallowSchema())
@@ -57,13 +84,9 @@ def register_topic_handler(
     """
 
     def decorator(func):
-        if consumer_type == ConsumerType.BATCH and schema:
-            raise ValueError(
-                "Batch consumers do not support schema validation. "
-                "Please remove the schema argument."
-            )
         func.consumer_type = consumer_type
         func.schema = schema
+        func.retry_policy = retry_policy
         registered_topic_handlers[event].append(func)
         return func
 
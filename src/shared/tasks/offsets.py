@@ -0,0 +1,101 @@
+"""Manual offset commits for the consumers.
+
+Auto commit is disabled: the consumers store the offset of a message once its handlers have
+finished (or it was sent to the dead letter topic), and the OffsetCommitter commits the stored
+offsets in batches. A message is only committed after its handlers' transactions are committed,
+so messages are processed at least once.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from confluent_kafka import Consumer as KafkaConsumer
+from confluent_kafka import KafkaError, KafkaException, TopicPartition
+
+from shared.system import loggingsys
+
+logger = loggingsys.get_logger(name=__name__)
+
+COMMIT_EVERY_MESSAGES = 1000
+COMMIT_INTERVAL_SECONDS = 5.0
+
+
+@dataclass
+class CommitMetrics:
+    """Passed to the commit metrics hook after each commit."""
+
+    latency_seconds: float
+    messages: int  # messages processed since the previous commit
+    partitions: list[TopicPartition] = field(default_factory=list)
+    error: Optional[KafkaException] = None
+
+
+CommitMetricsHook = Callable[[CommitMetrics], None]
+
+
+def log_commit_metrics(metrics: CommitMetrics):
+    """Default commit metrics hook."""
+    if metrics.error:
+        logger.error(f"Error committing offsets: {metrics.error}")
+        return
+    logger.debug(
+        f"Committed offsets of {metrics.messages} messages "
+        f"in {metrics.latency_seconds * 1000:.1f} ms"
+    )
+
+
+class OffsetCommitter:
+    """Commits the stored offsets every commit_every messages or every commit_interval_seconds,
+    whichever comes first. The commits are synchronous, and on_commit is called after each one
+    with its latency."""
+
+    def __init__(
+        self,
+        consumer: KafkaConsumer,
+        commit_every: int = COMMIT_EVERY_MESSAGES,
+        commit_interval_seconds: float = COMMIT_INTERVAL_SECONDS,
+        on_commit: CommitMetricsHook = log_commit_metrics,
+    ):
+        self.consumer = consumer
+        self.commit_every = commit_every
+        self.commit_interval_seconds = commit_interval_seconds
+        self.on_commit = on_commit
+        self.uncommitted = 0
+        self.last_commit = time.monotonic()
+
+    def processed(self, count: int):
+        """Count the processed messages, and commit if a commit is due.
+        Call with 0 when no message was consumed, to commit on time."""
+        self.uncommitted += count
+        if not self.uncommitted:
+            return
+        interval = time.monotonic() - self.last_commit
+        if self.uncommitted >= self.commit_every or interval >= self.commit_interval_seconds:
+            self.commit()
+
+    def commit(self, offsets: Optional[list[TopicPartition]] = None):
+        """Commit the given offsets, or the stored offsets if none are given."""
+        start = time.monotonic()
+        partitions: list[TopicPartition] = []
+        error = None
+        try:
+            if offsets:
+                partitions = self.consumer.commit(offsets=offsets, asynchronous=False)
+            else:
+                partitions = self.consumer.commit(asynchronous=False)
+        except KafkaException as e:
+            # nothing stored since the last commit is not an error
+            if e.args[0].code() != KafkaError._NO_OFFSET:
+                error = e
+        self.on_commit(
+            CommitMetrics(
+                latency_seconds=time.monotonic() - start,
+                messages=self.uncommitted,
+                partitions=partitions or [],
+                error=error,
+            )
+        )
+        self.uncommitted = 0
+        self.last_commit = time.monotonic()
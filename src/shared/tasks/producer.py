@@ -1,14 +1,14 @@
 import abc
 import enum
-import json
-from dataclasses import asdict, dataclass
-from typing import Any, List, Tuple
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Tuple
 
 from confluent_kafka import Producer as KafkaProducer
 from confluent_kafka.error import ProduceError
 
 from shared.system import configuration
 from shared.system.loggingsys import get_logger
+from shared.tasks import codec
 
 logger = get_logger(__name__)
 
@@ -41,13 +41,26 @@ class MessageData(abc.ABC):
     TOPIC = ""  # type: ignore
     headers = {}  # type: ignore
 
+    def get_key(self) -> Optional[str]:
+        """The partition key of the message. Messages with the same key are sent to the same
+        partition, so they are consumed in order. Override for topics whose consumers rely on
+        the order of the messages, e.g. successive updates of the same entity.
+        Defaults to no key, which spreads the messages over the partitions."""
+        return None
+
 
 @dataclass
 class SendToKafkaMessage(MessageData):
     """Adds the send_to_kafka method, which sends the message to Kafka directly."""
 
     def send_to_kafka(self):
-        Producer.send_message(message=self, topic=self.TOPIC, headers=self.headers)
+        Producer.send_message(
+            message=self, topic=self.TOPIC, headers=self.headers, key=self.get_key()
+        )
+
+
+def log_delivery(err, msg):
+    logger.info(f"Kafka message sent: {msg}")
 
 
 def handle_enum(obj: Any) -> Any:
@@ -74,44 +87,70 @@ class Producer:
         topic: str,
         message,
         headers: dict | None = None,
+        key: str | bytes | None = None,
     ):
         """Sends a message on a Kafka topic.
         The topic should be a json_dataclass type
         """
-        topic_data = json.dumps(asdict(message), default=handle_enum)
-        cls.send_json(topic=topic, json_str=topic_data, headers=headers)
+        cls.send_json(topic=topic, json_str=codec.dumps(message), headers=headers, key=key)
 
     @classmethod
     def send_json(
         cls,
         topic: str,
-        json_str: str,
+        json_str: str | bytes,
         headers: dict | None = None,
+        on_delivery: Optional[Callable[[Any, Any], None]] = None,
+        key: str | bytes | None = None,
     ):
         """Sends a message on a Kafka topic.
                 The topic should be a json_dataclass type
-        json_str should be a json string
+        json_str should be a json string, or the UTF-8 encoded bytes of one
         '{"a": 1, "b": "a"}'
+
+        on_delivery is an optional delivery report callback, called with (error, message)
+        when the broker acknowledges or rejects the message (during poll or flush).
+        Defaults to logging the sent message.
+
+        key is the partition key: the messages with the same key go to the same partition, and
+        are consumed in the order they were sent. Without a key they are spread over the
+        partitions.
         """
         config = configuration.get_config()
         headers = headers or {}
         headers_byte_list: List[Tuple] = cls.generate_header(headers)
         cls._producer = cls._producer or KafkaProducer({"bootstrap.servers": config.KAFKA_URL})
         # serialize to bytes here so we can catch errors in our tests
-        topic_data = json_str.encode("utf-8")
+        topic_data = json_str if isinstance(json_str, bytes) else json_str.encode("utf-8")
+        message = dict(
+            topic=topic,
+            value=topic_data,
+            key=key,
+            headers=headers_byte_list,
+            callback=on_delivery or log_delivery,
+        )
         try:
-            cls._producer.produce(
-                topic=topic,
-                value=topic_data,
-                headers=headers_byte_list,
-                callback=lambda err, msg: logger.info(f"Kafka message sent: {msg}"),
-            )
+            try:
+                cls._producer.produce(**message)
+            except BufferError:
+                # the local queue is full: serve delivery reports to make room, then retry
+                cls._producer.poll(1)
+                cls._producer.produce(**message)
         except ProduceError as error:
             logger.error(f"Kafka error: {error}")
             raise error
 
+    @classmethod
+    def poll(cls, timeout: float = 0):
+        """Serve the delivery callbacks of messages delivered so far, without waiting for
+        the rest."""
+        config = configuration.get_config()
+        cls._producer = cls._producer or KafkaProducer({"bootstrap.servers": config.KAFKA_URL})
+        cls._producer.poll(timeout)
+
     @classmethod
     def flush(cls):
+        """Wait for all messages to be delivered, calling their delivery callbacks."""
         config = configuration.get_config()
         cls._producer = cls._producer or KafkaProducer({"bootstrap.servers": config.KAFKA_URL})
         cls._producer.flush()
@@ -0,0 +1,91 @@
+import enum
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from typing import Optional
+from uuid import UUID
+
+import pytest
+
+from shared.tasks import codec
+
+
+class Color(enum.Enum):
+    RED = "red"
+
+
+@dataclass
+class Inner:
+    color: Color
+    amount: Decimal
+
+
+@dataclass
+class Outer:
+    id: int
+    created_at: datetime
+    inner: Inner
+    tags: list[str] = field(default_factory=list)
+    parent: Optional[int] = None
+
+
+def test_dumps_dataclass():
+    message = Outer(
+        id=1,
+        created_at=datetime(2023, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        inner=Inner(color=Color.RED, amount=Decimal("1.50")),
+        tags=["a"],
+    )
+    got = codec.loads(codec.dumps(message))
+    assert got == {
+        "id": 1,
+        "created_at": "2023-01-02T03:04:05+00:00",
+        "inner": {"color": "red", "amount": "1.50"},
+        "tags": ["a"],
+        "parent": None,
+    }
+
+
+def test_loads_bytes_and_str():
+    assert codec.loads(b'{"a": [1, "\xc3\xa9"]}') == {"a": [1, "é"]}
+    assert codec.loads('{"a": 1}') == {"a": 1}
+    assert codec.dumps_str({"a": 1}) == '{"a":1}'
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    """Run the test with orjson, and with the standard library fallback"""
+    if request.param == "json":
+        monkeypatch.setattr(codec, "orjson", None)
+    return request.param
+
+
+# values the producers send, with the JSON both backends must produce for them
+FIXTURES = [
+    (
+        Outer(
+            id=1,
+            created_at=datetime(2023, 1, 2, 3, 4, 5, 120000, tzinfo=timezone.utc),
+            inner=Inner(color=Color.RED, amount=Decimal("1.50")),
+            tags=["a", "é"],
+        ),
+        '{"id":1,"created_at":"2023-01-02T03:04:05.120000+00:00",'
+        '"inner":{"color":"red","amount":"1.50"},"tags":["a","é"],"parent":null}',
+    ),
+    (
+        {"naive": datetime(2023, 1, 2, 3, 4), "date": date(2023, 1, 2), "time": time(3, 4, 5)},
+        '{"naive":"2023-01-02T03:04:00","date":"2023-01-02","time":"03:04:05"}',
+    ),
+    (
+        {1: [1.5, True, None], "uuid": UUID(int=1)},
+        '{"1":[1.5,true,null],' '"uuid":"00000000-0000-0000-0000-000000000001"}',
+    ),
+    ([Color.RED, (1, 2), 'quote " and \\ \n'], '["red",[1,2],"quote \\" and \\\\ \\n"]'),
+]
+
+
+@pytest.mark.parametrize("value, expected", FIXTURES)
+def test_backends_produce_the_same_json(backend, value, expected):
+    assert codec.dumps_str(value) == expected
+    assert codec.dumps(value) == expected.encode("utf-8")
+    assert codec.loads(expected) == codec.loads(codec.dumps(value))
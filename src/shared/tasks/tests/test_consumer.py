@@ -1,9 +1,22 @@
+import threading
+from unittest import mock
 from unittest.mock import Mock
 
-from confluent_kafka import Message
+import marshmallow as ma
+from confluent_kafka import KafkaError, KafkaException, Message, TopicPartition
 
 from shared.minio_manager import FakeMessage
-from shared.tasks.consumer import BatchMessageConsumer, SingleMessageConsumer
+from shared.tasks.consumer import (
+    BatchMessageConsumer,
+    ConsumerMessage,
+    SingleMessageConsumer,
+)
+from shared.tasks.decorators import RetryPolicy
+from shared.tasks.offsets import OffsetCommitter
+
+
+class ProgramSchema(ma.Schema):
+    program_id = ma.fields.Integer(required=True)
 
 
 class TestSingleMessageConsumer:
@@ -106,3 +119,262 @@ class TestBatchConsumer:
         consumer.send_messages_to_handler(items)
         mock_consumer_fn.assert_called_once()
         mock_consumer_fn_2.assert_called_once()
+
+    def test_execute_consumer_with_schema(self):
+        TOPIC = "my-topic"
+
+        def make_message(value: bytes):
+            return Mock(
+                spec=Message,
+                headers=lambda: None,
+                topic=lambda: TOPIC,
+                value=lambda: value,
+                error=lambda: None,
+            )
+
+        items = [
+            make_message(b'{"program_id": 1}'),
+            make_message(b'{"program_id": "not an int"}'),
+            make_message(b'{"program_id": 3}'),
+        ]
+        received = []
+
+        def handler(data):
+            received.extend(data)
+
+        handler.schema = ProgramSchema()
+        consumer = BatchMessageConsumer(consumer=Mock(), topics={TOPIC: [handler]})
+        consumer.send_messages_to_handler(items)
+        assert [m.data for m in received] == [{"program_id": 1}, {"program_id": 3}]
+
+    def test_validate_batch(self):
+        messages = [
+            Mock(spec=ConsumerMessage, headers={}, value={"program_id": 1}),
+            Mock(spec=ConsumerMessage, headers={}, value={}),
+            Mock(spec=ConsumerMessage, headers={}, value={"program_id": 3}),
+        ]
+        valid, errors = ConsumerMessage.validate_batch(ProgramSchema(), messages)
+        assert valid == [messages[0], messages[2]]
+        assert list(errors.keys()) == [1]
+        assert messages[2].data == {"program_id": 3}
+
+    def test_partition_parallel_keeps_order_and_stores_offsets(self):
+        TOPIC = "my-topic"
+
+        def make_message(partition: int, offset: int):
+            return Mock(
+                spec=Message,
+                headers=lambda: None,
+                topic=lambda: TOPIC,
+                partition=lambda: partition,
+                offset=lambda: offset,
+                value=lambda: f'{{"offset": {offset}}}'.encode("utf-8"),
+                error=lambda: None,
+            )
+
+        items = [make_message(0, 0), make_message(1, 5), make_message(0, 1), make_message(1, 6)]
+        received: dict[int, list[int]] = {0: [], 1: []}
+
+        def handler(data):
+            offsets = [m.value["offset"] for m in data]
+            received[0 if offsets[0] < 5 else 1].extend(offsets)
+
+        # the Kafka consumer is only used on the polling thread
+        store_threads = []
+        mock_kafka_consumer = Mock()
+        mock_kafka_consumer.store_offsets.side_effect = lambda **_: store_threads.append(
+            threading.current_thread()
+        )
+        consumer = BatchMessageConsumer(
+            consumer=mock_kafka_consumer,
+            topics={TOPIC: [handler]},
+            max_partition_workers=2,
+        )
+        consumer.send_messages_to_handler_by_partition(items)
+        assert received == {0: [0, 1], 1: [5, 6]}
+        stored = [c.kwargs["message"] for c in mock_kafka_consumer.store_offsets.call_args_list]
+        assert sorted(stored, key=lambda m: m.partition()) == [items[2], items[3]]
+        assert store_threads == [threading.current_thread()] * 2
+        # the offsets are committed by the committer, not once per batch
+        mock_kafka_consumer.commit.assert_not_called()
+
+
+class TestRetries:
+    TOPIC = "my-topic"
+
+    def _message(self, offset: int, value: bytes = b'{"program_id": 1}'):
+        return Mock(
+            spec=Message,
+            headers=lambda: [("program_id", b"1")],
+            topic=lambda: self.TOPIC,
+            partition=lambda: 0,
+            offset=lambda: offset,
+            value=lambda: value,
+            error=lambda: None,
+        )
+
+    def _handler(self, name: str, retry_policy: RetryPolicy, **kwargs):
+        handler = Mock(**{"schema": None, "retry_policy": retry_policy, **kwargs})
+        handler.__name__ = name
+        return handler
+
+    def test_failed_handler_is_retried_then_dead_lettered(self):
+        failing = self._handler(
+            "failing", RetryPolicy(max_retries=1, backoff_seconds=0), side_effect=Exception("boom")
+        )
+        succeeding = self._handler("succeeding", RetryPolicy())
+        kafka_consumer = Mock()
+        consumer = BatchMessageConsumer(
+            consumer=kafka_consumer, topics={self.TOPIC: [failing, succeeding]}
+        )
+        messages = [self._message(5), self._message(6)]
+        with mock.patch("shared.tasks.dead_letter.Producer") as producer, mock.patch(
+            "shared.tasks.consumer.Producer"
+        ):
+            consumer.send_messages_to_handler(messages)
+            # the partition is paused and rewound, its offsets are not stored
+            kafka_consumer.pause.assert_called_once()
+            seek = kafka_consumer.seek.call_args[0][0]
+            assert (seek.topic, seek.partition, seek.offset) == (self.TOPIC, 0, 5)
+            kafka_consumer.store_offsets.assert_not_called()
+
+            consumer.resume_due_partitions()
+            kafka_consumer.resume.assert_called_once()
+
+            # redelivered after the seek: only the failed handler runs again
+            consumer.send_messages_to_handler(messages)
+
+        assert failing.call_count == 2
+        assert succeeding.call_count == 1
+        assert producer.send_json.call_count == 2
+        sent = producer.send_json.call_args.kwargs
+        assert sent["topic"] == "my-topic.dlq"
+        assert sent["headers"]["program_id"] == "1"
+        assert sent["headers"]["dlq-handler"] == "failing"
+        assert sent["headers"]["dlq-attempts"] == "2"
+        assert sent["headers"]["dlq-original-offset"] == "6"
+        kafka_consumer.store_offsets.assert_called_once_with(message=messages[-1])
+        assert consumer.pending_retries == {}
+
+    def test_partition_error_is_retried_then_dead_lettered(self):
+        """An error outside of the handlers, like a message that can't be decoded, is
+        retried and dead-lettered like a handler failure in partition-parallel mode."""
+        handler = self._handler("handler", RetryPolicy(max_retries=1, backoff_seconds=0))
+        kafka_consumer = Mock()
+        consumer = BatchMessageConsumer(
+            consumer=kafka_consumer, topics={self.TOPIC: [handler]}, max_partition_workers=2
+        )
+        messages = [self._message(5), self._message(6, b"not json")]
+        with mock.patch("shared.tasks.dead_letter.Producer") as producer, mock.patch(
+            "shared.tasks.consumer.Producer"
+        ):
+            consumer.send_messages_to_handler_by_partition(messages)
+            kafka_consumer.pause.assert_called_once()
+            kafka_consumer.store_offsets.assert_not_called()
+
+            consumer.resume_due_partitions()
+            consumer.send_messages_to_handler_by_partition(messages)
+
+        handler.assert_not_called()
+        assert producer.send_json.call_count == 2
+        assert producer.send_json.call_args.kwargs["headers"]["dlq-handler"] == "handler"
+        kafka_consumer.store_offsets.assert_called_once_with(message=messages[-1])
+        assert consumer.pending_retries == {}
+
+    def test_validation_error_is_not_retried(self):
+        handler = self._handler("handler", RetryPolicy(), schema=ProgramSchema(many=True))
+        kafka_consumer = Mock()
+        consumer = SingleMessageConsumer(consumer=kafka_consumer, topics={self.TOPIC: [handler]})
+        with mock.patch("shared.tasks.dead_letter.Producer") as producer, mock.patch(
+            "shared.tasks.consumer.Producer"
+        ):
+            consumer.execute_consumers_on_topic(self._message(3, b'[{"program_id": "x"}]'))
+        handler.assert_not_called()
+        kafka_consumer.pause.assert_not_called()
+        assert producer.send_json.call_args.kwargs["headers"]["dlq-attempts"] == "1"
+        kafka_consumer.store_offsets.assert_called_once()
+
+
+class TestOffsetCommitter:
+    def test_commits_every_n_messages(self):
+        kafka_consumer = Mock()
+        metrics = []
+        committer = OffsetCommitter(
+            kafka_consumer, commit_every=3, commit_interval_seconds=60, on_commit=metrics.append
+        )
+        committer.processed(2)
+        kafka_consumer.commit.assert_not_called()
+        committer.processed(1)
+        kafka_consumer.commit.assert_called_once_with(asynchronous=False)
+        assert metrics[0].messages == 3
+        assert metrics[0].latency_seconds >= 0
+        assert metrics[0].error is None
+
+    def test_commits_on_interval(self):
+        kafka_consumer = Mock()
+        committer = OffsetCommitter(
+            kafka_consumer, commit_every=1000, commit_interval_seconds=0, on_commit=Mock()
+        )
+        committer.processed(0)
+        kafka_consumer.commit.assert_not_called()
+        committer.processed(1)
+        kafka_consumer.commit.assert_called_once()
+
+    def test_no_stored_offset_is_not_an_error(self):
+        kafka_consumer = Mock()
+        kafka_consumer.commit.side_effect = KafkaException(KafkaError(KafkaError._NO_OFFSET))
+        on_commit = Mock()
+        OffsetCommitter(kafka_consumer, on_commit=on_commit).commit()
+        assert on_commit.call_args[0][0].error is None
+
+
+class TestShutdown:
+    TOPIC = "my-topic"
+
+    def _message(self, partition: int, offset: int):
+        return Mock(
+            spec=Message,
+            headers=lambda: None,
+            topic=lambda: self.TOPIC,
+            partition=lambda: partition,
+            offset=lambda: offset,
+            value=lambda: b'{"program_id": 1}',
+            error=lambda: None,
+        )
+
+    def test_stop_finishes_the_batch_then_commits_and_closes(self):
+        kafka_consumer = Mock()
+        handler = Mock(schema=None)
+        consumer = BatchMessageConsumer(consumer=kafka_consumer, topics={self.TOPIC: [handler]})
+
+        def consume(*args, **kwargs):
+            consumer.stop()  # e.g. SIGTERM received while consuming
+            return [self._message(0, 0), self._message(0, 1)]
+
+        kafka_consumer.consume.side_effect = consume
+        consumer.listen()
+
+        kafka_consumer.consume.assert_called_once()
+        handler.assert_called_once()
+        kafka_consumer.commit.assert_called_once_with(asynchronous=False)
+        kafka_consumer.close.assert_called_once()
+
+    def test_on_revoke_commits_and_drops_retries(self):
+        kafka_consumer = Mock()
+        consumer = BatchMessageConsumer(consumer=kafka_consumer, topics={self.TOPIC: [Mock()]})
+        consumer.pending_retries = {(self.TOPIC, 0): Mock(), (self.TOPIC, 1): Mock()}
+        consumer.on_revoke(kafka_consumer, [TopicPartition(self.TOPIC, 0)])
+        kafka_consumer.commit.assert_called_once_with(asynchronous=False)
+        assert list(consumer.pending_retries) == [(self.TOPIC, 1)]
+
+    def test_on_assign_calls_the_hook(self):
+        kafka_consumer = Mock()
+        on_partitions_assigned = Mock()
+        consumer = BatchMessageConsumer(
+            consumer=kafka_consumer,
+            topics={self.TOPIC: [Mock()]},
+            on_partitions_assigned=on_partitions_assigned,
+        )
+        partitions = [TopicPartition(self.TOPIC, 0)]
+        consumer.on_assign(kafka_consumer, partitions)
+        on_partitions_assigned.assert_called_once_with(partitions)
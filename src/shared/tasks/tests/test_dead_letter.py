@@ -0,0 +1,47 @@
+from unittest import mock
+from unittest.mock import Mock
+
+from confluent_kafka import Message
+
+from shared.tasks import dead_letter
+
+
+def _dead_letter(offset: int):
+    return Mock(
+        spec=Message,
+        headers=lambda: [("program_id", b"1"), (dead_letter.DLQ_ERROR, b"Exception: boom")],
+        value=lambda: b'{"program_id": 1}',
+        key=lambda: b"1",
+        offset=lambda: offset,
+        error=lambda: None,
+    )
+
+
+def test_replay_dead_letters():
+    kafka_consumer = Mock()
+    kafka_consumer.poll.side_effect = [_dead_letter(0), _dead_letter(1), None]
+    with mock.patch.object(
+        dead_letter, "KafkaConsumer", return_value=kafka_consumer
+    ), mock.patch.object(dead_letter, "Producer") as producer:
+        replayed = dead_letter.replay_dead_letters("localhost:9092", "my-topic")
+
+    assert replayed == 2
+    kafka_consumer.subscribe.assert_called_once_with(["my-topic.dlq"])
+    producer.send_json.assert_called_with(
+        topic="my-topic", json_str=b'{"program_id": 1}', headers={"program_id": "1"}, key=b"1"
+    )
+    producer.flush.assert_called_once()
+    kafka_consumer.commit.assert_called_once_with(asynchronous=False)
+    kafka_consumer.close.assert_called_once()
+
+
+def test_replay_dead_letters_max_messages():
+    kafka_consumer = Mock()
+    kafka_consumer.poll.side_effect = [_dead_letter(0), _dead_letter(1), None]
+    with mock.patch.object(
+        dead_letter, "KafkaConsumer", return_value=kafka_consumer
+    ), mock.patch.object(dead_letter, "Producer") as producer:
+        replayed = dead_letter.replay_dead_letters("localhost:9092", "my-topic", max_messages=1)
+
+    assert replayed == 1
+    assert producer.send_json.call_count == 1
@@ -18,3 +18,15 @@ def test_register_topic_handler():
     assert my_handler.schema == FakeSchema
     assert TOPIC in decorators.registered_topic_handlers
     assert my_handler in decorators.registered_topic_handlers[TOPIC]
+
+
+def test_register_batch_topic_handler_with_schema():
+    TOPIC = "my-batch-topic"
+    schema = FakeSchema()
+
+    @decorators.register_topic_handler(TOPIC, schema, consumer_type=decorators.ConsumerType.BATCH)
+    def my_handler(data):
+        pass
+
+    assert my_handler.schema is schema
+    assert my_handler.consumer_type == decorators.ConsumerType.BATCH
@@ -1,3 +1,4 @@
+import asyncio
 import time
 from functools import wraps
 from typing import Any, Callable, Optional, Tuple
@@ -36,3 +37,33 @@ def retry_on_exception(
         return wrapper_retry_on_exception
 
     return decorator_retry_on_exception
+
+
+def async_retry_on_exception(
+    num_retries: int = 3, backoff: float = 0, errors: Optional[Tuple] = None
+) -> Callable:
+    """Same as retry_on_exception for coroutine functions. The backoff sleeps with asyncio,
+    so the other tasks of the event loop keep running while the call waits for a retry.
+    """
+
+    def decorator_retry_on_exception(func: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(func)
+        async def wrapper_retry_on_exception(*args: Any, **kwargs: Any) -> Any:
+            for i in range(num_retries):
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    if errors is None or isinstance(e, errors):
+                        if i == num_retries - 1:
+                            raise e
+                        else:
+                            sleep_for = backoff * (i + 1)
+                            logger.warning(f"{e} Retry in {sleep_for} seconds", exc_info=True)
+                            await asyncio.sleep(sleep_for)
+                    else:
+                        # if the error is not in the list of errors to catch, raise it
+                        raise e
+
+        return wrapper_retry_on_exception
+
+    return decorator_retry_on_exception
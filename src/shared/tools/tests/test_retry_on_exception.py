@@ -1,6 +1,8 @@
+import asyncio
+
 import pytest
 
-from shared.tools.retry_on_exception import retry_on_exception
+from shared.tools.retry_on_exception import async_retry_on_exception, retry_on_exception
 
 
 @retry_on_exception(num_retries=3, backoff=0, errors=(ValueError,))
@@ -10,6 +12,19 @@ def my_function(x):
     return x * 2
 
 
+class Flaky:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    @async_retry_on_exception(num_retries=3, backoff=0, errors=(ValueError,))
+    async def run(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ValueError("Oops!")
+        return self.calls
+
+
 class TestRetryOnException:
     def test_retry_on_exception(self):
         # Test that the function succeeds without raising an exception
@@ -19,3 +34,15 @@ class TestRetryOnException:
     def test_retry_on_exception_raises_exception(self):
         with pytest.raises(ValueError):
             my_function(-1)
+
+
+class TestAsyncRetryOnException:
+    def test_retries_until_success(self):
+        flaky = Flaky(failures=2)
+        assert asyncio.run(flaky.run()) == 3
+
+    def test_raises_after_the_last_retry(self):
+        flaky = Flaky(failures=3)
+        with pytest.raises(ValueError):
+            asyncio.run(flaky.run())
+        assert flaky.calls == 3
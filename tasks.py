@@ -63,6 +63,13 @@ def run_pm_worker(c):
         c.run("python -m pm.worker")
 
 
+@task
+def run_pm_worker_supervisor(c):
+    """Run the PM worker processes described by WORKER_PLAN, restarting the ones that crash"""
+    with c.cd(SRC_DIR_PATH):
+        c.run("python -m pm.worker_supervisor")
+
+
 @task
 def run_pm_bucket_watcher(c):
     """Run the bucket watcher service for PM app"""
@@ -76,11 +83,31 @@ def run_pm_scheduler(c):
     c.run("cd src && python -m pm.scheduler")
 
 
+@task
+def run_pm_outbox_dispatcher(c):
+    """Run an outbox dispatcher for PM app. Several can run at the same time."""
+    with c.cd(SRC_DIR_PATH):
+        c.run("python -m pm.outbox_dispatcher")
+
+
+@task
+def replay_dead_letters(c, topic, max_messages=None):
+    """Re-inject the messages of the <topic>.dlq dead letter topic into the topic"""
+    args = f"--topic {topic}"
+    if max_messages:
+        args += f" --max-messages {max_messages}"
+    with c.cd(SRC_DIR_PATH):
+        c.run(f"python -m pm.replay_dead_letters {args}")
+
+
 application.add_task(run_app, "run")
 application.add_task(run_relay_service, "der-gateway-relay")
 application.add_task(run_pm_scheduler, "scheduler")
+application.add_task(run_pm_outbox_dispatcher, "run-pm-outbox-dispatcher")
 application.add_task(run_pm_worker, "run-pm-worker")
+application.add_task(run_pm_worker_supervisor, "run-pm-worker-supervisor")
 application.add_task(run_pm_bucket_watcher, "run-pm-bucket-watcher")
+application.add_task(replay_dead_letters, "replay-dead-letters")
 
 
 @task